@@ -7,3 +7,5 @@
 from paransys.ansys import *
 from paransys.montecarlo import *
 from paransys.form import *
+from paransys.subset import *
+from paransys.linesampling import *
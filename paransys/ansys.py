@@ -15,6 +15,14 @@ Docs are available in https://dutitello.github.io/parAnsys/
 import os
 import numpy as np
 import time
+import itertools
+import pathlib
+import shlex
+import shutil
+import subprocess
+import hashlib
+import sqlite3
+import json
 
 
 class ANSYS(object):
@@ -28,6 +36,11 @@ class ANSYS(object):
 		exec_loc : str, obligatory
 			Location of ANSYS executable file.
 
+			It's started in the working directory with the arguments
+			``-smp -np nproc -j jobname -b -i pdsrun.inp -o pdsout.out add_flags``
+			and must write the PDS results file $jobname$_current.pdrs, so
+			any program that follows this can be used in place of ANSYS.
+
 		run_location : str, optional
 			ANSYS working directory. Must be a separated directory.
 			
@@ -37,7 +50,17 @@ class ANSYS(object):
 			ANSYS jobname. Defaults to \'file\'.
 
 		nproc : int, optional
-			Number of processors. Defaults to 2.
+			Number of processors used by each ANSYS instance. Defaults to 2.
+
+		instances : int, optional
+			Number of ANSYS instances running at the same time. The samples are
+			split betwen the instances, each one runs in a subdirectory of
+			run_location (inst0, inst1, ...), with jobname followed by the
+			instance number, and the results are joined in the original order.
+
+			Each instance uses nproc processors and one ANSYS license.
+
+			Defaults to 1.
 
 		override : bool, optional
 			Attempts to delete the .lock file at working directory.
@@ -69,8 +92,8 @@ class ANSYS(object):
 	"""
 
 
-	def __init__(self, exec_loc=None, run_location=os.getcwd()+'\\ansys_anl\\', jobname='file',
-			     nproc=2, override=False, cleardir=False, add_flags=''):
+	def __init__(self, exec_loc=None, run_location=os.path.join(os.getcwd(), 'ansys_anl'), jobname='file',
+			     nproc=2, override=False, cleardir=False, add_flags='', instances=1):
 		"""
 		
 		"""
@@ -95,6 +118,11 @@ class ANSYS(object):
 		self.ANSYSprops['cleardir']  = cleardir
 		self.ANSYSprops['add_flags'] = add_flags
 
+		if type(instances) != int or instances < 1:
+			exception = Exception('The number of ANSYS instances must be an integer greater than 0.')
+			raise exception
+		self.ANSYSprops['instances'] = instances
+
 		# Create lists and set initial values
 
 		# Variables names
@@ -111,6 +139,18 @@ class ANSYS(object):
 		# Model properties
 		self.Model = {}
 
+		# Results cache, set with SetCache()
+		self._cache = None
+
+		# Results of the last Run(), with ERR and output variables
+		self._results = None
+
+		# Policy for simulations with errors, set with SetErrorPolicy()
+		self._errPolicy = {'policy': 'resubmit', 'attempts': 2, 'flags': []}
+
+		# Number of lines parsed at once from the results files
+		self._readChunk = 50000
+
 		# Defalts to print always
 		self.PrintR = True
 
@@ -123,6 +163,8 @@ class ANSYS(object):
 		self._PrintR('   Override lock file: \"%s\".' % self.ANSYSprops['override'])
 		self._PrintR('   Clear working directory: \"%s\".' % self.ANSYSprops['cleardir'])
 		self._PrintR('   Additional flags: \"%s\".' % self.ANSYSprops['add_flags'])
+		self._PrintR('   Number of ANSYS instances: \"%s\".' % self.ANSYSprops['instances'])
+		self._PrintR('   Simulations with errors: \"%s\".' % self._errPolicy['policy'])
 
 
 	def Info(self, act=False):
@@ -148,25 +190,32 @@ class ANSYS(object):
 			pass
 
 
-	def _writePDSfile(self):
+	def _Instances(self):
 		"""
-		Internal function to create/write the APDL file with the PDS analysis. (pdsrun.inp)
+		Internal function that returns a list with [run_location, jobname] of
+		each ANSYS instance.
 		"""
-		# Verify if self.length >0
-		if self.length <= 0:
-			exception = Exception('Before run you must define the length of the analysis with SetLength()'+
-									'and set the all the variables values.')
-			raise exception
+		run_location = pathlib.Path(self.ANSYSprops['run_location'])
+		if self.ANSYSprops['instances'] == 1:
+			return [[run_location, self.ANSYSprops['jobname']]]
 
-		# Run all the varInValues[var] looking for an empty
-		for each in self.varInNames:
-			if self.varInValues[each] == None:
-				exception = Exception('Input variable \"%s\" has no defined values.' % each)
-				raise exception
+		instances = []
+		for each in range(self.ANSYSprops['instances']):
+			instances.append([run_location / ('inst%d' % each),
+								'%s%d' % (self.ANSYSprops['jobname'], each)])
+
+		return instances
+
+
+	def _writePDSfile(self, run_location, values):
+		"""
+		Internal function to create/write the APDL file with the PDS analysis. (pdsrun.inp)
 
+		values is a dictionary with the values of each input variable.
+		"""
 		# Try to open the file for writing
 		try:
-			runfile = '%s\\pdsrun.inp' % self.ANSYSprops['run_location']
+			runfile = pathlib.Path(run_location) / 'pdsrun.inp'
 			f = open(runfile, 'wt')
 		except:
 			exception = Exception('Unable to open the pdsrun.inp file for writting.')
@@ -193,7 +242,7 @@ class ANSYS(object):
 			# Input variables
 			for each in self.varInNames:
 				# Variables are declared with uniform distribution betwen 1.5*maxval and 0.5*minval
-				cmd = 'PDVAR,%s,UNIF,%f,%f\n' % (each, min(0.5*min(self.varInValues[each]),-1), max(1,1.5*max(self.varInValues[each])))
+				cmd = 'PDVAR,%s,UNIF,%f,%f\n' % (each, min(0.5*min(values[each]),-1), max(1,1.5*max(values[each])))
 				f.write(cmd)
 
 			# Output/control variables
@@ -227,7 +276,7 @@ class ANSYS(object):
 
 
 
-	def _writeSAMPfile(self):
+	def _writeSAMPfile(self, run_location, values, rows):
 		"""
 		Internal function to create/write the sample points file to run the PDS. (current.samp)
 		The sample file format has the PDEXE name in the first line, and the second line is:
@@ -236,6 +285,9 @@ class ANSYS(object):
 
 		With a new column for each variable.
 		The values for ITER and CYCL are always 1, LOOP is the number of solution range(0 to length)
+
+		Just the samples with index in rows are written, from the values
+		dictionary with the values of each input variable.
 		"""
 
 		#
@@ -248,10 +300,10 @@ class ANSYS(object):
 		format = '%d %d %d'
 
 		# Create initial values array with ones
-		samparray = np.zeros([self.Length, 3+len(self.varInNames)]) + 1
+		samparray = np.zeros([len(rows), 3+len(self.varInNames)]) + 1
 
 		# Fill the loop column
-		samparray[:, 2] = range(1, self.Length+1)
+		samparray[:, 2] = range(1, len(rows)+1)
 
 		# Each variable will add his name at header and a %15.8E in the format
 		# A counter from 2 (3rd column)
@@ -266,14 +318,14 @@ class ANSYS(object):
 
 			# Place values
 			try:
-				samparray[:, i] = self.varInValues[each]
+				samparray[:, i] = values[each][rows]
 			except:
 				exception = Exception('Error while passing the values of \"%s\" to the current.samp file.' % each)
 				raise exception
 
 		# Save the file
 		try:
-			sampfile = '%s\\current.samp' % self.ANSYSprops['run_location']
+			sampfile = pathlib.Path(run_location) / 'current.samp'
 			np.savetxt(sampfile, samparray, delimiter=' ', newline='\n', header=header, comments='', fmt=format)
 		except:
 			exception = Exception('Error while passing the values of \"%s\" to the current.samp file.' % each)
@@ -309,103 +361,183 @@ class ANSYS(object):
 		"""
 
 		# Verify if the input script file exists
-		if not os.path.isfile(str(directory+'\\'+inputname)):
+		if not (pathlib.Path(directory) / inputname).is_file():
 			exception = Exception('Current input script file (\"%s\") does not exists in (\"%s\") to be copied.' % (inputname, directory))
 			raise exception
 
-		# Copy the script file to workdirectory with the name 'current.inp'
-		errcopy = os.system('copy /Y %s %s' % (str(directory+'\\'+inputname), str(self.ANSYSprops['run_location']+'\\current.inp')))
-		if errcopy != 0:
-			exception = Exception('It was not possible to copy the input script file. (\"%s\").' % str(directory+'\\'+inputname))
-			raise exception
-
-		# Copy the extra files
-		for each in extrafiles:
-			errcopy = os.system('copy /Y %s %s' % (str(directory+'\\'+each), str(self.ANSYSprops['run_location']+'\\'+each)))
-			if errcopy != 0:
-				exception = Exception('It was not possible to copy an extra file (\"%s\").' % each)
-				raise exception
-
 		# Clear last Model properties and set new
 		self.Model = {}
 		self.Model['inputname'] = inputname
 		self.Model['extrafiles'] = extrafiles
 		self.Model['directory'] = directory
 
+		# Hash of the model files, used by the results cache
+		modelhash = hashlib.sha256()
+		for each in [inputname]+list(extrafiles):
+			modelhash.update(each.encode())
+			try:
+				with open(pathlib.Path(directory) / each, 'rb') as f:
+					modelhash.update(f.read())
+			except:
+				exception = Exception('It was not possible to read the model file (\"%s\").' % each)
+				raise exception
+		self.Model['hash'] = modelhash.hexdigest()
+
+		# Copy files to the working directory of each instance
+		for [run_location, jobname] in self._Instances():
+			self._CopyModel(run_location)
+
 		self._PrintR('Input script file and extra files copied to working directory.')
 		self._PrintR('   Main APDL script: \"%s\".' % self.Model['inputname'])
 		self._PrintR('   Extra model files: \"%s\".' % self.Model['extrafiles'])
 		self._PrintR('   Input directory: \"%s\".' % self.Model['directory'])
 
 
-	def _ClearForRun(self):
+	def _CopyModel(self, run_location):
+		"""
+		Internal function to copy the model files from SetModel() to a working directory.
+		"""
+		directory = pathlib.Path(self.Model['directory'])
+		run_location = pathlib.Path(run_location)
+
+		# Instances directories are created here
+		try:
+			run_location.mkdir(parents=True, exist_ok=True)
+		except:
+			exception = Exception('Unable to create the ANSYS working directory (\"%s\").' % run_location)
+			raise exception
+
+		# Copy the script file to workdirectory with the name 'current.inp'
+		try:
+			shutil.copyfile(directory / self.Model['inputname'], run_location / 'current.inp')
+		except:
+			exception = Exception('It was not possible to copy the input script file. (\"%s\").' % (directory / self.Model['inputname']))
+			raise exception
+
+		# Copy the extra files
+		for each in self.Model['extrafiles']:
+			try:
+				shutil.copyfile(directory / each, run_location / each)
+			except:
+				exception = Exception('It was not possible to copy an extra file (\"%s\").' % each)
+				raise exception
+
+
+	def _ClearForRun(self, run_location, jobname):
 		"""
 		Internal function to clear the entire directory or just the lock file before running
 		"""
+		run_location = pathlib.Path(run_location)
+
 		# Verify the clear condition
 		if self.ANSYSprops['cleardir']:
-			# Try to clear the working directory
-			self._PrintR('Cleaning the files from ANSYS working directory (\"%s\").' % self.ANSYSprops['run_location'])
-			delhand = os.system('del /q %s\\*' % self.ANSYSprops['run_location'])
-			if delhand != 0:
+			# Try to clear the working directory (just files, as instances
+			#	directories can be inside it)
+			self._PrintR('Cleaning the files from ANSYS working directory (\"%s\").' % run_location)
+			try:
+				for each in run_location.iterdir():
+					if each.is_file():
+						each.unlink()
+			except:
 				exception = Exception('Unable to clear the ANSYS working directory.')
 				raise exception
 
 			# Put the model back in the working directory
-			self.SetModel(self.Model['inputname'], self.Model['extrafiles'], self.Model['directory'])
+			self._CopyModel(run_location)
 
 		else:
 			# Verify the override condition
-			lockfile = '%s\\%s.lock' % (self.ANSYSprops['run_location'], self.ANSYSprops['jobname'])
-			if self.ANSYSprops['override'] and os.path.isfile(lockfile):
+			lockfile = run_location / ('%s.lock' % jobname)
+			if self.ANSYSprops['override'] and lockfile.is_file():
 				self._PrintR('Deleting lock file.')
-				delhand = os.system('del /q %s' % lockfile)
-				if delhand != 0:
+				try:
+					lockfile.unlink()
+				except:
 					exception = Exception('Unable to delete lock file (\"%s\").' % lockfile)
 					raise exception
 
 			# Before execution ALWAYS erase the $jobname$.err file
 			self._PrintR('Deleting old error log file.')
-			errfile = '%s\\%s.err' % (self.ANSYSprops['run_location'], self.ANSYSprops['jobname'])
-			delhand = os.system('del /q %s' % errfile)
-		pass
+			errfile = run_location / ('%s.err' % jobname)
+			try:
+				if errfile.is_file():
+					errfile.unlink()
+			except:
+				pass
+
 
+	def _Popen(self, run_location, jobname, add_flags=''):
+		"""
+		Internal function that starts one ANSYS instance, without waiting for it,
+		and returns the subprocess.Popen object.
 
-	def _Run(self):
+		add_flags are used together with the ones from ANSYS properties.
+		"""
 		# ANSYS Run Parameters https://www.sharcnet.ca/Software/Ansys/16.2.3/en-us/help/ans_ope/Hlp_G_OPE3_1.html
 		# Ansys PDS commands = pdsrun.inp and out=pdsout.out
-		#
-		# DO NOT REMOVE THE SPACES BEFORE -np !
-		#
-		cmd = 'start "ANSYS" /d "%s" /min /wait /b "%s" " -smp -np %d -j %s -b -i pdsrun.inp -o pdsout.out %s" ' % (self.ANSYSprops['run_location'],
-				self.ANSYSprops['exec_loc'], self.ANSYSprops['nproc'], self.ANSYSprops['jobname'], self.ANSYSprops['add_flags'])
+		cmd = [self.ANSYSprops['exec_loc'], '-smp', '-np', '%d' % self.ANSYSprops['nproc'], '-j', jobname,
+				'-b', '-i', 'pdsrun.inp', '-o', 'pdsout.out']
+		cmd += shlex.split('%s %s' % (self.ANSYSprops['add_flags'], add_flags), posix=(os.name != 'nt'))
 
-		self._PrintR('Running ANSYS.')
+		# On Windows ANSYS runs without a console window
+		kwargs = {}
+		if os.name == 'nt':
+			kwargs['creationflags'] = 0x08000000 # CREATE_NO_WINDOW
 
-		# Get time before run ANSYS
-		timei = time.time()
-
-		ansyshand = os.system(cmd)
-		if ansyshand != 0:
-			exception = Exception('ANSYS exited with error id=%d. Please verify the output file (\"%s\").\n\n' %(ansyshand, self.ANSYSprops['run_location']+'\\pdsout.out'))
+		try:
+			return subprocess.Popen(cmd, cwd=str(run_location), stdin=subprocess.DEVNULL,
+									stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs)
+		except OSError as err:
+			exception = Exception('Unable to start ANSYS (\"%s\"): %s.' % (self.ANSYSprops['exec_loc'], err))
 			raise exception
 
-		# verify if it has an error on $jobname$.err
-		#errfile = '%s\\%s.err' % (self.ANSYSprops['run_location'], self.ANSYSprops['jobname'])
-		#f = open(errfile).read()
-		#if '*** ERROR ***' in f:
-		#	exception = Exception('ANSYS exited with an error. Please verify the output file (%s).\n\n' % (self.ANSYSprops['run_location']+'\\pdsout.out'))
-		#	raise exception
 
-		# Time after ANSYS
-		timef = time.time()
+	def _Launch(self, values, rows, add_flags=''):
+		"""
+		Internal function that writes the files and starts ANSYS to solve the
+		samples with index in rows, split betwen the instances.
 
-		self._PrintR('Solution is done. It took %f minutes.' % ((timef-timei)/60))
+		Returns a list with [process, run_location, jobname, rows] of each instance.
+		"""
+		# Split the samples betwen the instances
+		ninst = min(self.ANSYSprops['instances'], len(rows))
+		instRows = np.array_split(rows, ninst)
 
+		running = []
+		for idx in range(ninst):
+			[run_location, jobname] = self._Instances()[idx]
 
-	def Run(self):
+			# Performn the conditional clear
+			self._ClearForRun(run_location, jobname)
+
+			# Write the pdsrun.inp file
+			self._writePDSfile(run_location, values)
+
+			# Write the sample file
+			self._writeSAMPfile(run_location, values, instRows[idx])
+
+		if ninst == 1:
+			self._PrintR('Running ANSYS.')
+		else:
+			self._PrintR('Running %d ANSYS instances at the same time.' % ninst)
+
+		for idx in range(ninst):
+			[run_location, jobname] = self._Instances()[idx]
+			running.append([self._Popen(run_location, jobname, add_flags), run_location, jobname, instRows[idx]])
+
+		return running
+
+
+	def Submit(self):
 		"""
-		Execute the analysis on ANSYS.
+		Start the analysis on ANSYS and return without waiting for it.
+
+		Returns an ANSYSSubmission object, that can be used to verify if ANSYS
+		has finished (Poll()) and to wait for the results (Wait()). The values
+		of the variables are copied, so they can be changed while ANSYS runs.
+
+		Just one submission can be running at the same time, since the
+		working directories are the same.
 
 		"""
 		# Verify if model was set
@@ -418,17 +550,122 @@ class ANSYS(object):
 			exception = Exception('Before running ANSYS you must define output variables.')
 			raise exception
 
-		# Performn the conditional clear
-		self._ClearForRun()
+		# Verify if self.length >0
+		if self.length <= 0:
+			exception = Exception('Before run you must define the length of the analysis with SetLength()'+
+									'and set the all the variables values.')
+			raise exception
+
+		# Run all the varInValues[var] looking for an empty
+		for each in self.varInNames:
+			if self.varInValues[each] is None:
+				exception = Exception('Input variable \"%s\" has no defined values.' % each)
+				raise exception
 
-		# Write the pdsrun.inp file
-		self._writePDSfile()
+		# Copy of the values of this submission
+		values = {}
+		for each in self.varInNames:
+			values[each] = np.array(self.varInValues[each], dtype=float)
 
-		# Write the sample file
-		self._writeSAMPfile()
+		submission = ANSYSSubmission(self, values, self.length)
 
-		# Run
-		self._Run()
+		# Samples that must be solved, the others come from the cache
+		solveRows = np.arange(self.length)
+		if self._cache is not None:
+			[solveRows, hits] = self._CacheLookup(values, self.length)
+			for row in hits:
+				for each in submission.results:
+					submission.results[each][row] = hits[row][each]
+
+		submission._solveRows = solveRows
+		if len(solveRows) == 0:
+			self._PrintR('All the %d samples were found in the results cache, ANSYS will not run.' % self.length)
+		else:
+			submission._running = self._Launch(values, solveRows)
+
+		return submission
+
+
+	def Run(self):
+		"""
+		Execute the analysis on ANSYS and wait for it.
+
+		"""
+		self.Submit().Wait()
+
+
+	def _FailedRows(self, values, results, rows):
+		"""
+		Internal function that applies the error policy to the simulations with
+		index in rows, that finished with errors.
+		"""
+		if self._errPolicy['policy'] == 'drop':
+			self._PrintR('\nATTENTION:\n%d simulations finished with errors (ERR column), their results were dropped.\n' % len(rows)+
+				'The ERR column of these simulations is kept and their output values are NaN.\n')
+			for each in self.varOutNames:
+				results[each][rows] = np.nan
+		else:
+			exception = Exception('%d simulations finished with errors (ERR column of the PDS results file).\n' % len(rows)+
+				'The first one has the input values: %s.' % ', '.join(['%s=%E' % (each, values[each][rows[0]]) for each in self.varInNames]))
+			raise exception
+
+
+	def SetErrorPolicy(self, policy='resubmit', attempts=2, flags=[]):
+		"""
+		Define what is done with the simulations that finish with errors, that
+		are marked in the ERR column of the PDS results file.
+
+		Parameters
+		----------
+		policy : str, optional
+			Policy for simulations with errors:
+
+			* 'resubmit' : just the simulations with errors are solved again,
+			  in a smaller run, and the results are placed back in its rows.
+			  If they still have errors after all the attempts an exception
+			  is raised;
+
+			* 'drop' : the results are returned with the ERR column and NaN
+			  in the output variables of the simulations with errors;
+
+			* 'raise' : an exception is raised.
+
+			Defaults to 'resubmit'.
+
+		attempts : int, optional
+			Maximum number of times that the simulations are solved again with
+			'resubmit' policy. Defaults to 2.
+
+		flags : list of str, optional
+			Additional flags used by ANSYS in each attempt with 'resubmit' policy,
+			if there are more attempts than flags the last ones are used again.
+
+			It can be used to change solver options, or to change the mesh when
+			the script uses an APDL parameter for this, since ANSYS flags like
+			'-meshsize 0.9' define the parameter MESHSIZE=0.9.
+
+			Defaults to [], so nothing is changed.
+
+		"""
+		policy = policy.lower()
+		if policy not in ['resubmit', 'drop', 'raise']:
+			exception = Exception('Error policy must be \'resubmit\', \'drop\' or \'raise\'.')
+			raise exception
+
+		if type(attempts) != int or attempts < 0:
+			exception = Exception('The number of attempts must be an integer greater or equal to 0.')
+			raise exception
+
+		if type(flags) == str:
+			flags = [flags]
+
+		self._errPolicy = {'policy': policy, 'attempts': attempts, 'flags': list(flags)}
+
+		self._PrintR('Simulations with errors will be treated with \"%s\" policy.' % policy)
+		if policy == 'resubmit':
+			self._PrintR('   Maximum number of attempts: %d.' % attempts)
+			if flags != []:
+				self._PrintR('   Additional flags of each attempt: %s.' % flags)
 
 
 	@property
@@ -457,7 +694,7 @@ class ANSYS(object):
 
 		# if at least one InValue is set can't change de length
 		for each in self.varInNames:
-			if self.varInValues[each] != None:
+			if self.varInValues[each] is not None:
 				valuesset = True
 				exception = Exception('At least one value were already set to INPUT variables. \n'+
 							'To change the length you have to clear the variables values with ClearValues().')
@@ -603,44 +840,246 @@ class ANSYS(object):
 
 		"""
 
-		# Verify the existence of results file "$jobname$_current.pdrs"
-		resultsfile = '%s\\%s_current.pdrs' % (self.ANSYSprops['run_location'], self.ANSYSprops['jobname'])
-		if os.path.isfile(resultsfile):
+		if self._results is not None:
+			# Results from the last Run() or Submit()
+			results = {}
+			for each in self._results:
+				results[each] = np.copy(self._results[each])
 
-			# Import the results file
-			self._PrintR('Importing results from PDS results file (\"%s\").' % resultsfile)
-			resultsALL = np.genfromtxt(resultsfile, names=True, skip_header=1)
+		else:
+			# Results from the main instance, without knowing the samples
+			[run_location, jobname] = self._Instances()[0]
+			results = self._ReadResults(run_location, jobname, self.length)
 
 			# Verify the existence of ERRORS
-			errorcount = resultsALL['ERR'].sum()
+			errorcount = results['ERR'].sum()
 			if errorcount > 0:
 				self._PrintR('\n\n\nATTENTION:\nThe 4th column in the results file called ERR warns about simulations that results should not be used.\n'+
 					  'Current file has %d errors, you can acces this in the column ERR returned with the results.\n\n\n' % errorcount)
-				_ = input('The execution is paused, press ENTER to continue.\n')
 
-			# Get all the columns in varOutNames and varInNames the specified length
-			results = {}
-			#results['ERR'] = np.copy(resultsALL['ERR'][:self.length])
-			results['ERR'] = np.copy(resultsALL['ERR'])
+		return results
 
-			#for each in self.varInNames:
-			#	results[each] = np.copy(resultsALL[each])
 
-			for each in self.varOutNames:
-				# This prevent bugs with 1 line results 
-				results[each] = np.atleast_1d(resultsALL[each])
-
-			for each in results:
-				if results[each].size > self.length:
-					results[each] = results[each][:self.length]
+	def _ReadResults(self, run_location, jobname, nrows):
+		"""
+		Internal function that reads the results file of one instance and returns
+		a dictionary with ERR and all the varOutNames columns.
 
-			return results
-		else:
+		Only these columns are parsed, in chunks of lines, directly to arrays
+		with nrows values (the number of samples sent to the instance).
+		"""
+		# Verify the existence of results file "$jobname$_current.pdrs"
+		resultsfile = pathlib.Path(run_location) / ('%s_current.pdrs' % jobname)
+		if not resultsfile.is_file():
 			# There is no results
 			exception = Exception('There is no results file in current ANSYS working directory. \n'+
 								  'Please verify if the analysis was run.')
 			raise exception
 
+		self._PrintR('Importing results from PDS results file (\"%s\").' % resultsfile)
+		timei = time.time()
+
+		names = ['ERR']+self.varOutNames
+		values = np.zeros([nrows, len(names)])
+		row = 0
+
+		with open(resultsfile, 'rt') as f:
+			# First line is the PDEXE name and the second has the columns names
+			f.readline()
+			header = f.readline().upper().split()
+
+			# Columns that are used
+			cols = []
+			for each in names:
+				if each not in header:
+					exception = Exception('The variable \"%s\" is not in the PDS results file (\"%s\").' % (each, resultsfile))
+					raise exception
+				cols.append(header.index(each))
+
+			# Read chunks of lines until the end of file or nrows
+			while row < nrows:
+				lines = list(itertools.islice(f, min(self._readChunk, nrows-row)))
+				if lines == []:
+					break
+				chunk = np.loadtxt(lines, usecols=cols, ndmin=2)
+				values[row:row+chunk.shape[0], :] = chunk
+				row += chunk.shape[0]
+
+		if row < nrows:
+			exception = Exception('The PDS results file (\"%s\") has %d results, but %d samples were solved.' % (resultsfile, row, nrows))
+			raise exception
+
+		timef = time.time()
+		if timef > timei:
+			self._PrintR('   %d results read in %f seconds (%.0f results per second).' % (nrows, timef-timei, nrows/(timef-timei)))
+
+		results = {}
+		for idx, each in enumerate(names):
+			results[each] = values[:, idx]
+
+		return results
+
+
+	def SetCache(self, cachefile=None, digits=10):
+		"""
+		Turn on the results cache. Before each Run() the samples are searched
+		in the cache and just the ones that are not there are sent to ANSYS,
+		after that the new results are saved in the cache.
+
+		Each result is identified by the model files from SetModel() (their
+		contents), the names of the input and output variables and the values
+		of the input variables rounded to some significant digits.
+
+		Simulations with errors (ERR column) are never saved.
+
+		Parameters
+		----------
+		cachefile : str, optional
+			SQLite database file where the results are saved, so they can be
+			used again by other analyses, even after Python is closed. The file
+			is created if it doesn't exist.
+
+			If it's None the results are kept only in memory.
+
+			Defaults to None.
+
+		digits : int, optional
+			Number of significant digits of the input values that are compared
+			to find a result in the cache.
+
+			Defaults to 10.
+
+		"""
+		if type(digits) != int or digits < 1:
+			exception = Exception('The number of significant digits of the cache must be an integer greater than 0.')
+			raise exception
+
+		self._cache = {'file': cachefile, 'digits': digits, 'memory': {}}
+
+		if cachefile is not None:
+			try:
+				with sqlite3.connect(cachefile) as con:
+					con.execute('CREATE TABLE IF NOT EXISTS results '+
+								'(model TEXT, point TEXT, results TEXT, PRIMARY KEY (model, point))')
+				con.close()
+			except:
+				exception = Exception('Unable to open the results cache file (\"%s\").' % cachefile)
+				raise exception
+
+			self._PrintR('Results cache turned on, saving results in \"%s\".' % cachefile)
+		else:
+			self._PrintR('Results cache turned on, saving results in memory.')
+
+		self._PrintR('   Input values compared with %d significant digits.' % digits)
+
+
+	def ClearCache(self, act=False):
+		"""
+		Turn off the results cache.
+
+		Parameters
+		----------
+		act : bool, optional
+			If it's True all the results saved in the cache are deleted too,
+			from memory and from the cache file.
+
+			Defaults to False.
+
+		"""
+		if self._cache is not None and act:
+			if self._cache['file'] is not None:
+				with sqlite3.connect(self._cache['file']) as con:
+					con.execute('DELETE FROM results')
+				con.close()
+			self._PrintR('All the results saved in the cache were deleted.')
+
+		self._cache = None
+		self._PrintR('Results cache turned off.')
+
+
+	def _CacheKeys(self, values, rows):
+		"""
+		Internal function that returns the model key and a list with the point
+		key of each sample in rows.
+		"""
+		# Model key, the same model with other variables gives other results
+		modelkey = hashlib.sha256()
+		modelkey.update(self.Model['hash'].encode())
+		modelkey.update(' '.join(self.varInNames).encode())
+		modelkey.update(' '.join(self.varOutNames).encode())
+		modelkey = modelkey.hexdigest()
+
+		# Point keys from rounded values, 0.0 is added to remove -0.0
+		fmt = '%%.%de' % (self._cache['digits']-1)
+		rounded = [values[each][rows]+0.0 for each in self.varInNames]
+		keys = []
+		for idx in range(len(rows)):
+			keys.append(' '.join([fmt % each[idx] for each in rounded]))
+
+		return [modelkey, keys]
+
+
+	def _CacheLookup(self, values, length):
+		"""
+		Internal function that searches the samples in the cache, returns the rows
+		that must be solved and a dictionary with the results found {row: {var: value}}.
+		"""
+		allrows = np.arange(length)
+		[modelkey, keys] = self._CacheKeys(values, allrows)
+
+		memory = self._cache['memory'].setdefault(modelkey, {})
+		found = {}
+		if self._cache['file'] is not None:
+			with sqlite3.connect(self._cache['file']) as con:
+				for key in set(keys):
+					if key in memory:
+						continue
+					line = con.execute('SELECT results FROM results WHERE model=? AND point=?',
+										(modelkey, key)).fetchone()
+					if line is not None:
+						found[key] = json.loads(line[0])
+			con.close()
+		found.update(memory)
+
+		solveRows = []
+		hits = {}
+		for idx in allrows:
+			if keys[idx] in found:
+				hits[idx] = found[keys[idx]]
+			else:
+				solveRows.append(idx)
+
+		self._PrintR('%d of %d samples were found in the results cache.' % (len(hits), length))
+
+		return [np.array(solveRows, dtype=int), hits]
+
+
+	def _CacheStore(self, values, rows, results):
+		"""
+		Internal function that saves the results of rows in the cache, just
+		the ones without errors.
+		"""
+		rows = np.asarray(rows, dtype=int)
+		rows = rows[results['ERR'][rows] == 0]
+		if len(rows) == 0:
+			return
+
+		[modelkey, keys] = self._CacheKeys(values, rows)
+
+		memory = self._cache['memory'].setdefault(modelkey, {})
+		lines = []
+		for idx in range(len(rows)):
+			rowResults = {}
+			for each in results:
+				rowResults[each] = float(results[each][rows[idx]])
+			memory[keys[idx]] = rowResults
+			lines.append((modelkey, keys[idx], json.dumps(rowResults)))
+
+		if self._cache['file'] is not None:
+			with sqlite3.connect(self._cache['file']) as con:
+				con.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?)', lines)
+			con.close()
+
 
 	def ClearAll(self):
 		"""
@@ -653,6 +1092,7 @@ class ANSYS(object):
 		self.varInValues = {}
 		self.varOutValues = {}
 		self.length = 0
+		self._results = None
 		#self.PrintR = False
 
 		self._PrintR('All the properties were cleared (not from ANSYS object).')
@@ -669,4 +1109,136 @@ class ANSYS(object):
 		for each in self.varOutNames:
 			self.varOutValues[each] = None
 
+		self._results = None
+
 		self._PrintR('The values of all variables were cleared. Now you can change the length parameter.')
+
+
+
+class ANSYSSubmission(object):
+	"""
+	Handle of an analysis started with ANSYS.Submit(), it's used to verify if
+	ANSYS has finished and to get the results.
+
+	The simulations with errors are treated when Wait() is called, following
+	the error policy of the ANSYS object.
+
+	"""
+
+	def __init__(self, ansys, values, length):
+		"""
+
+		"""
+		self.ansys = ansys
+		self.values = values
+		self.length = length
+
+		# Results of all samples
+		self.results = {}
+		for each in ['ERR']+ansys.varOutNames:
+			self.results[each] = np.zeros(length)
+
+		# Samples sent to ANSYS and the running instances
+		self._solveRows = np.zeros(0, dtype=int)
+		self._running = []
+		self._timei = time.time()
+		self._done = False
+		self._cancelled = False
+
+
+	def Poll(self):
+		"""
+		Return True if ANSYS has finished, without waiting.
+
+		"""
+		for each in self._running:
+			if each[0].poll() is None:
+				return False
+		return True
+
+
+	def Wait(self):
+		"""
+		Wait for ANSYS, treat the simulations with errors and return the results,
+		like ANSYS.GetVarOutValues().
+
+		"""
+		if self._cancelled:
+			exception = Exception('This ANSYS submission was cancelled.')
+			raise exception
+
+		if not self._done:
+			ansys = self.ansys
+			self._Collect()
+
+			# Simulations with errors (ERR column) are solved again
+			failed = self._solveRows[self.results['ERR'][self._solveRows] != 0]
+			attempt = 0
+			errPolicy = ansys._errPolicy
+			while len(failed) > 0 and errPolicy['policy'] == 'resubmit' and attempt < errPolicy['attempts']:
+				attempt += 1
+				add_flags = ''
+				if errPolicy['flags'] != []:
+					add_flags = errPolicy['flags'][min(attempt, len(errPolicy['flags']))-1]
+
+				ansys._PrintR('%d simulations finished with errors, solving them again (attempt %d of %d).' % (len(failed), attempt, errPolicy['attempts']))
+				if add_flags != '':
+					ansys._PrintR('   Additional flags: \"%s\".' % add_flags)
+
+				self._running = ansys._Launch(self.values, failed, add_flags)
+				self._Collect()
+				failed = failed[self.results['ERR'][failed] != 0]
+
+			# Save the new results
+			if ansys._cache is not None and len(self._solveRows) > 0:
+				ansys._CacheStore(self.values, self._solveRows, self.results)
+
+			self._done = True
+			ansys._results = self.results
+
+			if len(failed) > 0:
+				ansys._FailedRows(self.values, self.results, failed)
+
+		results = {}
+		for each in self.results:
+			results[each] = np.copy(self.results[each])
+
+		return results
+
+
+	def Cancel(self):
+		"""
+		Stop the ANSYS instances of this submission.
+
+		"""
+		for each in self._running:
+			if each[0].poll() is None:
+				each[0].kill()
+				each[0].wait()
+		self._running = []
+		self._cancelled = True
+		self.ansys._PrintR('ANSYS submission cancelled.')
+
+
+	def _Collect(self):
+		"""
+		Internal function that waits for the running instances and places
+		their results in the rows of its samples.
+		"""
+		ansys = self.ansys
+
+		for [process, run_location, jobname, rows] in self._running:
+			exitcode = process.wait()
+			if exitcode != 0:
+				exception = Exception('ANSYS exited with error id=%d. Please verify the output file (\"%s\").\n\n' % (exitcode, pathlib.Path(run_location) / 'pdsout.out'))
+				raise exception
+
+		ansys._PrintR('Solution is done. It took %f minutes.' % ((time.time()-self._timei)/60))
+
+		for [process, run_location, jobname, rows] in self._running:
+			instResults = ansys._ReadResults(run_location, jobname, len(rows))
+			for each in self.results:
+				self.results[each][rows] = instResults[each]
+
+		self._running = []
+		self._timei = time.time()
@@ -9,7 +9,11 @@ Docs are available at https://dutitello.github.io/parAnsys/
 import os
 import time
 from paransys.ansys import ANSYS
+from paransys.limstate import LimState
 import numpy as np
+import concurrent.futures
+import threading
+import json
 import scipy.stats
 from math import * # It's necessry to evaluate limit states
 import math
@@ -55,6 +59,14 @@ class FORM(object):
 		self.PrintR = True
 		self.limstate = None
 		self._userf = None
+		self._limstate = None
+		self._gradient = None
+
+		# Pool of workers used by Run()
+		self._pool = None
+		self._workers = 1
+		# Lockstep batch used by RunBatch()
+		self._batch = None
 		self.variableDistrib = {}
 		self.variableConst = {}
 		self.variableStartPt = {}
@@ -71,16 +83,25 @@ class FORM(object):
 		self._options['iHLRF_par_b'] = 0.50
 		self._options['iHLRF_step_lambdk_test'] = 4
 		self._options['rHLRF_relax'] = 0.50
+		self._options['PHE_gamma'] = 1.00
+		self._options['PHE_scale'] = 10.0
+		self._options['iHLRF_speculative_grad'] = False
 		self._options['APDLdebug'] = False
+		self._options['grad_update'] = False
+		self._options['grad_refresh'] = 5
 
 		# After
 		self.variableDesPt = {}
 		self.results = {}
 		self._stnumb = 99
+		# Points simulated by ANSYS on last cycle, with inputs and outputs
+		self._lastEvalPts = None
+		# Last result returned by Run()
+		self._lastResult = None
 
 
-	def ANSYS(self, exec_loc=None, run_location=os.getcwd()+'\\ansys_anl\\', jobname='file',
-			     nproc=2, override=False, cleardir=False, add_flags=''):
+	def ANSYS(self, exec_loc=None, run_location=os.path.join(os.getcwd(), 'ansys_anl'), jobname='file',
+			     nproc=2, override=False, cleardir=False, add_flags='', instances=1):
 		"""
 		If ANSYS will be used it defines ANSYS properties, for initialize the
 		paransys.ANSYS class.
@@ -98,7 +119,7 @@ class FORM(object):
 			ANSYS jobname. Defaults to 'file'.
 
 		nproc : int, optional
-			Number of processors. Defaults to 2.
+			Number of processors used by each ANSYS instance. Defaults to 2.
 
 		override : bool, optional
 			Attempts to delete the .lock file at working directory.
@@ -115,10 +136,14 @@ class FORM(object):
 			Do not use '-b -i -o'
 			Flags can be found at https://www.sharcnet.ca/Software/Ansys/16.2.3/en-us/help/ans_ope/Hlp_G_OPE3_1.html
 
+		instances : int, optional
+			Number of ANSYS instances running at the same time, the samples of
+			each ANSYS run are split betwen them. Defaults to 1.
+
 		"""
 		self.ansys = ANSYS(exec_loc=exec_loc, run_location=run_location,
 								jobname=jobname, nproc=nproc, override=override,
-								cleardir=cleardir, add_flags=add_flags)
+								cleardir=cleardir, add_flags=add_flags, instances=instances)
 
 		self._ANSYS = True
 
@@ -199,6 +224,70 @@ class FORM(object):
 			raise exception
 
 
+	def SetANSYSCache(self, cachefile=None, digits=10):
+		"""
+		Turn on the cache of ANSYS results, so samples that were already solved
+		(in this analysis or in other ones saved in cachefile) are not sent to
+		ANSYS again.
+
+		Parameters
+		----------
+		cachefile : str, optional
+			SQLite database file where the results are saved. If it's None the
+			results are kept only in memory. Defaults to None.
+
+		digits : int, optional
+			Number of significant digits of the input values that are compared
+			to find a result in the cache. Defaults to 10.
+		"""
+		if self._ANSYS:
+			self.ansys.SetCache(cachefile, digits)
+		else:
+			exception = Exception('ANSYS not declared yet. Before set ANSYS '+
+				'cache you must define ANSYS properties with ANSYS(...).')
+			raise exception
+
+
+	def SetANSYSErrorPolicy(self, policy='resubmit', attempts=2, flags=[]):
+		"""
+		Define what is done with ANSYS simulations that finish with errors
+		(ERR column of PDS results file).
+
+		Parameters
+		----------
+		policy : str, optional
+			'resubmit' solves again just the simulations with errors, 'drop'
+			returns them with NaN results and 'raise' raises an exception.
+			Defaults to 'resubmit'.
+
+			With FORM 'drop' can't be used, since all the points are needed.
+
+		attempts : int, optional
+			Maximum number of attempts with 'resubmit' policy. Defaults to 2.
+
+		flags : list of str, optional
+			Additional ANSYS flags used in each attempt with 'resubmit' policy.
+			Defaults to [].
+		"""
+		if self._ANSYS:
+			self.ansys.SetErrorPolicy(policy, attempts, flags)
+		else:
+			exception = Exception('ANSYS not declared yet. Before set ANSYS '+
+				'error policy you must define ANSYS properties with ANSYS(...).')
+			raise exception
+
+
+	def _VerifyANSYSErrors(self, resANSYS):
+		"""
+		Internal function that stops FORM when ANSYS returns simulations with
+		errors, since all the points are needed.
+		"""
+		if resANSYS['ERR'].sum() > 0:
+			exception = Exception('ANSYS returned %d simulations with errors and FORM needs all of them.\n' % resANSYS['ERR'].sum()+
+				'Use the \'resubmit\' or \'raise\' error policy on ANSYS with FORM.')
+			raise exception
+
+
 	# Setting distribution of variables
 	def CreateVar(self, name, distrib, mean, std=0, cv=None, par1=None, par2=None):
 		"""
@@ -336,14 +425,24 @@ class FORM(object):
 				* HLRF: Hasofer Lind Rackwitz and Fiessler method.
 
 				* iHLRF: improved Hasofer Lind Rackwitz and Fiessler method.
+
+				* rHLRF: relaxed Hasofer Lind Rackwitz and Fiessler method.
+
+				* SQP: sequential quadratic programming.
+
+				* PHE: Polak-He method.
 		"""
 
-		if diff not in ['center', 'forward', 'backward']:
+		if diff not in ['center', 'forward', 'backward', 'complex']:
 			exception = Exception('Invalid derivative method.')
 			raise exception
 
-		if min(maxIter, tolRel, dh) >= 0 and meth in ['HLRF', 'iHLRF', 'rHLRF'] and \
-			diff in ['center', 'forward', 'backward']:
+		if diff == 'complex' and self._ANSYS and self._gradient is None:
+			exception = Exception('Complex step derivatives can\'t be used with ANSYS, since its results are real.')
+			raise exception
+
+		if min(maxIter, tolRel, dh) >= 0 and meth in ['HLRF', 'iHLRF', 'rHLRF', 'SQP', 'PHE'] and \
+			diff in ['center', 'forward', 'backward', 'complex']:
 
 			# Save controls variable
 			self.controls['maxIter'] = maxIter
@@ -361,8 +460,11 @@ class FORM(object):
 				self._PrintR('   Absolute LS error tolerance: auto.')
 			else:
 				self._PrintR('   Absolute LS error tolerance: %2.3E.' % tolLS)
-			self._PrintR('   deltah (for derivatives): %2.3E.' % dh)
-			self._PrintR('   Finite difference method: %s.' % diff)
+			if self._gradient is not None:
+				self._PrintR('   Gradient from user function.')
+			else:
+				self._PrintR('   deltah (for derivatives): %2.3E.' % dh)
+				self._PrintR('   Finite difference method: %s.' % diff)
 			self._PrintR('   FORM Method: %s.' % meth)
 
 		else:
@@ -370,7 +472,7 @@ class FORM(object):
 			raise exception
 
 
-	def SetLimState(self, equat, userf=None):
+	def SetLimState(self, equat, userf=None, vectorized=False, gradient=None):
 		"""
 		Set the limit state equation.
 
@@ -392,6 +494,36 @@ class FORM(object):
 			and whatever for evaluate the R part of your limit state function
 			for a concrete beam. An example is showed after.
 
+		vectorized : bool, optional
+			The points used for the gradient (and the iHLRF line search) are
+			evaluated at once, string equations are evaluated over arrays with
+			math functions (``sin()``, ``sqrt()``, ``exp()``...) replaced by
+			NumPy ones. When it isn't possible they are evaluated one point each
+			time.
+
+			User functions (userf or a function as equat) are called one time
+			for each point, unless vectorized is True, when they receive NumPy
+			arrays with the values of all points and must return an array with
+			the limit state values.
+
+			Defaults to False.
+
+		gradient : function, optional
+			Python function that returns the gradient of the limit state, used
+			in place of finite differences, so each iteration needs just one
+			evaluation of the limit state.
+
+			It receives all the variables as keywords, like a function used as
+			equat, and returns a dictionary with the derivative of the limit state
+			for each random variable (missing variables have derivative 0), or
+			a list/array with the derivatives in the same order that random
+			variables were created.
+
+			When ANSYS is used the derivatives must consider ANSYS results, since
+			ANSYS is called just for the design point.
+
+			Defaults to None.
+
 		First example: if ANSYS returns the maximum load on a truss as variable
 		FxMAX, and applied loads to be tested are ``(g+q)*sin(theta)``, where
 		``g``, ``q``, theta are defined random variables created with ``CreateVar()``.
@@ -438,6 +570,15 @@ class FORM(object):
 		# Store it
 		self.limstate = equat
 		
+		# Compiled limit state, used for evaluations
+		self._limstate = LimState(equat, userf, vectorized)
+
+		# User gradient
+		if gradient is not None and not callable(gradient):
+			exception = Exception('The gradient must be a Python function.')
+			raise exception
+		self._gradient = gradient
+
 		if(type(self.limstate) == str):
 			# String equation
 			# Change equation to lowcase
@@ -555,6 +696,54 @@ class FORM(object):
 			* iHLRF_step_lambdk_test : float
 			  Size of ``lambdak`` test block, after each block convergence is checked.
 
+			  The iHLRF line search options are also used by SQP and PHE methods.
+
+			* iHLRF_speculative_grad : bool
+			  With ANSYS, the first block of line search also simulates the
+			  finite differences points around the first step (``lambdak=1``).
+			  When this step is accepted the next cycle doesn't run ANSYS.
+			  The design point accepted by line search is always reused by the
+			  next cycle. Defaults to False.
+
+		For rHLRF method:
+			* rHLRF_relax : float
+			  Relaxation factor applied over the HLRF step. Defaults to 0.50.
+
+		For PHE method:
+			* PHE_gamma : float
+			  Positive weight of the limit state violation on the Polak-He
+			  search direction. Defaults to 1.00.
+
+			* PHE_scale : float
+			  Norm of the limit state gradient on the start point after scaling.
+			  Large values make PHE steps close to HLRF ones, small values make
+			  them shorter and safer. Defaults to 10.0.
+
+		For gradient updates with finite differences:
+			* grad_update : str or False
+			  Quasi-Newton rank-one update used to obtain the gradient from
+			  the design point of the last cycle, skipping the finite differences
+			  on some cycles (with ANSYS each of these cycles solves just the
+			  design point). It could be:
+
+				- ``'broyden'``: Broyden update of the gradient, by the secant
+				  between last and current design points;
+
+				- ``'sr1'``: the gradient is moved by a symmetric rank-one (SR1)
+				  approximation of the Hessian, learned from the finite
+				  differences gradients.
+
+			  When iHLRF line search points are available they are used to
+			  evaluate the curvature on the search direction. The full gradient
+			  is evaluated on the first cycle, each ``grad_refresh`` cycles,
+			  when the Schwarz inequality betwen y* and gradG gets worse and to
+			  confirm the convergence. It's ignored with gradient functions or
+			  complex step. Defaults to False.
+
+			* grad_refresh : int
+			  Maximum of cycles betwen two finite differences gradients, when
+			  ``grad_update`` is used. Defaults to 5.
+
 		For analyses using ANSYS:
 			* APDLdebug: bool
 			  If it's true it will be print the dict with results imported from ANSYS
@@ -625,79 +814,349 @@ class FORM(object):
 		self._PrintR('Correlation betwen \"%s\" and \"%s\" set as %f.' %(var1, var2, correl))
 
 
-	def _EquivNormal(self, name, pt):
+	def _SetTransform(self):
+		"""
+		Internal function that computes the parameters of all random variables
+		distributions once, grouped by distribution type with the ids of the
+		variables, so the transformations are done with one array operation
+		for each type.
+
+		Parameters stored are:
+			* gauss : [ids, mean, std]
+			* logn : [ids, qsi, lambda]
+			* gumbel : [ids, loc, scale]
 		"""
-		Internal function that determines the equivalent normal distribution parameters
+		groups = {'gauss': [[], [], []], 'logn': [[], [], []], 'gumbel': [[], [], []]}
+
+		for eachVar in self.variableDistrib:
+			var = self.variableDistrib[eachVar]
+
+			# Gaussian
+			if var[0] == 'gauss':
+				pars = [var[1], var[2]]
+
+			# Lognormal
+			elif var[0] == 'logn':
+				qsi = math.sqrt(math.log(1 + (var[3])**2))
+				lmbd = math.log(var[1]) - 0.5*qsi**2
+				pars = [qsi, lmbd]
+
+			# Gumbel
+			elif var[0] == 'gumbel':
+				scl = math.sqrt(6)*var[2]/math.pi
+				loc = var[1] - 0.57721*scl
+				pars = [loc, scl]
+
+			# What??
+			else:
+				exception = Exception('This couldnt happen!')
+				raise exception
+
+			groups[var[0]][0].append(self.varId[eachVar])
+			groups[var[0]][1].append(pars[0])
+			groups[var[0]][2].append(pars[1])
+
+		self._transform = {}
+		for each in groups:
+			self._transform[each] = [np.array(groups[each][0], dtype=int),
+									 np.array(groups[each][1]), np.array(groups[each][2])]
+
+
+	def _EquivNormalArray(self, pts):
+		"""
+		Internal function that determines the equivalent normal distribution
+		parameters of all random variables.
 
 		Parameters
 		----------
-		name : str, obligatory
-			Name of variable that is being transformed.
-
-		pt : float, obligatory
-			Point that is being transformed.
+		pts : np.array, obligatory
+			Values of random variables, in varId order, as a 1D array for one
+			point or as a 2D array with one point in each line.
 
 		Returns
 		-------
 		[mean, std] where:
-			* mean : float
-			  Equivalent normal mean
+			* mean : np.array
+			  Equivalent normal means, with the same shape of pts.
 
-			* std : float
-		      Equivalent normal standard deviation.
+			* std : np.array
+			  Equivalent normal standard deviations, with the same shape of pts.
 		"""
+		pts = np.asarray(pts, dtype=float)
+		mean = np.zeros(pts.shape)
+		std = np.zeros(pts.shape)
+
+		# Gaussian: doesn't need to transform
+		[ids, mu, sd] = self._transform['gauss']
+		if len(ids) > 0:
+			mean[..., ids] = mu
+			std[..., ids] = sd
+
+		# Lognormal: analitycal since lognormal is derivated from normal
+		[ids, qsi, lmbd] = self._transform['logn']
+		if len(ids) > 0:
+			x = pts[..., ids]
+			std[..., ids] = x*qsi
+			mean[..., ids] = x*(1-np.log(x)+lmbd)
+
+		# Gumbel: with PDF/CDF functions
+		#	invCum = icdf(gumbel_cdf())
+		[ids, loc, scl] = self._transform['gumbel']
+		if len(ids) > 0:
+			x = pts[..., ids]
+			invCum = scipy.stats.norm.ppf(scipy.stats.gumbel_r.cdf(x, loc, scl), 0, 1)
+			std[..., ids] = scipy.stats.norm.pdf(invCum, 0, 1) / scipy.stats.gumbel_r.pdf(x, loc, scl)
+			mean[..., ids] = x - invCum*std[..., ids]
 
-		# Copy the data to var
-		name = name.lower()
-		var = self.variableDistrib[name]
-
-		# Gaussian
-		if var[0] == 'gauss':
-			# Doesn't need to transform
-			mean = var[1]
-			std = var[2]
-
-		# Lognormal
-		elif var[0] == 'logn':
-			# LogNormal parameters
-			qsi = math.sqrt(math.log(1 + (var[3])**2))
-			lmbd = math.log(var[1]) - 0.5*qsi**2
-
-			# Equiv parametes: analitycal since lognormal is derivated from normal
-			std = pt*qsi
-			mean = pt*(1-math.log(pt)+lmbd)
-
-		# Gumbel
-		elif var[0] == 'gumbel':
-			# Gumbel parameters
-			scl = math.sqrt(6)*var[2]/math.pi
-			loc = var[1] - 0.57721*scl
-
-			# Equiv with PDF/CDF functions
-			# Gumbel pdf: scipy.stats.gumbel_r.pdf(x, loc, scl)
-			# Gumbel cdf: scipy.stats.gumbel_r.cdf(x, loc, scl)
-			# Normal pdf: scipy.stats.norm.pdf(x, mu, std)
-			# Normal cdf: scipy.stats.norm.cdf(x, mu, std)
-			# Normal icdf: scipy.stats.norm.ppf(q, mu, std)
-
-			# invCum = icdf(gumbel_cdf())
-			invCum = scipy.stats.gumbel_r.cdf(pt, loc, scl)
-			invCum = scipy.stats.norm.ppf(invCum, 0, 1)
-
-			std = scipy.stats.norm.pdf(invCum, 0, 1) / scipy.stats.gumbel_r.pdf(pt, loc, scl)
-			mean = pt - invCum*std
-
-		# What??
+		return [mean, std]
+
+
+	def _NormalToX(self, z):
+		"""
+		Internal function that transforms standard normal values ``z`` (in varId
+		order, 1D or 2D with one point in each line) to the random variables
+		space, by the inverse of their CDF, ``x = F^-1(Phi(z))``.
+		"""
+		z = np.asarray(z, dtype=float)
+		x = np.zeros(z.shape)
+
+		[ids, mu, sd] = self._transform['gauss']
+		if len(ids) > 0:
+			x[..., ids] = mu + sd*z[..., ids]
+
+		[ids, qsi, lmbd] = self._transform['logn']
+		if len(ids) > 0:
+			x[..., ids] = np.exp(lmbd + qsi*z[..., ids])
+
+		# Gumbel icdf: loc - scl*log(-log(p)), with log(Phi(z)) for the tails
+		[ids, loc, scl] = self._transform['gumbel']
+		if len(ids) > 0:
+			x[..., ids] = loc - scl*np.log(-scipy.special.log_ndtr(z[..., ids]))
+
+		return x
+
+
+	def _LogPdfDer(self, pts):
+		"""
+		Internal function that returns the derivatives of the logarithm of
+		random variables PDF, ``f'(x)/f(x)``, used by the second derivatives
+		of the transformation to standard normal space.
+		"""
+		pts = np.asarray(pts, dtype=float)
+		der = np.zeros(pts.shape)
+
+		[ids, mu, sd] = self._transform['gauss']
+		if len(ids) > 0:
+			der[..., ids] = -(pts[..., ids] - mu)/sd**2
+
+		[ids, qsi, lmbd] = self._transform['logn']
+		if len(ids) > 0:
+			x = pts[..., ids]
+			der[..., ids] = -(1 + (np.log(x) - lmbd)/qsi**2)/x
+
+		[ids, loc, scl] = self._transform['gumbel']
+		if len(ids) > 0:
+			der[..., ids] = (np.exp(-(pts[..., ids] - loc)/scl) - 1)/scl
+
+		return der
+
+
+	def _DiffPoints(self, vecPts, vecMean, dh, diff, NOutVars):
+		"""
+		Internal function that mounts the matrix of points used by finite
+		differences, being the line 0 the design point ``vecPts`` (with
+		constant values).
+		"""
+		NInRandVars = len(vecMean)
+		NInConstVars = len(vecPts)-NInRandVars
+
+		if diff == 'center':
+			# size is 1+2*NInRandVars
+			matEvalPts = np.zeros([(1+2*NInRandVars+NInConstVars), (NInRandVars+NInConstVars+NOutVars)])
+			# All lines starts with design point/constant values, after random variables replace it
+			matEvalPts[:, 0:(NInRandVars+NInConstVars)] = vecPts
+
+			# Lines from [1,end] with step=2, odd lines are +h and even
+			#	lines are -h, each pair for one random variable
+			matEvalPts[1:(1+2*NInRandVars):2, 0:NInRandVars] += np.diag(vecMean*dh)
+			matEvalPts[2:(2+2*NInRandVars):2, 0:NInRandVars] -= np.diag(vecMean*dh)
+
+		elif diff == 'forward':
+			# size is 1+NInRandVars
+			matEvalPts = np.zeros([(1+NInRandVars+NInConstVars), (NInRandVars+NInConstVars+NOutVars)])
+			# All lines starts with design point/constant values, after random variables replace it
+			matEvalPts[:, 0:(NInRandVars+NInConstVars)] = vecPts
+			# Each line from [1,end] is +h for one random variable
+			matEvalPts[1:(1+NInRandVars), 0:NInRandVars] += np.diag(vecMean*dh)
+
+		elif diff == 'backward':
+			# size is 1+NInRandVars
+			matEvalPts = np.zeros([(1+NInRandVars+NInConstVars), (NInRandVars+NInConstVars+NOutVars)])
+			# All lines starts with design point/constant values, after random variables replace it
+			matEvalPts[:, 0:(NInRandVars+NInConstVars)] = vecPts
+			# Each line from [1,end] is -h for one random variable
+			matEvalPts[1:(1+NInRandVars), 0:NInRandVars] -= np.diag(vecMean*dh)
+
+		return matEvalPts
+
+
+	def _DiffANSYSRows(self, diff):
+		"""
+		Internal function that returns the lines of _DiffPoints() matrix where
+		ANSYS input variables are changed, that must be simulated by ANSYS.
+		"""
+		varId = self.varId
+		rows = []
+
+		if diff == 'center':
+			for eachVar in self.ansys.varInNames:
+				# Current variable == random or constant?
+				if eachVar.lower() in self.variableDistrib:
+					eachVar = eachVar.lower()
+					rows.append(2*varId[eachVar]+1)
+					rows.append(2*varId[eachVar]+2)
+
+		elif diff == 'forward' or diff == 'backward':
+			for eachVar in self.ansys.varInNames:
+				# Current variable is random or constant?
+				if eachVar.lower() in self.variableDistrib:
+					eachVar = eachVar.lower()
+					rows.append(varId[eachVar]+1)
+
+		return rows
+
+
+	def _QuasiNewtonGrad(self, mode, gradGx, hess, s, dy, line):
+		"""
+		Internal function that updates the gradient (in x) from the last design
+		point to the current one, being ``s`` the step betwen them and ``dy`` the
+		limit state difference. ``line`` has pairs ``[t, G(X_last + t*s)]`` from
+		the line search, and ``hess`` is updated in place for SR1.
+		"""
+		# Curvature of G(X_last + t*s) over t, from a point of the line search
+		#	nearest to t=1 or from the slope of last gradient
+		if len(line) > 0:
+			[te, dye] = min(line, key=lambda each: abs(each[0]-1))
+			curv = (dye - dy*te)/(te*(te-1))
+		elif mode == 'sr1':
+			curv = dy - gradGx.dot(s)
 		else:
-			exception = Exception('This couldnt happen!')
-			raise exception
+			curv = 0.0
 
-		# Return
-		return [mean, std]
+		# Directional derivative in the current point
+		slope = dy + curv
+		ss = s.dot(s)
+
+		if mode == 'broyden':
+			return gradGx + (slope - gradGx.dot(s))*s/ss
+
+		else:
+			# Hessian on s direction must be the change of directional derivatives
+			hess += ((slope - gradGx.dot(s)) - s.dot(hess).dot(s))/ss**2*np.outer(s, s)
+			return gradGx + hess.dot(s)
+
+
+	def _EvalBatch(self, matPts):
+		"""
+		Internal function that evaluates the limit state on the lines of
+		``matPts`` (random and constant variables values), running ANSYS once
+		for the different lines that weren't simulated on the last FORM cycle.
+		"""
+		varId = self.varId
+		NIn = matPts.shape[1]
+		NOutVars = 0
+		if self._ANSYS:
+			NOutVars = len(self.ansys.varOutNames)
+		matEvalPts = np.zeros([matPts.shape[0], NIn+NOutVars])
+		matEvalPts[:, 0:NIn] = matPts
+
+		if self._ANSYS:
+			inCols = [varId[each.lower()] for each in self.ansys.varInNames]
+			outCols = [varId[each.lower()] for each in self.ansys.varOutNames]
+
+			# ANSYS results depends just on its input variables
+			[uniqPts, inverse] = np.unique(matPts[:, inCols], axis=0, return_inverse=True)
+			uniqRes = np.zeros([uniqPts.shape[0], NOutVars])
+			solved = np.zeros(uniqPts.shape[0], dtype=bool)
+
+			if self._lastEvalPts is not None:
+				for idx in range(uniqPts.shape[0]):
+					same = np.all(self._lastEvalPts[:, inCols] == uniqPts[idx], axis=1)
+					if same.any():
+						uniqRes[idx] = self._lastEvalPts[np.argmax(same), outCols]
+						solved[idx] = True
+				if solved.any():
+					self._PrintR('Using %d ANSYS simulations from last FORM cycle.' % solved.sum())
+
+			sending = np.where(~solved)[0]
+			if len(sending) > 0:
+				self.ansys.ClearValues()
+				self.ansys.SetLength(len(sending))
+				for idx, eachVar in enumerate(self.ansys.varInNames):
+					self.ansys.SetVarInValues(eachVar.lower(), uniqPts[sending, idx])
+
+				self.ansys.Run()
+				resANSYS = self.ansys.GetVarOutValues()
+				self._VerifyANSYSErrors(resANSYS)
+
+				if self._options['APDLdebug'] == True:
+					self._PrintR('---\nPrinting \'resANSYS\' dict:')
+					self._PrintR(resANSYS)
+					self._PrintR('---\n')
+
+				for idx, eachVar in enumerate(self.ansys.varOutNames):
+					uniqRes[sending, idx] = resANSYS[eachVar]
+
+			matEvalPts[:, outCols] = uniqRes[inverse.reshape(-1)]
+
+		return self._EvalLS(matEvalPts, varId)
+
+
+	def _EvalLS(self, matEvalPts, varId):
+		"""
+		Internal function that evaluates the limit state on all the lines of
+		matEvalPts at once, returning an np.array with the values.
+		"""
+		# Cases of RunBatch() are evaluated together
+		if self._batch is not None:
+			return self._batch.Request(self, 'ls', [matEvalPts, varId])
+
+		names = sorted(varId, key=varId.get)
+		values = [matEvalPts[:, varId[each]] for each in names]
+
+		return self._limstate.EvalArray(names, values, self._pool, self._workers)
+
+
+	def _UserGradient(self, point, varId, NInRandVars):
+		"""
+		Internal function that evaluates the gradient function from SetLimState()
+		on a point (line of matEvalPts), returning gradGx.
+		"""
+		varVal = {}
+		for each in varId:
+			varVal[each] = point[varId[each]]
+
+		result = self._gradient(**varVal)
+
+		gradGx = np.zeros(NInRandVars)
+		if isinstance(result, dict):
+			for each in result:
+				if each.lower() not in self.variableDistrib:
+					exception = Exception('The gradient returned a derivative for \"%s\", that is not a random variable.' % each)
+					raise exception
+				gradGx[varId[each.lower()]] = result[each]
+		else:
+			result = np.asarray(result, dtype=float).flatten()
+			if result.shape != (NInRandVars,):
+				exception = Exception('The gradient must return %d derivatives, one for each random variable, but %d were returned.' % (NInRandVars, result.size))
+				raise exception
+			gradGx[:] = result
 
+		return gradGx
 
 
-	def Run(self, maxIter=50, tolRel=0.01, tolLS='auto', dh=0.05, diff='forward', meth='iHLRF'):
+	def Run(self, maxIter=50, tolRel=0.01, tolLS='auto', dh=0.05, diff='forward', meth='iHLRF',
+			workers=1, executor='thread', warmstart=None, reusegrad=False):
 		"""
 		Run the FORM process.
 
@@ -742,6 +1201,16 @@ class FORM(object):
 				``f'(x) = (f(x)-f(x-h)) / h``, it needs ``1 + Nvars``
 				evaluations of the limit state function.
 
+				* complex: complex step derivatives, ``f'(x) = Im(f(x+ih)) / h``,
+				with ``h=1E-20*mean(x)``, exact to machine precision, it needs
+				``Nvars`` evaluations with complex values, that can be done at
+				once for vectorized limit states. Limit state must be analytic
+				(``abs()``, ``min()``, ``max()`` and ifs can't be used) and can't
+				use ANSYS results.
+
+				If a gradient function was set in SetLimState() it's used and
+				this option is ignored.
+
 				Defaults to forward.
 
 		meth : str, optional
@@ -751,8 +1220,59 @@ class FORM(object):
 
 				* iHLRF: improved Hasofer Lind Rackwitz and Fiessler method.
 
+				* rHLRF: relaxed HLRF, the step is multiplied by the option
+				  ``rHLRF_relax``.
+
+				* SQP: sequential quadratic programming, each step solves a
+				  quadratic problem with the Hessian of the Lagrangian updated by
+				  BFGS (with Powell damping), it's followed by the iHLRF line
+				  search. Good for strongly nonlinear limit states.
+
+				* PHE: Polak-He method, with the limit state scaled by the option
+				  ``PHE_scale`` and the Polak-He line search. Limit state sign is
+				  changed if it's negative in the start point.
+
 			Defaults to iHLRF.
 
+		workers : integer, optional
+			Number of workers used to evaluate the limit state on the points of
+			the gradient and on the iHLRF line search blocks at the same time,
+			useful for expensive user functions that can't be vectorized.
+			Results are joined always in the same order.
+
+			Defaults to 1.
+
+		executor : str, optional
+			Type of pool used with workers:
+
+				* thread: a pool of threads, for functions that release the GIL,
+				  as those that call external programs.
+
+				* process: a pool of processes, functions used in limit states
+				  must be defined at module level. On Windows the script that
+				  calls Run() must be protected by ``if __name__ == '__main__':``.
+
+			Defaults to thread.
+
+		warmstart : dictionary, optional
+			Result of a previous Run() (or from LoadResults()) used to start
+			this one. The process starts on its design point, instead of the
+			start point, and the Cholesky factor of the correlation matrix (Jzy)
+			is used again if the correlations are the same. Useful on design
+			sweeps, where the design point of a case is next to the last one.
+
+			With tolLS='auto' the tolerance of the previous result is used,
+			since the limit state is next to zero on the start point.
+
+			Defaults to None.
+
+		reusegrad : bool, optional
+			If it's True, the gradient of warmstart is used on the first cycle,
+			so the points of the first finite differences gradient aren't
+			evaluated. If the process converges with this gradient a new cycle
+			is done to confirm it.
+			Defaults to False.
+
 		**Returns a dictionary with:**
 
 			* status : integer
@@ -776,6 +1296,15 @@ class FORM(object):
 			* cycles : int
 			  Number of iterations performed to obtain the solution.
 
+			* {gradGx} : dictionary of values
+			  Dictionary with the final gradient in X for each variable.
+
+			* Jzy : 2D np.array
+			  Cholesky factor of the correlation matrix.
+
+			* tolLS : float
+			  Limit state tolerance used.
+
 
 		**Status values:**
 
@@ -784,6 +1313,206 @@ class FORM(object):
 			* 99: undefined error!
 
 		"""
+		# Workers
+		if type(workers) != int or workers < 1:
+			exception = Exception('The number of workers must be an integer greater than 0.')
+			raise exception
+
+		if executor not in ['thread', 'process']:
+			exception = Exception('Invalid executor, it must be \'thread\' or \'process\'.')
+			raise exception
+
+		self._workers = workers
+		if workers > 1:
+			self._PrintR('Starting %d workers (%s pool).' % (workers, executor))
+			if executor == 'thread':
+				self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+			else:
+				self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+		try:
+			return self._Run(maxIter=maxIter, tolRel=tolRel, tolLS=tolLS, dh=dh, diff=diff, meth=meth,
+							 warmstart=warmstart, reusegrad=reusegrad)
+		finally:
+			if self._pool is not None:
+				self._pool.shutdown()
+				self._pool = None
+
+
+	def RunBatch(self, cases, maxIter=50, tolRel=0.01, tolLS='auto', dh=0.05, diff='forward', meth='iHLRF',
+				 warmstart=None, reusegrad=False):
+		"""
+		Run the FORM process for many design cases at the same time, in
+		lockstep. Each case is a copy of the current problem with some constants
+		or means changed, all cases do the same FORM cycles together and the
+		points of all cases needed on each step are evaluated by just one ANSYS
+		run (or one limit state call), instead of one ANSYS run for each case.
+
+		It's useful for parametric studies, as Beta against a load or a
+		dimension, since the time of each ANSYS run is mostly spent opening
+		ANSYS and reading the model.
+
+		Parameters
+		----------
+		cases : list of dictionaries, obligatory
+			Each dictionary has the values of one case, as {name: value}.
+			For constant variables the value replaces the constant, for random
+			variables it replaces the mean, keeping the CV of the variable. The
+			start point of these random variables is moved to the new mean,
+			unless it was set with SetStartPoint().
+
+			Variables that aren't in a dictionary keep the values defined on
+			CreateVar().
+
+		maxIter, tolRel, tolLS, dh, diff, meth, reusegrad :
+			Same as Run(), used by all cases.
+
+		warmstart : dictionary or list of dictionaries, optional
+			Same as Run(), one result used by all cases or a list with one
+			result for each case (None for cases started on the start point).
+			Defaults to None.
+
+		**Returns a list of dictionaries:**
+
+			One for each case, in the same order of cases, with the same keys
+			returned by Run() and:
+
+			* case : dictionary
+			  Values of the case.
+
+			* error : str
+			  Only if the case stopped with an error, in this case the status
+			  is 99 and Pf and Beta are NaN. Errors on one case don't stop the
+			  other cases.
+
+		"""
+		#-----------------------------------------------------------------------
+		# Verify the cases
+		if type(cases) not in [list, tuple] or len(cases) == 0:
+			exception = Exception('The cases must be a list of dictionaries with the values of each case.')
+			raise exception
+
+		if self.limstate == None:
+			exception = Exception('Before Run you must define the limit state'+
+								  'equation with SetLimState().')
+			raise exception
+
+		forms = []
+		for eachCase in cases:
+			forms.append(self._BatchCase(eachCase))
+
+		if type(warmstart) in [list, tuple]:
+			if len(warmstart) != len(cases):
+				exception = Exception('The warmstart list must have one result for each case.')
+				raise exception
+			warms = list(warmstart)
+		else:
+			warms = [warmstart]*len(cases)
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Run each case in a thread, the batch waits for all cases on each step
+		#
+		self._PrintR('\nStarting FORM batch with %d cases.' % len(forms))
+		timei = time.time()
+
+		batch = _FORMBatch(self, len(forms))
+		results = [None]*len(forms)
+
+		def RunCase(idx):
+			try:
+				results[idx] = forms[idx]._Run(maxIter=maxIter, tolRel=tolRel, tolLS=tolLS,
+											   dh=dh, diff=diff, meth=meth,
+											   warmstart=warms[idx], reusegrad=reusegrad)
+			except Exception as err:
+				results[idx] = {'status': 99, 'Pf': np.nan, 'Beta': np.nan, 'DesignPoint': {},
+								'gradG': {}, 'alpha': {}, 'cycles': forms[idx].__dict__.get('_cycles', 0),
+								'error': str(err)}
+			finally:
+				batch.Finished()
+
+		threads = []
+		for idx, eachForm in enumerate(forms):
+			eachForm._batch = batch
+			if self._ANSYS:
+				eachForm.ansys = _FORMBatchANSYS(batch, eachForm, self.ansys)
+			threads.append(threading.Thread(target=RunCase, args=(idx,), daemon=True))
+
+		for each in threads:
+			each.start()
+		for each in threads:
+			each.join()
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Results table
+		#
+		self._PrintR('\n\n============================================================================')
+		self._PrintR(' FORM batch finished:')
+		self._PrintR(' Cases: %d' % len(forms))
+		self._PrintR(' Lockstep steps: %d' % batch.steps)
+		if self._ANSYS:
+			self._PrintR(' ANSYS runs: %d' % batch.ansysRuns)
+		self._PrintR(' Elapsed time: %4.2f minutes.' % ((time.time()-timei)/60))
+		self._PrintR('')
+		self._PrintR('   Case | Status | Cycles | Beta     | Pf')
+		for idx, eachRes in enumerate(results):
+			eachRes['case'] = dict(cases[idx])
+			self._PrintR(' %6d | %6d | %6d | %8.5f | %2.4E' % (idx, eachRes['status'],
+						 eachRes['cycles'], eachRes['Beta'], eachRes['Pf']))
+			if 'error' in eachRes:
+				self._PrintR('        Error: %s' % eachRes['error'])
+		self._PrintR('============================================================================\n\n')
+
+		return results
+		#-----------------------------------------------------------------------
+
+
+	def _BatchCase(self, case):
+		"""
+		Internal function that creates the FORM object of one case of RunBatch().
+		"""
+		if type(case) != dict:
+			exception = Exception('Each case of RunBatch() must be a dictionary as {name: value}.')
+			raise exception
+
+		form = FORM()
+		form.PrintR = False
+		form._ANSYS = self._ANSYS
+		form.limstate = self.limstate
+		form._userf = self._userf
+		form._limstate = self._limstate
+		form._gradient = self._gradient
+		form._options = dict(self._options)
+		form.variableDistrib = {each: list(self.variableDistrib[each]) for each in self.variableDistrib}
+		form.variableConst = dict(self.variableConst)
+		form.variableStartPt = dict(self.variableStartPt)
+		form.corlist = dict(self.corlist)
+
+		for name, value in case.items():
+			name = name.lower()
+			if name in form.variableConst:
+				form.variableConst[name] = value
+
+			elif name in form.variableDistrib:
+				[distrib, mean, std, cv] = form.variableDistrib[name]
+				form.variableDistrib[name] = [distrib, value, cv*value, cv]
+				if form.variableStartPt[name] == mean:
+					form.variableStartPt[name] = value
+
+			else:
+				exception = Exception('Variable \"%s\" used on a case of RunBatch() is not defined.' % name)
+				raise exception
+
+		return form
+
+
+	def _Run(self, maxIter, tolRel, tolLS, dh, diff, meth, warmstart=None, reusegrad=False):
+		"""
+		Internal function with the FORM process, called by Run().
+		"""
 
 		#-----------------------------------------------------------------------
 		# Set controls
@@ -815,6 +1544,16 @@ class FORM(object):
 		# Copy the start point to self.variableDesPt()
 		#
 		self.variableDesPt = self.variableStartPt.copy()
+
+		# or the design point of warmstart
+		if warmstart is not None:
+			if type(warmstart) != dict or 'DesignPoint' not in warmstart:
+				exception = Exception('The warmstart must be a dictionary returned by Run() or LoadResults().')
+				raise exception
+			for eachVar in self.variableDesPt:
+				if eachVar in warmstart['DesignPoint']:
+					self.variableDesPt[eachVar] = float(warmstart['DesignPoint'][eachVar])
+			self._PrintR('Starting on the design point of warmstart.')
 		#-----------------------------------------------------------------------
 
 
@@ -854,6 +1593,9 @@ class FORM(object):
 		# Save varId in the object
 		self.varId = varId
 
+		# Distributions parameters for transformations
+		self._SetTransform()
+
 		# Run all the declareted correls
 		for each in self.corlist:
 			i = varId[each[0]]
@@ -919,8 +1661,15 @@ class FORM(object):
 			self.correlMat[j, i] = cor
 
 		# Obtain the transformation matrices Jyz/Jzy
-		# Jzy is Lower matrix obtained by Cholesky at correlMat
-		Jzy = np.linalg.cholesky(self.correlMat)
+		# Jzy is Lower matrix obtained by Cholesky at correlMat, it's taken
+		#	from warmstart if the correlations are the same
+		Jzy = None
+		if warmstart is not None and warmstart.get('Jzy') is not None:
+			warmJzy = np.array(warmstart['Jzy'], dtype=float)
+			if warmJzy.shape == self.correlMat.shape and np.allclose(warmJzy.dot(warmJzy.T), self.correlMat):
+				Jzy = warmJzy
+		if Jzy is None:
+			Jzy = np.linalg.cholesky(self.correlMat)
 		# and Jyz is the inverse matrix
 		Jyz = np.linalg.inv(Jzy)
 
@@ -941,6 +1690,57 @@ class FORM(object):
 		self.results['Beta'] = []
 		self.results['Beta'].append(0)
 
+		# Quasi-Newton gradient updates
+		qnMode = self._options['grad_update']
+		if qnMode not in [False, None, 'broyden', 'sr1']:
+			exception = Exception('Invalid grad_update option \"%s\", it must be \'broyden\', \'sr1\' or False.' % qnMode)
+			raise exception
+		if qnMode and (self._gradient is not None or diff == 'complex'):
+			self._PrintR('Option grad_update is ignored, gradient isn\'t obtained by finite differences.')
+			qnMode = False
+		# [point, valG, gradGx, line search points] of last cycle
+		qnLast = None
+		# [point, gradGx] of last finite differences gradient
+		qnTrue = None
+		qnRefresh = 0
+		qnHess = np.zeros([NInRandVars, NInRandVars])
+		schwarzHist = []
+
+		# ANSYS simulations from last line search, with inputs and outputs
+		ansysCarry = None
+		self._lastEvalPts = None
+
+		# SQP Hessian of the Lagrangian, [point, gradG] of last cycle and
+		#	Lagrange multiplier
+		sqpHess = np.eye(NInRandVars)
+		sqpLast = None
+		sqpMu = 0.0
+		# PHE scale of the limit state
+		phScale = None
+
+		# Gradient of warmstart used on the first cycle, in X or in Y
+		warmGrad = None
+		if warmstart is not None and reusegrad:
+			for eachKey in ['gradGx', 'gradG']:
+				if all(each in warmstart.get(eachKey, {}) for each in self.variableDistrib):
+					warmGrad = [eachKey, np.array([warmstart[eachKey][each] for each in self.variableDistrib], dtype=float)]
+					break
+			if warmGrad is None:
+				self._PrintR('The gradient of warmstart doesn\'t have all variables, it can\'t be used.')
+
+		# tolLS 'auto' from warmstart, with G(X) next to zero it can't be
+		#	obtained from the first cycle, so it's taken from the previous
+		#	tolerance or from the linear approximation G(mean) ~ Beta*|gradG|
+		if warmstart is not None and tolLS == 'auto':
+			if warmstart.get('tolLS') is not None:
+				tolLS = float(warmstart['tolLS'])
+			elif warmstart.get('gradG', {}) != {} and np.isfinite(warmstart.get('Beta', np.nan)):
+				absgrad = math.sqrt(sum([each**2 for each in warmstart['gradG'].values()]))
+				tolLS = self.controls['tolRel']*warmstart['Beta']*absgrad
+			if tolLS != 'auto':
+				self.controls['tolLS'] = tolLS
+				self._PrintR('Limit state tolerance set to %f from warmstart.' % tolLS)
+
 		# Cycle (or iteration) start at 1, so +1
 		for cycle in range(1, 1+self.controls['maxIter']):
 			#self._PrintR('----------------------------------------------------------------------------\n')
@@ -950,19 +1750,15 @@ class FORM(object):
 			#-------------------------------------------------------------------
 			# Mount mean vector, stddev matrix and transformations (Jxy/Jyx) matrices
 			#
-			matStd = np.zeros([NInRandVars, NInRandVars])
-			vecMean = np.zeros(NInRandVars)
 			# Vector with current design point (and constant values)
 			vecPts = np.zeros(NInRandVars+NInConstVars)
 			for eachVar in self.variableDistrib:
-				# Variable id
-				id = varId[eachVar]
-				# Current X point
-				pt = self.variableDesPt[eachVar]
-				# Transform
-				[vecMean[id], matStd[id, id]] = self._EquivNormal(eachVar, pt)
-				# Put point in vecPts
-				vecPts[id] = pt
+				# Put current X point in vecPts
+				vecPts[varId[eachVar]] = self.variableDesPt[eachVar]
+
+			# Transform all random variables
+			[vecMean, vecStd] = self._EquivNormalArray(vecPts[:NInRandVars])
+			matStd = np.diag(vecStd)
 
 			for eachVar in self.variableConst:
 				# Get variable id
@@ -980,52 +1776,30 @@ class FORM(object):
 			# Evaluate G and grad(G)
 			#
 
+			# Gradient by quasi-Newton update or by finite differences?
+			#	Secants aren't good on long steps (as the first one, from the
+			#	means), so beta must change less than 50% on the last step.
+			quasi = False
+			if qnMode and qnLast is not None and lastcycle == False:
+				qnStep = vecPts[:NInRandVars] - qnLast[0]
+				qnBetas = self.results['Beta'][cycle-1:cycle+1]
+				if (cycle-qnRefresh) < self._options['grad_refresh'] and qnStep.dot(qnStep) > 0 \
+					and not (len(schwarzHist) > 1 and schwarzHist[-1] < schwarzHist[-2]) \
+					and abs(qnBetas[1]-qnBetas[0]) < 0.5*qnBetas[1]:
+					quasi = True
+
+			# Gradient from warmstart on the first cycle
+			reused = (cycle == 1 and warmGrad is not None)
+
 			# Get dh
 			dh = self.controls['dh']
-			if diff == 'center':
-				# size is 1+2*NInRandVars
-				matEvalPts = np.zeros([(1+2*NInRandVars+NInConstVars), (NInRandVars+NInConstVars+NOutVars)])
-				# All lines starts with design point/constant values, after random variables replace it
+			if self._gradient is not None or diff == 'complex' or quasi or reused:
+				# Just the design point, derivatives don't need other points
+				matEvalPts = np.zeros([1, (NInRandVars+NInConstVars+NOutVars)])
 				matEvalPts[:, 0:(NInRandVars+NInConstVars)] = vecPts
 
-				# Run all lines from [1,end] with step=2
-					# curId is current varId
-				curId = 0
-				for eachLine in range(1, 1+2*NInRandVars, 2):
-					# vecdh is not zero on current var item
-					vecdh = np.zeros(NInRandVars)
-					vecdh[curId] = dh
-					# Odd line is +h
-					matEvalPts[eachLine, 0:NInRandVars] = vecPts[0:NInRandVars] + vecMean*vecdh
-					# and now -h
-					matEvalPts[eachLine+1, 0:NInRandVars] = vecPts[0:NInRandVars] - vecMean*vecdh
-					curId += 1
-
-			elif diff == 'forward':
-				# size is 1+NInRandVars
-				matEvalPts = np.zeros([(1+NInRandVars+NInConstVars), (NInRandVars+NInConstVars+NOutVars)])
-				# All lines starts with design point/constant values, after random variables replace it
-				matEvalPts[:, 0:(NInRandVars+NInConstVars)] = vecPts
-				curId = 0
-				for eachLine in range(1, 1+NInRandVars):
-					# vecdh is not zero on current var item
-					vecdh = np.zeros(NInRandVars)
-					vecdh[curId] = dh
-					matEvalPts[eachLine, 0:NInRandVars] = vecPts[0:NInRandVars] + vecMean*vecdh
-					curId += 1
-
-			elif diff == 'backward':
-				# size is 1+NInRandVars
-				matEvalPts = np.zeros([(1+NInRandVars+NInConstVars), (NInRandVars+NInConstVars+NOutVars)])
-				# All lines starts with design point/constant values, after random variables replace it
-				matEvalPts[:, 0:(NInRandVars+NInConstVars)] = vecPts
-				curId = 0
-				for eachLine in range(1, 1+NInRandVars):
-					# vecdh is not zero on current var item
-					vecdh = np.zeros(NInRandVars)
-					vecdh[curId] = dh
-					matEvalPts[eachLine, 0:NInRandVars] = vecPts[0:NInRandVars] - vecMean*vecdh
-					curId += 1
+			else:
+				matEvalPts = self._DiffPoints(vecPts, vecMean, dh, diff, NOutVars)
 
 
 			#-------------------------------------------------------------------
@@ -1036,49 +1810,63 @@ class FORM(object):
 				# Line 0 with X value is used for all not calculated lines + G(x)
 				ansysSendingList = [0]
 
-				if diff == 'center':
-					for eachVar in self.ansys.varInNames:
-						# Current variable == random or constant?
-						if eachVar.lower() in self.variableDistrib:
-							eachVar = eachVar.lower()
-							ansysSendingList.append(2*varId[eachVar]+1)
-							ansysSendingList.append(2*varId[eachVar]+2)
+				if self._gradient is not None or quasi or reused:
+					# Just the design point
+					pass
 
-				elif diff == 'forward' or diff == 'backward':
+				else:
+					ansysSendingList += self._DiffANSYSRows(diff)
+
+				# Lines already simulated on last line search (with the same
+				#	values) take the results from there
+				ansysCarriedList = []
+				if ansysCarry is not None:
+					NIn = NInRandVars+NInConstVars
+					for eachRow in list(ansysSendingList):
+						same = np.all(ansysCarry[:, 0:NIn] == matEvalPts[eachRow, 0:NIn], axis=1)
+						if same.any():
+							matEvalPts[eachRow, NIn:] = ansysCarry[np.argmax(same), NIn:]
+							ansysSendingList.remove(eachRow)
+							ansysCarriedList.append(eachRow)
+					ansysCarry = None
+					if len(ansysCarriedList) > 0:
+						self._PrintR('Using %d ANSYS simulations from last line search.' % len(ansysCarriedList))
+
+				if len(ansysSendingList) > 0:
+					# Set length as Ns
+					Ns = len(ansysSendingList)
+					self.ansys.ClearValues()
+					self.ansys.SetLength(Ns)
+
+					# Send from the list to ANSYS varInValues
 					for eachVar in self.ansys.varInNames:
-						# Current variable is random or constant?
-						if eachVar.lower() in self.variableDistrib:
-							eachVar = eachVar.lower()
-							ansysSendingList.append(varId[eachVar]+1)
+						eachVar = eachVar.lower()
+						self.ansys.SetVarInValues(eachVar, matEvalPts[ansysSendingList, varId[eachVar]])
 
-				# Set length as Ns
-				Ns = len(ansysSendingList)
-				self.ansys.ClearValues()
-				self.ansys.SetLength(Ns)
+					# Run ANSYS
+					self.ansys.Run()
 
-				# Send from the list to ANSYS varInValues
-				for eachVar in self.ansys.varInNames:
-					eachVar = eachVar.lower()
-					self.ansys.SetVarInValues(eachVar, matEvalPts[ansysSendingList, varId[eachVar]])
+					# Get results from ANSYS
+					resANSYS = self.ansys.GetVarOutValues()
+					self._VerifyANSYSErrors(resANSYS)
 
-				# Run ANSYS
-				self.ansys.Run()
-
-				# Get results from ANSYS
-				resANSYS = self.ansys.GetVarOutValues()
+					# If control APDL debug is true!
+					if self._options['APDLdebug'] == True:
+						self._PrintR('---\nPrinting \'resANSYS\' dict:')
+						self._PrintR(resANSYS)
+						self._PrintR('---\n')
 
-				# If control APDL debug is true!
-				if self._options['APDLdebug'] == True:
-					self._PrintR('---\nPrinting \'resANSYS\' dict:')
-					self._PrintR(resANSYS)
-					self._PrintR('---\n')
+					# Add ANSYS results to matEvalPts, stored as in ansysSendingList
+					for eachVar in self.ansys.varOutNames:
+						matEvalPts[ansysSendingList, varId[eachVar.lower()]] = resANSYS[eachVar]
 
-				# Add ANSYS results to matEvalPts
+				# Other lines has values from X
+				otherRows = [each for each in range(1, matEvalPts.shape[0]) \
+							 if each not in ansysSendingList and each not in ansysCarriedList]
 				for eachVar in self.ansys.varOutNames:
-					# First all lines has value from X
-					matEvalPts[:, varId[eachVar.lower()]] = resANSYS[eachVar][0]
-					# Now values are stored as in ansysSendingList
-					matEvalPts[ansysSendingList, varId[eachVar.lower()]] = resANSYS[eachVar]
+					matEvalPts[otherRows, varId[eachVar.lower()]] = matEvalPts[0, varId[eachVar.lower()]]
+
+				self._lastEvalPts = matEvalPts.copy()
 
 			#-------------------------------------------------------------------
 
@@ -1087,19 +1875,18 @@ class FORM(object):
 			# Evaluate Limit State (valG) and Gradient (in x) (gradGx)
 			#
 			self._PrintR('Evaluating limit state.')
-			# dic of values in each evaluation
-			varVal = {}
-
-			# Eval Limit State:
-			for eachVar in varId:
-				varVal[eachVar] = matEvalPts[0, varId[eachVar]]
-
-			# Test if limstate is a string or a function
-			if(type(self.limstate) == str):
-				varVal['userf'] = self._userf
-				valG = eval(self.limstate, globals(), varVal)
+			# Limit state function that receives a line of matEvalPts
+			lsfunc = self._limstate.Bind(varId)
+
+			# Eval Limit State on all the points (design point and points
+			#	used in derivatives) at once
+			if self._gradient is not None or diff == 'complex' or quasi or reused:
+				valsG = self._EvalLS(matEvalPts, varId)
+			elif diff == 'center':
+				valsG = self._EvalLS(matEvalPts[0:(1+2*NInRandVars)], varId)
 			else:
-				valG = self.limstate(**varVal)
+				valsG = self._EvalLS(matEvalPts[0:(1+NInRandVars)], varId)
+			valG = valsG[0]
 
 			# tolLS 'auto' is tolRel*(initial valG)
 			if cycle == 1 and tolLS == 'auto':
@@ -1113,66 +1900,54 @@ class FORM(object):
 			# Eval Gradient
 			self._PrintR('Evaluating gradient.')
 
-			curId = 0
-			gradGx = 0
-			gradGx = np.zeros(NInRandVars)
-
 			#Derivatives only for random variables/input var
 
-			if diff == 'center':
-				for eachLine in range(1, (1+2*NInRandVars), 2):
-					# G(X+dh) = val1
-					for eachVar in varId:
-						varVal[eachVar] = matEvalPts[eachLine, varId[eachVar]]
-
-					# Test if limstate is a string or a function
-					if(type(self.limstate) == str):
-						val1 = eval(self.limstate, globals(), varVal)
-					else:
-						val1 = self.limstate(**varVal)
-						
-					# G(X-dh) = val2
-					for eachVar in varId:
-						varVal[eachVar] = matEvalPts[eachLine+1, varId[eachVar]]
-					
-					# Test if limstate is a string or a function
-					if(type(self.limstate) == str):
-						val2 = eval(self.limstate, globals(), varVal)
-					else:
-						val2 = self.limstate(**varVal)
-
-					gradGx[curId] = (val1-val2)/(2*dh*vecMean[curId])
-					curId += 1
+			if reused:
+				if warmGrad[0] == 'gradGx':
+					gradGx = warmGrad[1].copy()
+				else:
+					gradGx = np.linalg.solve(Jxy.T, warmGrad[1])
+				self._PrintR('Gradient taken from warmstart.')
+
+			elif self._gradient is not None:
+				gradGx = self._UserGradient(matEvalPts[0], varId, NInRandVars)
+
+			elif quasi:
+				gradGx = self._QuasiNewtonGrad(qnMode, qnLast[2], qnHess, qnStep, valG-qnLast[1], qnLast[3])
+				self._PrintR('Gradient updated by %s (finite differences in %d cycles at most).' % \
+					(qnMode, self._options['grad_refresh']-(cycle-qnRefresh)))
+
+			elif diff == 'complex':
+				# G(X+ih), with h small enough to don't change the real part
+				vech = 1E-20*np.where(vecMean != 0, abs(vecMean), 1.0)
+				names = sorted(varId, key=varId.get)
+				cplxPts = np.zeros([NInRandVars, len(names)], dtype=complex)
+				cplxPts[:, :] = matEvalPts[0]
+				cplxPts[:, 0:NInRandVars] += 1j*np.diag(vech)
+				valsGc = self._limstate.EvalComplex(names, [cplxPts[:, varId[each]] for each in names])
+				gradGx = valsGc.imag/vech
+
+			elif diff == 'center':
+				# G(X+dh) on odd lines and G(X-dh) on even lines
+				gradGx = (valsG[1::2]-valsG[2::2])/(2*dh*vecMean)
 
 			elif diff == 'forward':
-				for eachLine in range(1, (1+NInRandVars)):
-					# G(X+dh) = val1
-					for eachVar in varId:
-						varVal[eachVar] = matEvalPts[eachLine, varId[eachVar]]
-					
-					# Test if limstate is a string or a function
-					if(type(self.limstate) == str):
-						val1 = eval(self.limstate, globals(), varVal)
-					else:
-						val1 = self.limstate(**varVal)
-
-					gradGx[curId] = (val1-valG)/(dh*vecMean[curId])
-					curId += 1
+				# G(X+dh)
+				gradGx = (valsG[1:]-valG)/(dh*vecMean)
 
 			elif diff == 'backward':
-				for eachLine in range(1, (1+NInRandVars)):
-					# G(X-dh) = val1
-					for eachVar in varId:
-						varVal[eachVar] = matEvalPts[eachLine, varId[eachVar]]
-					
-					# Test if limstate is a string or a function
-					if(type(self.limstate) == str):
-						val1 = eval(self.limstate, globals(), varVal)
-					else:
-						val1 = self.limstate(**varVal)
-
-					gradGx[curId] = (valG-val1)/(dh*vecMean[curId])
-					curId += 1
+				# G(X-dh)
+				gradGx = (valG-valsG[1:])/(dh*vecMean)
+
+			# Finite differences gradients teach the SR1 Hessian
+			if qnMode and not quasi and not reused:
+				if qnMode == 'sr1' and qnTrue is not None:
+					qnStep = vecPts[:NInRandVars] - qnTrue[0]
+					qnRes = gradGx - qnTrue[1] - qnHess.dot(qnStep)
+					if abs(qnRes.dot(qnStep)) > 1E-8*np.linalg.norm(qnRes)*np.linalg.norm(qnStep):
+						qnHess += np.outer(qnRes, qnRes)/qnRes.dot(qnStep)
+				qnTrue = [vecPts[:NInRandVars].copy(), gradGx.copy()]
+				qnRefresh = cycle
 
 			#---------------------------------------------------------------
 
@@ -1222,7 +1997,7 @@ class FORM(object):
 			#-------------------------------------------------------------------
 			# FORM Method
 			#
-			if meth in ['HLRF', 'iHLRF', 'rHLRF']:
+			if meth in ['HLRF', 'iHLRF', 'rHLRF', 'SQP', 'PHE']:
 				#-------------------------------------------------------------------
 				# HLRF - Rackwitz and Fiessler recursive method - Not Improved
 				#
@@ -1239,6 +2014,8 @@ class FORM(object):
 					schwarzYgradG = 0.0
 
 				self._PrintR('Schwarz inequality betwen y* and gradG = %f (it must be next to 1).' % schwarzYgradG)
+				schwarzHist.append(schwarzYgradG)
+				qnLine = []
 				if lastcycle == True:
 					if abs(valG) < self.controls['tolLS'] and (1-schwarzYgradG) < self.controls['tolRel']:
 						#self._PrintR('\nFinal design point found on cycle %d.' % cycle)
@@ -1260,7 +2037,60 @@ class FORM(object):
 					dk = newVecRedPts - curVecRedPts
 					newVecRedPts = curVecRedPts + self._options['rHLRF_relax']*dk
 
-				if meth == 'iHLRF':
+				if meth == 'SQP':
+					#-------------------------------------------------------------------
+					# SQP - sequential quadratic programming, the Hessian of the
+					#	Lagrangian L(y) = 1/2*y.y^T + mu*g(y) is updated by BFGS
+					#
+					if sqpLast is not None:
+						sqpStep = curVecRedPts - sqpLast[0]
+						sqpDiff = sqpStep + sqpMu*(gradG - sqpLast[1])
+						sqpBs = sqpHess.dot(sqpStep)
+						sqpsBs = sqpStep.dot(sqpBs)
+						if sqpsBs > 0:
+							# Powell damping keeps the Hessian positive definite
+							if sqpStep.dot(sqpDiff) < 0.2*sqpsBs:
+								theta = 0.8*sqpsBs/(sqpsBs - sqpStep.dot(sqpDiff))
+								sqpDiff = theta*sqpDiff + (1-theta)*sqpBs
+							sqpHess = sqpHess + np.outer(sqpDiff, sqpDiff)/sqpStep.dot(sqpDiff) \
+									  - np.outer(sqpBs, sqpBs)/sqpsBs
+					sqpLast = [curVecRedPts.copy(), gradG.copy()]
+
+					# Quadratic problem: min 1/2*d.B.d^T + y.d^T with g + gradG.d^T = 0,
+					#	by its KKT system [[B, gradG], [gradG^T, 0]].[d, mu] = [-y, -g]
+					kkt = np.zeros([NInRandVars+1, NInRandVars+1])
+					kkt[0:NInRandVars, 0:NInRandVars] = sqpHess
+					kkt[0:NInRandVars, NInRandVars] = gradG
+					kkt[NInRandVars, 0:NInRandVars] = gradG
+					sol = np.linalg.solve(kkt, np.append(-curVecRedPts, -valG))
+					sqpMu = sol[NInRandVars]
+					newVecRedPts = curVecRedPts + sol[0:NInRandVars]
+
+				if meth == 'PHE':
+					#-------------------------------------------------------------------
+					# PHE - Polak-He method, for min 1/2*y.y^T with h(y) <= 0,
+					#	being h(y) = g(y)*PHE_scale/|gradG(start point)|
+					#
+					if phScale is None:
+						phScale = math.copysign(math.sqrt(gradG.dot(gradG))/self._options['PHE_scale'], valG)
+					phGamma = self._options['PHE_gamma']
+					phH = valG/phScale
+					phGradH = gradG/phScale
+					phPsi = max(0.0, phH)
+
+					# Direction is -(mu*y + (1-mu)*gradH), with mu in [0, 1]
+					#	maximizing the dual function of Polak-He subproblem
+					phV = curVecRedPts - phGradH
+					phDer = -phGamma*phPsi - (phH - phPsi) - phGradH.dot(phV)
+					if phV.dot(phV) > 0:
+						phMu = min(max(phDer/phV.dot(phV), 0.0), 1.0)
+					else:
+						phMu = 1.0 if phDer > 0 else 0.0
+					dk = -(phMu*curVecRedPts + (1-phMu)*phGradH)
+					phTheta = -phMu*phGamma*phPsi + (1-phMu)*(phH - phPsi) - 1/2*dk.dot(dk)
+					newVecRedPts = curVecRedPts + dk
+
+				if meth in ['iHLRF', 'SQP', 'PHE']:
 					#-------------------------------------------------------------------
 					# iHLRF - improved Rackwitz and Fiessler recursive method
 					#
@@ -1273,12 +2103,16 @@ class FORM(object):
 					dk = newVecRedPts - curVecRedPts
 
 					# Line search
-					self._PrintR('Starting line search for iHLRF step.')
+					self._PrintR('Starting line search for %s step.' % meth)
 					# find ck
 					#	ck by Beck 2019
 					val1 = math.sqrt(curVecRedPts.dot(curVecRedPts)/gradG.dot(gradG))
 					val2 = 0.00
 
+					# For SQP ck must be greater than the Lagrange multiplier
+					if meth == 'SQP':
+						val1 = max(val1, abs(sqpMu))
+
 					if abs(valG) >= self.controls['tolLS']:
 						# yk+dk = newVecRedPts
 						val2 = 1/2*newVecRedPts.dot(newVecRedPts)/abs(valG)
@@ -1332,6 +2166,11 @@ class FORM(object):
 
 					self._PrintR('iHLRF step range from %f to %f (%.0f steps), being test step size %d.' % (par_b**nk, par_b**maxnk, maxnk, stepnk))
 
+					# ANSYS simulations of line search are kept to next cycle
+					ansysLines = []
+					speculative = self._options['iHLRF_speculative_grad'] and self._gradient is None \
+								  and diff != 'complex' and not qnMode
+
 					for step in range(math.ceil(maxnk/stepnk)):
 						# current lenght
 						curlen = min(stepnk, maxnk-(step)*stepnk)
@@ -1349,8 +2188,19 @@ class FORM(object):
 
 						# pass ANSYSvars to ANSYS
 						if self._ANSYS:
+							# On first block the finite differences points of
+							#	the first step can be simulated too, if it's
+							#	accepted next cycle will not run ANSYS
+							if speculative and step == 0:
+								specPt = matEvalPts[0, 0:(NInRandVars+NInConstVars)]
+								specMean = self._EquivNormalArray(specPt[:NInRandVars])[0]
+								specRows = self._DiffANSYSRows(diff)
+								matEvalPts = np.vstack([matEvalPts, \
+									self._DiffPoints(specPt, specMean, dh, diff, NOutVars)[specRows]])
+								self._PrintR('Adding %d finite differences points of step size %f.' % (len(specRows), lambdks[0]))
+
 							self.ansys.ClearValues()
-							self.ansys.SetLength(curlen)
+							self.ansys.SetLength(matEvalPts.shape[0])
 
 							# Send from the list to ANSYS varInValues
 							for eachVar in self.ansys.varInNames:
@@ -1362,6 +2212,7 @@ class FORM(object):
 
 							# Get results from ANSYS
 							resANSYS = self.ansys.GetVarOutValues()
+							self._VerifyANSYSErrors(resANSYS)
 
 							# If control APDL debug is true!
 							if self._options['APDLdebug'] == True:
@@ -1373,40 +2224,49 @@ class FORM(object):
 							for eachVar in self.ansys.varOutNames:
 								matEvalPts[:, varId[eachVar.lower()]] = resANSYS[eachVar]
 
+							ansysLines.append(matEvalPts)
+							matEvalPts = matEvalPts[0:curlen]
+
 
 						#print(matEvalPts)
 						#print(matEvalPts.shape)
 
-						# evaluate the limit state function for eachnk
-						for eachnk in range(curlen):
-							# dic of values in each evaluation
-							varVal = {}
+						# evaluate the limit state function for eachnk, all
+						#	the block at once if it's vectorized or with workers
+						if self._limstate.canvec or self._pool is not None or self._batch is not None:
+							valsG_nk = self._EvalLS(matEvalPts, varId)
+						else:
+							valsG_nk = None
 
+						for eachnk in range(curlen):
 							# Save last valG_nk to compare it
 							valG_nk_old = valG_nk
 
 							# Eval Limit State
-							for eachVar in varId:
-								varVal[eachVar] = matEvalPts[eachnk, varId[eachVar]]
-							#valG_nk = eval(self.limstate, globals(), varVal)
-							# Test if limstate is a string or a function
-							if(type(self.limstate) == str):
-								varVal['userf'] = self._userf
-								valG_nk = eval(self.limstate, globals(), varVal)
+							if valsG_nk is not None:
+								valG_nk = valsG_nk[eachnk]
 							else:
-								valG_nk = self.limstate(**varVal)
+								valG_nk = lsfunc(*matEvalPts[eachnk])
+							qnLine.append([lambdks[eachnk], valG_nk])
 
 							# Verify the condition
 							lambdk = lambdks[eachnk]
 							curYk = curVecRedPts + lambdk*dk
-							mynk = 1/2*curYk.dot(curYk)+ck*abs(valG_nk)
-							# Correct way - REAL ARMIJO RULE
-							target = -par_a*lambdk*gradMy.dot(dk)
-							# Some people talk about this: gradMy.dot(gradMy), but ??
-							#target = -par_a*lambdk*gradMy.dot(gradMy)
+							if meth == 'PHE':
+								# Polak-He merit function
+								mynk = max(1/2*curYk.dot(curYk) - 1/2*curVecRedPts.dot(curVecRedPts) - phGamma*phPsi,
+										   valG_nk/phScale - phPsi)
+								myk = 0.0
+								target = par_a*lambdk*phTheta
+							else:
+								mynk = 1/2*curYk.dot(curYk)+ck*abs(valG_nk)
+								# Correct way - REAL ARMIJO RULE
+								target = -par_a*lambdk*gradMy.dot(dk)
+								# Some people talk about this: gradMy.dot(gradMy), but ??
+								#target = -par_a*lambdk*gradMy.dot(gradMy)
 
 							if (mynk - myk) <= target:
-								self._PrintR('iHLRF step size is %f.' % lambdk)
+								self._PrintR('%s step size is %f.' % (meth, lambdk))
 								done = True
 								break
 
@@ -1425,10 +2285,20 @@ class FORM(object):
 						else:
 							lambdk = self._options['iHLRF_forced_lambdk']
 
-						self._PrintR('iHLRF step not found, forcing to %f.' % lambdk)
+						self._PrintR('%s step not found, forcing to %f.' % (meth, lambdk))
 
 					# Save new reduced point
 					newVecRedPts = curVecRedPts + lambdk*dk
+					if self._ANSYS:
+						ansysCarry = np.vstack(ansysLines)
+						self._lastEvalPts = np.vstack([self._lastEvalPts, ansysCarry])
+
+					# Line search points as [t, G-G(X)] over the step, for quasi-Newton
+					qnLine = [[each[0]/lambdk, each[1]-valG] for each in qnLine if each[0] != lambdk]
+					if lambdk == 0:
+						qnLine = []
+					elif valsG_nk is not None:
+						qnLine += [[lambdks[idx]/lambdk, valsG_nk[idx]-valG] for idx in range(eachnk+1, curlen)]
 			else:
 				exception = Exception('FORM method \"%s\" is not implemented.' % meth)
 				raise exception
@@ -1441,6 +2311,7 @@ class FORM(object):
 			self.results['Beta'].append(newBeta)
 
 			NewVecPts = vecMean + Jxy.dot(newVecRedPts)
+			qnLast = [vecPts[:NInRandVars].copy(), valG, gradGx.copy(), qnLine]
 
 			# Save it to self.variableDesPt
 			for eachVar in self.variableDesPt:
@@ -1486,7 +2357,12 @@ class FORM(object):
 
 			if abs(valG) < self.controls['tolLS']:
 				# limstate value is ok
-				if absErrorBeta < self.controls['tolRel']:
+				if absErrorBeta < self.controls['tolRel'] and (quasi or reused):
+					# Gradient was updated (or reused), it must be confirmed with finite differences
+					lastcycle = True
+					self._PrintR('\nFinal design point was probably found on cycle %d by absolute difference betwen two betas.' % cycle)
+					self._PrintR('A new cycle will be started to confirm it with finite differences gradient.')
+				elif absErrorBeta < self.controls['tolRel']:
 					# Converged by absolute difference betwen betas
 					self._PrintR('\nFinal design point found on cycle %d by absolute difference betwen two betas.' % cycle)
 					self._stnumb = 0
@@ -1521,13 +2397,16 @@ class FORM(object):
 
 		# Put grad and alpha in self.results
 		self.results['grad'] = {}
+		self.results['gradx'] = {}
 		self.results['alpha'] = {}
 		absgrad = math.sqrt(gradG.dot(gradG))
 		idx = 0
 		for eachVar in self.variableDistrib:
 			self.results['grad'][eachVar] = gradG[idx]
+			self.results['gradx'][eachVar] = gradGx[idx]
 			self.results['alpha'][eachVar] = gradG[idx]/absgrad
 			idx += 1
+		self.results['Jzy'] = Jzy
 
 		self._PrintR('\n\n============================================================================\n')
 		# Verify if stopped without convergence
@@ -1566,12 +2445,299 @@ class FORM(object):
 		finret['gradG'] = self.results['grad']
 		finret['alpha'] = self.results['alpha']
 		finret['cycles'] = self._cycles
+		finret['gradGx'] = self.results['gradx']
+		finret['Jzy'] = self.results['Jzy']
+		finret['tolLS'] = self.controls['tolLS']
+		self._lastResult = finret
 
 		return finret
 
 		#-----------------------------------------------------------------------
 
 
+	def SORM(self, method='hessian', dh=None, step=1.0):
+		"""
+		Second order reliability method (SORM), it must be used after Run(),
+		correcting its Pf with the curvatures of the limit state at the design
+		point. All the extra evaluations are done at once, with just one ANSYS
+		run, and the points already simulated by ANSYS on the last FORM cycle
+		are used again.
+
+		Parameters
+		----------
+		method : str, optional
+			How the curvatures are obtained:
+
+				* hessian: finite differences Hessian of the limit state in the
+				  design point, with the same steps of Run() (``h=mean(x)*dh``),
+				  it needs ``1 + 2*Nvars + Nvars*(Nvars-1)/2`` evaluations.
+
+				* points: paraboloid fitted by the limit state values on two points
+				  at each axis orthogonal to the design point, at distance ``step``
+				  in the standard normal space, it needs ``2*(Nvars-1)`` evaluations
+				  and neglects mixed terms.
+
+			Defaults to hessian.
+
+		dh : float, optional
+			delta_h step for the hessian method. Defaults to the value used in
+			Run().
+
+		step : float, optional
+			Distance of the points used by the points method, in the standard
+			normal space. Defaults to 1.0.
+
+		**Returns a dictionary with:**
+
+			* Pf : float
+			  Probability of failure by Tvedt's formula.
+
+			* Beta : float
+			  Generalized reliability index, ``-Phi^-1(Pf)``.
+
+			* PfBreitung : float
+			  Probability of failure by Breitung's formula.
+
+			* PfHohenbichler : float
+			  Probability of failure by Hohenbichler and Rackwitz formula.
+
+			* PfTvedt : float
+			  Probability of failure by Tvedt's formula.
+
+			* curvatures : np.array
+			  Main curvatures of the limit state in the design point.
+
+		"""
+		#-----------------------------------------------------------------------
+		# Verify if FORM was run
+		#
+		if 'Pf' not in self.results:
+			exception = Exception('SORM needs the FORM design point, use Run() before SORM().')
+			raise exception
+
+		if method not in ['hessian', 'points']:
+			exception = Exception('Invalid SORM method \"%s\", it must be \'hessian\' or \'points\'.' % method)
+			raise exception
+
+		if dh is None:
+			dh = self.controls['dh']
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Transformation on the design point
+		#
+		varId = self.varId
+		NInRandVars = len(self.variableDistrib)
+		NInConstVars = len(self.variableConst)
+
+		vecPts = np.zeros(NInRandVars+NInConstVars)
+		for eachVar in self.variableDistrib:
+			vecPts[varId[eachVar]] = self.variableDesPt[eachVar]
+		[vecMean, vecStd] = self._EquivNormalArray(vecPts[:NInRandVars])
+		for eachVar in self.variableConst:
+			vecPts[varId[eachVar]] = self.variableConst[eachVar]
+
+		Jzy = np.linalg.cholesky(self.correlMat)
+		Jxy = np.diag(vecStd).dot(Jzy)
+		# Correlated (z) and uncorrelated (y) standard normal design point
+		vecZ = (vecPts[:NInRandVars]-vecMean)/vecStd
+		vecY = np.linalg.solve(Jzy, vecZ)
+		beta = math.sqrt(vecY.dot(vecY))
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Points and evaluations
+		#
+		self._PrintR('\nStarting SORM (%s method).' % method)
+		timei = time.time()
+
+		if method == 'hessian':
+			# Design point, +h and -h for each variable and +h_i+h_j for each pair
+			vech = vecMean*dh
+			pairs = [[i, j] for i in range(NInRandVars) for j in range(i+1, NInRandVars)]
+			matPts = np.zeros([1+2*NInRandVars+len(pairs), NInRandVars+NInConstVars])
+			matPts[:, :] = vecPts
+			matPts[1:(1+NInRandVars), 0:NInRandVars] += np.diag(vech)
+			matPts[(1+NInRandVars):(1+2*NInRandVars), 0:NInRandVars] -= np.diag(vech)
+			for idx, [i, j] in enumerate(pairs):
+				matPts[1+2*NInRandVars+idx, i] += vech[i]
+				matPts[1+2*NInRandVars+idx, j] += vech[j]
+
+			self._PrintR('Evaluating limit state on %d points.' % matPts.shape[0])
+			valsG = self._EvalBatch(matPts)
+			valG = valsG[0]
+			valsGp = valsG[1:(1+NInRandVars)]
+			valsGm = valsG[(1+NInRandVars):(1+2*NInRandVars)]
+
+			# Gradient and Hessian in x
+			gradGx = (valsGp-valsGm)/(2*vech)
+			hessGx = np.diag((valsGp+valsGm-2*valG)/vech**2)
+			for idx, [i, j] in enumerate(pairs):
+				hessGx[i, j] = (valsG[1+2*NInRandVars+idx]-valsGp[i]-valsGp[j]+valG)/(vech[i]*vech[j])
+				hessGx[j, i] = hessGx[i, j]
+
+			# Hessian in y, with second derivatives of x_i(z_i) = F^-1(Phi(z_i))
+			#	that are x'' = -x'*(z + x'*f'(x)/f(x)), being x' the equivalent std
+			vecD2x = -vecStd*(vecZ + vecStd*self._LogPdfDer(vecPts[:NInRandVars]))
+			gradG = (Jxy.T).dot(gradGx)
+			hessG = (Jxy.T).dot(hessGx).dot(Jxy) + (Jzy.T).dot(np.diag(gradGx*vecD2x)).dot(Jzy)
+
+		else:
+			# FORM gradient in y
+			gradG = np.array([self.results['grad'][eachVar] for eachVar in self.variableDistrib])
+
+		# Orthogonal axes, being the last one the design point direction
+		if beta > 0:
+			vecAlpha = vecY/beta
+		else:
+			vecAlpha = -gradG/math.sqrt(gradG.dot(gradG))
+		[matQ, matR] = np.linalg.qr(np.column_stack([vecAlpha, np.eye(NInRandVars)]))
+		matT = matQ[:, 1:NInRandVars]
+
+		if method == 'hessian':
+			# Curvatures are eigenvalues of the Hessian on the tangent plane
+			matK = (matT.T).dot(hessG).dot(matT)/math.sqrt(gradG.dot(gradG))
+			curvatures = np.linalg.eigvalsh((matK+matK.T)/2)
+
+		else:
+			# Design point and two points over each axis
+			matY = np.zeros([1+2*(NInRandVars-1), NInRandVars])
+			matY[:, :] = vecY
+			matY[1:NInRandVars, :] += step*matT.T
+			matY[NInRandVars:, :] -= step*matT.T
+			matZ = matY.dot(Jzy.T)
+
+			matPts = np.zeros([matY.shape[0], NInRandVars+NInConstVars])
+			matPts[:, :] = vecPts
+			matPts[1:, 0:NInRandVars] = self._NormalToX(matZ[1:])
+
+			self._PrintR('Evaluating limit state on %d points.' % matPts.shape[0])
+			valsG = self._EvalBatch(matPts)
+			valG = valsG[0]
+			curvatures = (valsG[1:NInRandVars]+valsG[NInRandVars:]-2*valG)/(step**2*math.sqrt(gradG.dot(gradG)))
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Probabilities of failure
+		#
+		if min(1+beta*curvatures) <= 0:
+			self._PrintR('\n WARNING: 1+Beta*curvature is not positive, SORM can\'t be used on this design point.\n')
+			PfBreitung = PfHohenbichler = PfTvedt = float('nan')
+
+		else:
+			phiB = scipy.stats.norm.pdf(beta)
+			PhiB = scipy.stats.norm.cdf(-beta)
+			prod1 = np.prod(1/np.sqrt(1+beta*curvatures))
+			prod2 = np.prod(1/np.sqrt(1+(beta+1)*curvatures))
+			prod3 = np.real(np.prod(1/np.sqrt(1+(beta+1j)*curvatures)))
+
+			PfBreitung = PhiB*prod1
+			PfHohenbichler = PhiB*np.prod(1/np.sqrt(1+curvatures*phiB/PhiB))
+			PfTvedt = PhiB*prod1 + (beta*PhiB-phiB)*(prod1-prod2) + (beta+1)*(beta*PhiB-phiB)*(prod1-prod3)
+
+		self.results['SORM'] = {}
+		self.results['SORM']['Pf'] = PfTvedt
+		self.results['SORM']['Beta'] = -scipy.stats.norm.ppf(PfTvedt)
+		self.results['SORM']['PfBreitung'] = PfBreitung
+		self.results['SORM']['PfHohenbichler'] = PfHohenbichler
+		self.results['SORM']['PfTvedt'] = PfTvedt
+		self.results['SORM']['curvatures'] = curvatures
+
+		self._PrintR('\n\n============================================================================\n')
+		self._PrintR(' SORM with limit state value %f on design point.' % valG)
+		self._PrintR(' Main curvatures: %s' % ', '.join(['%+.5E' % each for each in curvatures]))
+		self._PrintR(' FORM Pf: %2.4E (Beta = %2.3f)' % (self.results['Pf'], beta))
+		self._PrintR(' Breitung Pf: %2.4E' % PfBreitung)
+		self._PrintR(' Hohenbichler and Rackwitz Pf: %2.4E' % PfHohenbichler)
+		self._PrintR(' Tvedt Pf: %2.4E (Beta = %2.3f)' % (PfTvedt, self.results['SORM']['Beta']))
+		self._PrintR(' Elapsed time: %4.2f minutes.' % ((time.time()-timei)/60))
+		self._PrintR('\n============================================================================\n\n')
+
+		return dict(self.results['SORM'])
+
+
+	def SaveResults(self, filename, result=None):
+		"""
+		Save the result of Run() to a JSON file, so it can be used later as
+		warmstart of Run(), after LoadResults().
+
+		Parameters
+		----------
+		filename : str, obligatory
+			Name of the file, doesn't need the extension ".json", it will be
+			placed automatically.
+
+		result : dictionary, optional
+			Result returned by Run(). Defaults to the result of the last Run().
+
+		"""
+		if result is None:
+			result = self._lastResult
+		if result is None:
+			exception = Exception('There is no result to save, you must Run() before.')
+			raise exception
+
+		# numpy values aren't accepted by json
+		data = {}
+		for eachKey in result:
+			value = result[eachKey]
+			if type(value) == dict:
+				data[eachKey] = {each: float(value[each]) for each in value}
+			elif type(value) == np.ndarray:
+				data[eachKey] = value.tolist()
+			elif type(value) in [str, bool] or value is None:
+				data[eachKey] = value
+			else:
+				data[eachKey] = float(value)
+
+		filename = filename+'.json'
+		try:
+			f = open(filename, 'wt')
+		except:
+			exception = Exception('Unable to open the \"%s\" file for write data.' % filename)
+			raise exception
+		else:
+			json.dump(data, f, indent=1)
+			f.close()
+
+		self._PrintR('FORM results saved to "%s".' % filename)
+
+
+	def LoadResults(self, filename):
+		"""
+		Load FORM results saved by SaveResults(), returning the same dictionary
+		returned by Run(), that can be used as warmstart of Run().
+
+		Parameters
+		----------
+		filename : str, obligatory
+			Name of the file, doesn't need the extension ".json", it will be
+			placed automatically.
+
+		"""
+		filename = filename+'.json'
+		try:
+			f = open(filename, 'rt')
+		except:
+			exception = Exception('Unable to open the \"%s\" file for read data.' % filename)
+			raise exception
+		else:
+			result = json.load(f)
+			f.close()
+
+		for eachKey in ['status', 'cycles']:
+			if eachKey in result:
+				result[eachKey] = int(result[eachKey])
+		if result.get('Jzy') is not None:
+			result['Jzy'] = np.array(result['Jzy'])
+
+		self._PrintR('FORM results loaded from "%s".' % filename)
+		return result
+
+
 	def ExportDataCSV(self, filename, description=None):
 		"""
 		Exports process data to a CSV file.
@@ -1720,3 +2886,155 @@ class FORM(object):
 			f.close()
 
 			self._PrintR('Simulation data exported to "%s".' % filename)
+
+
+
+class _FORMBatch(object):
+	"""
+	Internal class that joins the evaluations of all cases of FORM.RunBatch().
+
+	Each case runs in a thread and waits on Request() until all the cases that
+	are still running have sent their requests, then all ANSYS points are
+	evaluated by one ANSYS run and all limit state points by one call.
+	"""
+
+	def __init__(self, form, ncases):
+		self.form = form
+		self.alive = ncases
+		self.steps = 0
+		self.ansysRuns = 0
+		self._waiting = []
+		self._cond = threading.Condition()
+
+
+	def Request(self, case, kind, data):
+		"""
+		Send the points of one case and wait the results of all cases.
+
+		Parameters
+		----------
+		case : FORM, obligatory
+			FORM object of the case.
+
+		kind : str, obligatory
+			'ansys' with data=[{name: values}, length] or 'ls' with
+			data=[matEvalPts, varId].
+
+		"""
+		req = {'case': case, 'kind': kind, 'data': data, 'done': False}
+		with self._cond:
+			self._waiting.append(req)
+			if len(self._waiting) >= self.alive:
+				self._Flush()
+			while not req['done']:
+				self._cond.wait()
+
+		if 'error' in req:
+			raise req['error']
+		return req['result']
+
+
+	def Finished(self):
+		"""
+		One case finished, the others don't wait for it anymore.
+		"""
+		with self._cond:
+			self.alive -= 1
+			if self._waiting != [] and len(self._waiting) >= self.alive:
+				self._Flush()
+
+
+	def _Flush(self):
+		"""
+		Evaluate all waiting requests, it's called with the lock acquired.
+		"""
+		reqs = self._waiting
+		self._waiting = []
+		self.steps += 1
+
+		ansysReqs = [each for each in reqs if each['kind'] == 'ansys']
+		lsReqs = [each for each in reqs if each['kind'] == 'ls']
+
+		# All ANSYS points in one run
+		if ansysReqs != []:
+			try:
+				ansys = self.form.ansys
+				bounds = np.cumsum([0]+[each['data'][1] for each in ansysReqs])
+				ansys.ClearValues()
+				ansys.SetLength(int(bounds[-1]))
+				for eachVar in ansys.varInNames:
+					ansys.SetVarInValues(eachVar, np.concatenate([each['data'][0][eachVar] for each in ansysReqs]))
+				ansys.Run()
+				self.ansysRuns += 1
+				resANSYS = ansys.GetVarOutValues()
+				for idx, each in enumerate(ansysReqs):
+					each['result'] = {name: resANSYS[name][bounds[idx]:bounds[idx+1]] for name in resANSYS}
+			except Exception as err:
+				for each in ansysReqs:
+					each['error'] = err
+
+		# All limit state points in one call
+		if lsReqs != []:
+			try:
+				varId = lsReqs[0]['data'][1]
+				bounds = np.cumsum([0]+[each['data'][0].shape[0] for each in lsReqs])
+				valG = self.form._EvalLS(np.vstack([each['data'][0] for each in lsReqs]), varId)
+				for idx, each in enumerate(lsReqs):
+					each['result'] = valG[bounds[idx]:bounds[idx+1]]
+			except Exception:
+				# Evaluate each case again, so the error stays just on its case
+				for each in lsReqs:
+					try:
+						each['result'] = self.form._EvalLS(each['data'][0], each['data'][1])
+					except Exception as err:
+						each['error'] = err
+
+		for each in reqs:
+			each['done'] = True
+		self._cond.notify_all()
+
+
+
+class _FORMBatchANSYS(object):
+	"""
+	Internal class used by each case of FORM.RunBatch() in place of the ANSYS
+	class, it stores the values and sends them to the batch on Run().
+	"""
+
+	def __init__(self, batch, case, ansys):
+		self._batch = batch
+		self._case = case
+		self.Model = ansys.Model
+		self.varInNames = ansys.varInNames
+		self.varOutNames = ansys.varOutNames
+		self.ClearValues()
+
+
+	def ClearValues(self):
+		self.length = 0
+		self._values = {}
+		self._results = None
+
+
+	def SetLength(self, length):
+		self.length = int(length)
+
+
+	def SetVarInValues(self, name, values):
+		self._values[name.upper()] = np.array(values, dtype=float).flatten()
+
+
+	def Run(self):
+		for eachVar in self.varInNames:
+			if eachVar not in self._values:
+				exception = Exception('Values of the variable \"%s\" were not set.' % eachVar)
+				raise exception
+
+		self._results = self._batch.Request(self._case, 'ansys', [self._values, self.length])
+
+
+	def GetVarOutValues(self):
+		results = {}
+		for each in self._results:
+			results[each] = np.copy(self._results[each])
+		return results
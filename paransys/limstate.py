@@ -0,0 +1,351 @@
+# -*- coding: UTF-8 -*-
+"""
+This module compiles the limit state equations used by MonteCarlo and FORM
+classes, so the equation string is parsed just once and not for each
+evaluation.
+
+Docs are available at https://dutitello.github.io/parAnsys/
+"""
+
+import keyword
+import numpy as np
+import scipy.stats
+import scipy.special
+import math
+
+
+# Names available inside string limit states, it's the same namespace that
+#	was used with eval(equat, globals(), varVal) inside each class module.
+_LSGLOBALS = {}
+_LSGLOBALS.update(math.__dict__)
+_LSGLOBALS['math'] = math
+_LSGLOBALS['np'] = np
+_LSGLOBALS['scipy'] = scipy
+
+# Same namespace for vectorized evaluation, where functions from math module
+#	are replaced by NumPy ufuncs (or SciPy ones) that work over arrays.
+def _veclog(x, base=None):
+	if base is None:
+		return np.log(x)
+	else:
+		return np.log(x)/np.log(base)
+
+_LSVECGLOBALS = dict(_LSGLOBALS)
+_LSVECGLOBALS.update({
+	'sin': np.sin, 'cos': np.cos, 'tan': np.tan,
+	'asin': np.arcsin, 'acos': np.arccos, 'atan': np.arctan, 'atan2': np.arctan2,
+	'sinh': np.sinh, 'cosh': np.cosh, 'tanh': np.tanh,
+	'asinh': np.arcsinh, 'acosh': np.arccosh, 'atanh': np.arctanh,
+	'exp': np.exp, 'expm1': np.expm1, 'log': _veclog, 'log10': np.log10,
+	'log2': np.log2, 'log1p': np.log1p, 'sqrt': np.sqrt, 'pow': np.power,
+	'fabs': np.fabs, 'floor': np.floor, 'ceil': np.ceil, 'trunc': np.trunc,
+	'hypot': np.hypot, 'degrees': np.degrees, 'radians': np.radians,
+	'copysign': np.copysign, 'fmod': np.fmod, 'isnan': np.isnan,
+	'isinf': np.isinf, 'isfinite': np.isfinite,
+	'erf': scipy.special.erf, 'erfc': scipy.special.erfc,
+	'gamma': scipy.special.gamma, 'lgamma': scipy.special.gammaln
+	})
+
+
+class LimState(object):
+	"""
+	Internal class that stores a limit state equation and evaluates it.
+
+	String equations are compiled once, when the limit state is created, and
+	after that they can be bound to a list of variables names, generating a
+	Python function that receives the values in the same order of the names.
+
+	Python functions are just called with the variables as keywords.
+
+
+		equat : str or function, obligatory
+			Limit state equation, as received by CreateLimState() or SetLimState().
+
+		userf : function, optional
+			User function called inside the equation string as ``userf()``.
+
+		vectorized : bool, optional
+			If it's True the user function (userf or equat) receives numpy
+			arrays with the values of all simulations at once, and must return
+			an array. String equations are always vectorized when it's possible.
+			Defaults to False.
+
+	"""
+
+	def __init__(self, equat, userf=None, vectorized=False):
+		"""
+
+		"""
+		# Bound functions for each tuple of names (cache)
+		self._bound = {}
+		self._vecbound = {}
+		self._cplxbound = {}
+		self.vectorized = vectorized
+
+		if type(equat) == str:
+			# String equation in lower case
+			self.equat = equat.lower()
+			self.userf = userf
+			self.isstr = True
+
+			# Compile it once
+			try:
+				self._code = compile(self.equat, '<limit state>', 'eval')
+			except SyntaxError as err:
+				exception = Exception('Limit state equation "%s" is not valid: %s.' % (equat, err.msg))
+				raise exception
+
+			# Namespace used to evaluate the equation
+			self._globals = dict(_LSGLOBALS)
+			self._globals['userf'] = self.userf
+			self._vecglobals = dict(_LSVECGLOBALS)
+			self._vecglobals['userf'] = self.userf
+
+			# Vectorized evaluation is possible if userf isn't used or if
+			#	userf accepts arrays
+			self._canvec = ('userf' not in self._code.co_names) or vectorized
+
+		else:
+			# Python function
+			self.equat = equat
+			self.userf = None
+			self.isstr = False
+			self._code = None
+			self._globals = None
+			self._vecglobals = None
+			self._canvec = vectorized
+
+
+	def __getstate__(self):
+		"""
+		Code objects and bound functions can't be pickled, they are created again
+		after unpickling.
+		"""
+		return {'equat': self.equat, 'userf': self.userf, 'isstr': self.isstr,
+				'vectorized': self.vectorized}
+
+
+	def __setstate__(self, state):
+		if state['isstr']:
+			self.__init__(state['equat'], state['userf'], state['vectorized'])
+		else:
+			self.__init__(state['equat'], vectorized=state['vectorized'])
+
+
+	@property
+	def canvec(self):
+		"""
+		True if the limit state can be evaluated over arrays.
+		"""
+		return self._canvec
+
+
+	def __str__(self):
+		if self.isstr:
+			return self.equat
+		else:
+			return self.equat.__name__
+
+
+	def Eval(self, varVal):
+		"""
+		Evaluate the limit state for one point.
+
+		Parameters
+		----------
+		varVal : dict, obligatory
+			Dictionary with the value of each variable.
+
+		"""
+		if self.isstr:
+			return eval(self._code, self._globals, varVal)
+		else:
+			return self.equat(**varVal)
+
+
+	def Bind(self, names):
+		"""
+		Return a function that evaluates the limit state receiving the values
+		of the variables as positional arguments, in the same order of names.
+
+		Parameters
+		----------
+		names : list of str, obligatory
+			Names of all variables that will be passed to the function.
+
+		"""
+		names = tuple(names)
+
+		# Already created
+		if names in self._bound:
+			return self._bound[names]
+
+		self._bound[names] = self._MakeFunc(names, self._globals)
+		return self._bound[names]
+
+
+	def _MakeFunc(self, names, namespace):
+		"""
+		Internal function that creates the function used by Bind() and EvalArray().
+		"""
+		if self.isstr:
+			# Arguments names, invalid names can't be used in the equation
+			#	so they are replaced by dummy arguments.
+			args = []
+			for idx, each in enumerate(names):
+				if each.isidentifier() and not keyword.iskeyword(each):
+					args.append(each)
+				else:
+					args.append('_arg%d' % idx)
+
+			src = 'lambda %s: (%s)' % (', '.join(args), self.equat)
+			func = eval(compile(src, '<limit state>', 'eval'), namespace)
+
+		else:
+			userfunc = self.equat
+			def func(*values):
+				return userfunc(**dict(zip(names, values)))
+
+		return func
+
+
+	def EvalArray(self, names, values, pool=None, nparts=1):
+		"""
+		Evaluate the limit state for a set of points, returning a 1D np.array.
+
+		When it's possible the equation is evaluated once over the whole
+		arrays, otherwise (or if it fails, or returns non finite values) each
+		point is evaluated separately with the function from Bind(), what
+		can be done by a pool of workers.
+
+		Parameters
+		----------
+		names : list of str, obligatory
+			Names of all variables.
+
+		values : list of 1D np.arrays, obligatory
+			Values of each variable, in the same order of names, all with the
+			same length.
+
+		pool : concurrent.futures.Executor, optional
+			Pool used to evaluate the points one by one, split in nparts that
+			are evaluated at the same time. Results are joined in the same
+			order of points.
+
+		nparts : int, optional
+			Number of parts of points sent to the pool. Defaults to 1.
+
+		"""
+		names = tuple(names)
+		values = [np.asarray(each, dtype=float) for each in values]
+		if len(values) > 0:
+			npts = values[0].shape[0]
+		else:
+			npts = 0
+
+		# Try the vectorized way
+		if self._canvec and self._vecbound.get(names, True) != False:
+			if names not in self._vecbound:
+				if self.isstr:
+					self._vecbound[names] = self._MakeFunc(names, self._vecglobals)
+				else:
+					self._vecbound[names] = self._MakeFunc(names, None)
+
+			try:
+				with np.errstate(all='ignore'):
+					result = self._vecbound[names](*values)
+				result = np.asarray(result, dtype=float)
+				if result.ndim == 0:
+					result = np.full(npts, float(result))
+			except Exception:
+				# It can't be vectorized, don't try it again
+				self._vecbound[names] = False
+			else:
+				# Non finite values are evaluated again one by one, since
+				#	math module raises errors that numpy don't.
+				if result.shape == (npts,) and np.isfinite(result).all():
+					return result
+
+		# One point each time, on the pool in parts
+		if pool is not None and npts > 1 and nparts > 1:
+			bounds = np.linspace(0, npts, min(nparts, npts)+1).round().astype(int)
+			futures = []
+			for part in range(len(bounds)-1):
+				futures.append(pool.submit(_EvalPoints, self, names,
+							   [each[bounds[part]:bounds[part+1]] for each in values]))
+
+			return np.concatenate([each.result() for each in futures])
+
+		return _EvalPoints(self, names, values)
+
+
+	def EvalComplex(self, names, values):
+		"""
+		Evaluate the limit state for a set of points with complex values, used
+		by complex step derivatives, returning a 1D np.array of complex.
+
+		String equations use NumPy functions, that accept complex values, and
+		user functions receive complex values. Functions must be analytic, as
+		``abs()``, ``min()``, ``max()`` and comparisons drop the imaginary part.
+
+		Parameters
+		----------
+		names : list of str, obligatory
+			Names of all variables.
+
+		values : list of 1D np.arrays, obligatory
+			Complex values of each variable, in the same order of names.
+
+		"""
+		names = tuple(names)
+		values = [np.asarray(each, dtype=complex) for each in values]
+		if len(values) > 0:
+			npts = values[0].shape[0]
+		else:
+			npts = 0
+
+		if names not in self._cplxbound:
+			if self.isstr:
+				self._cplxbound[names] = self._MakeFunc(names, self._vecglobals)
+			else:
+				self._cplxbound[names] = self._MakeFunc(names, None)
+		func = self._cplxbound[names]
+
+		try:
+			with np.errstate(all='ignore'):
+				if self._canvec:
+					result = np.asarray(func(*values), dtype=complex)
+					if result.ndim == 0:
+						result = np.full(npts, complex(result))
+				else:
+					result = np.zeros(npts, dtype=complex)
+					for idx in range(npts):
+						result[idx] = func(*[each[idx] for each in values])
+		except Exception as err:
+			exception = Exception('Limit state \"%s\" can\'t be evaluated with complex values (%s).\n' % (self, err)+
+								  'Complex step derivatives need analytic functions that accept complex values.')
+			raise exception
+
+		if result.shape != (npts,):
+			exception = Exception('Limit state \"%s\" returned %s values for %d points.' % (self, result.shape, npts))
+			raise exception
+
+		return result
+
+
+def _EvalPoints(limstate, names, values):
+	"""
+	Evaluate the limit state one point each time, it's a module function
+	to be used on process pools.
+	"""
+	func = limstate.Bind(names)
+	if len(values) > 0:
+		npts = len(values[0])
+	else:
+		npts = 0
+
+	result = np.zeros(npts)
+	for idx in range(npts):
+		result[idx] = func(*[each[idx] for each in values])
+
+	return result
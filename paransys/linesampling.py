@@ -0,0 +1,692 @@
+# -*- coding: UTF-8 -*-
+"""
+This module performns Reliability Analysis with Line Sampling and Directional
+Simulation using Python. Please read the classes docstrings for more.
+
+Docs are available at https://dutitello.github.io/parAnsys/
+"""
+
+import time
+import numpy as np
+import scipy.stats
+import math
+from paransys.montecarlo import MonteCarlo
+
+
+class _LineSimulation(MonteCarlo):
+	"""
+	Internal base class of LineSampling and DirectionalSimulation, both search
+	the limit state along lines of the uncorrelated standard normal space, with
+	the Nataf transformation of MonteCarlo class. The root search is made by
+	stages, and on each stage all lines are evaluated at once, in one ANSYS run.
+	"""
+
+	def __init__(self):
+		"""
+
+		"""
+		MonteCarlo.__init__(self)
+
+		# Results of each line
+		self.LineControl = {}
+
+
+	def SetRandomVarSampl(self, name, limst, distrib, mean, std=0, cv=None, par1=None, par2=None):
+		"""
+		Sampling distributions aren't used by Line Sampling and Directional Simulation.
+		"""
+		exception = Exception('%s does not use sampling distributions.' % self._method)
+		raise exception
+
+
+	def _CheckRun(self):
+		"""
+		Internal function that verifies the model before running and creates
+		the correlation matrix and it's Cholesky decomposition.
+		"""
+		if len(self.limstates) != 1:
+			exception = Exception('%s needs just one limit state, create it with CreateLimState().' % self._method)
+			raise exception
+
+		if len(self.variableDistrib) == 0:
+			exception = Exception('%s needs at least one random variable.' % self._method)
+			raise exception
+
+		if self._ANSYS and self.ansys.Model == {}:
+			exception = Exception('Before running ANSYS you must define the model that will be analysed with SetANSYSModel().')
+			raise exception
+
+		self._SetCorrelMat()
+		self._matL = np.linalg.cholesky(self.correlMat)
+		self._Nsim = 0
+
+
+	def _LineRoots(self, matP, matD, c0, g0, c1, g1, cmin, cmax, tol, maxIter):
+		"""
+		Internal function that finds the roots c of g(matP + c*matD) = 0 for
+		each line of matP and matD, from two points (c0, g0) and (c1, g1) of
+		each line. Lines that have the root between the two points use the
+		Illinois method (regula falsi), that keeps the root bracketed, the
+		others use the secant method. All lines are evaluated at once on each
+		stage.
+
+		Parameters
+		----------
+		matP, matD : 2D np.array, obligatory
+			Origin and direction of each line, in the uncorrelated standard
+			normal space.
+
+		c0, g0, c1, g1 : 1D np.array, obligatory
+			Two points of each line and it's limit state values.
+
+		cmin, cmax : float, obligatory
+			Limits of c, lines without root between them receive the limit.
+
+		tol : float, obligatory
+			Tolerance of c.
+
+		maxIter : integer, obligatory
+			Maximum number of stages.
+
+		Returns
+		-------
+		list with [roots, number of stages, number of lines that didn't converge].
+		"""
+		c0 = np.array(c0, dtype=float)
+		g0 = np.array(g0, dtype=float)
+		c1 = np.array(c1, dtype=float)
+		g1 = np.array(g1, dtype=float)
+		roots = c1.copy()
+		done = (g1 == 0)
+
+		stage = 0
+		while stage < maxIter:
+			act = np.where(~done)[0]
+			if len(act) == 0:
+				break
+
+			# Secant (or regula falsi) estimate, flat lines go to the limits
+			with np.errstate(all='ignore'):
+				cn = c1[act]-g1[act]*(c1[act]-c0[act])/(g1[act]-g0[act])
+			flat = ~np.isfinite(cn)
+			cn[flat] = np.where(g1[act][flat] > 0, cmax, cmin)
+			cn = np.clip(cn, cmin, cmax)
+
+			# Converged lines
+			conv = (np.abs(cn-c1[act]) <= tol)
+			roots[act[conv]] = cn[conv]
+			done[act[conv]] = True
+			act = act[~conv]
+			cn = cn[~conv]
+			if len(act) == 0:
+				break
+
+			stage += 1
+			self._PrintR('Stage %d: %d lines evaluated.' % (stage, len(act)))
+			gn = self._EvalNormals(matP[act]+cn[:, np.newaxis]*matD[act])
+
+			# Update the points, bracketed lines keep the root bracketed
+			bracket = (g0[act]*g1[act] < 0)
+			keep = bracket & (gn*g1[act] >= 0)
+			move = ~keep
+			c0[act[move]] = c1[act[move]]
+			g0[act[move]] = g1[act[move]]
+			g0[act[keep]] = g0[act[keep]]/2
+			c1[act] = cn
+			g1[act] = gn
+
+			roots[act] = cn
+			done[act[gn == 0]] = True
+
+		notconv = (~done).sum()
+		if notconv > 0:
+			self._PrintR('%d lines didn\'t converge after %d stages, their last point is used.' % (notconv, maxIter))
+
+		return [roots, stage, notconv]
+
+
+	def _LineFinish(self, linesPf, roots, stages, notconv, timei):
+		"""
+		Internal function that computes the results from the probability of
+		each line, prints and returns them.
+		"""
+		Nlines = len(linesPf)
+		Pf = linesPf.mean()
+		if Pf > 0 and Nlines > 1:
+			CVPf = linesPf.std(ddof=1)/math.sqrt(Nlines)/Pf
+		else:
+			CVPf = 0.0
+		Beta = -scipy.stats.norm.ppf(Pf)
+
+		if notconv > 0:
+			stnumb = 1
+		else:
+			stnumb = 0
+		self._stnumb = stnumb
+
+		self.LineControl['root'] = roots
+		self.LineControl['Pf'] = linesPf
+		self.LineControl['CVPf'] = CVPf
+		self.LineControl['Nsim'] = self._Nsim
+		self.LineControl['stages'] = stages
+		self.LineControl['ElapsedTime'] = ((time.time()-timei)/60)
+
+		self._PrintR('\n\n=======================================================================\n')
+		if stnumb == 1:
+			self._PrintR(' WARNING:')
+			self._PrintR('  %d lines didn\'t converge in the limit of stages.\n' % notconv)
+
+		self._PrintR(' Lines: %d' % Nlines)
+		self._PrintR(' Stages: %d' % stages)
+		self._PrintR(' Total of simulations: %3.3E' % self._Nsim)
+		self._PrintR(' CV of Prob. of failure (CVPf): %2.3f' % CVPf)
+		self._PrintR(' Probability of failure (Pf): %2.4E' % Pf)
+		self._PrintR(' Reliability index (Beta): %2.3f' % Beta)
+		self._PrintR(' Elapsed time: %f minutes.' % self.LineControl['ElapsedTime'])
+		self._PrintR('\n=======================================================================\n\n')
+
+		finret = {}
+		finret['status'] = stnumb
+		finret['Pf'] = Pf
+		finret['Beta'] = Beta
+		finret['CVPf'] = CVPf
+		finret['lines'] = Nlines
+		finret['stages'] = stages
+		finret['Nsim'] = self._Nsim
+
+		return finret
+
+
+	def GetSolutionControl(self, thing):
+		"""
+		Return values of the estimators in function of the number of lines.
+
+		Parameters
+		----------
+		thing: str, obligatory
+			Control that will be returned. Available things are listed below.
+
+		Available things
+		----------------
+		In function of the number of lines:
+			* 'N_Pf' = Probability of failure
+			* 'N_Beta' = Reliability index
+			* 'N_CVPf' = CV of Probability of failure
+
+		Returns
+		-------
+		2D numpy array of floats:
+			Each line has the number of lines and requested value.
+
+		"""
+		linesPf = self.LineControl['Pf']
+		N = np.arange(1, len(linesPf)+1)
+		Pf = np.cumsum(linesPf)/N
+
+		if thing == 'N_Pf':
+			values = Pf
+		elif thing == 'N_Beta':
+			values = -scipy.stats.norm.ppf(Pf)
+		elif thing == 'N_CVPf':
+			with np.errstate(all='ignore'):
+				var = (np.cumsum(linesPf**2)-N*Pf**2)/np.maximum(N-1, 1)
+				values = np.sqrt(np.maximum(var, 0)/N)/Pf
+			values = np.where(np.isfinite(values), values, 0.0)
+		else:
+			exception = Exception('Error while getting values of %s control. ' % self._method+
+				'"%s" is not recognized as a valid "thing".' % (thing))
+			raise exception
+
+		result = np.zeros([len(linesPf), 2])
+		result[:, 0] = N
+		result[:, 1] = values
+
+		self._PrintR('Returning values of "%s".' % thing)
+		return result
+
+
+	def ExportDataCSV(self, filename, description=None):
+		"""
+		Exports the analysis data to a CSV file.
+
+		Parameters
+		----------
+		filename : str, obligatory
+			Name of file that will receive the values, doesn't need the
+			extension ".csv", it will be placed automatically.
+
+		description : str, optional
+			A string that will be write in the beggining of the file.
+		"""
+
+		# Open file
+		filename = filename+'.csv'
+		try:
+			f = open(filename, 'wt')
+		except:
+			exception = Exception('Unable to open the %s file for write data.' % filename)
+			raise exception
+		else:
+			# Starts with sep=, for Microsoft Excel
+			f.write('sep=,\n')
+
+			# Description
+			if description != None:
+				f.write('%s\n\n' % description)
+
+			f.write('Input data:\n')
+
+			# Simulation Controllers:
+			f.write('Simulation Controllers:\n')
+			f.write(',Method:,%s\n' % self._method)
+			for eachCtrl in self.controls:
+				f.write(',%s:,%s\n' % (eachCtrl, self.controls[eachCtrl]))
+			f.write('\n')
+
+			# Variables and ANSYS
+			self._ExportModelCSV(f)
+
+			# Limit state
+			f.write('Limit State:,"%s"\n' % self.limstates[0][0])
+			f.write('\n')
+
+			# Results
+			Pf = self.LineControl['Pf'].mean()
+			f.write('\nResults:\n')
+			f.write(',Exit status:,%d,\n' % self._stnumb)
+			f.write(',Lines:,%d\n' % len(self.LineControl['Pf']))
+			f.write(',Stages:,%d\n' % self.LineControl['stages'])
+			f.write(',Total of simulations:,%3.3E\n' % self.LineControl['Nsim'])
+			f.write(',Probability of failure (Pf):,%2.4E\n' % Pf)
+			f.write(',Reliability Index (Beta):,%2.3f\n' % -scipy.stats.norm.ppf(Pf))
+			f.write(',CV of Prob. of failure (CVPf):,%2.3f\n' % self.LineControl['CVPf'])
+			f.write(',Elapsed time (minutes):,%4.3f\n' % self.LineControl['ElapsedTime'])
+			f.write('\n')
+
+			# Each line
+			f.write('\nLines:\n')
+			f.write(',Line,Root,Pf\n')
+			for idx in range(len(self.LineControl['Pf'])):
+				f.write(',%d,%8.5E,%2.4E\n' % (idx+1, self.LineControl['root'][idx], self.LineControl['Pf'][idx]))
+
+			f.close()
+			self._PrintR('Simulation data exported to "%s".' % filename)
+
+
+
+class LineSampling(_LineSimulation):
+	"""
+	This class performns Line Sampling inside Python using ParAnsys as a
+	connection with ANSYS for evaluate FEM models.
+
+	Line Sampling uses an important direction of the uncorrelated standard
+	normal space, usually the direction of the FORM design point (-alpha).
+	Each line is parallel to this direction, and starts at a random point of
+	the hyperplane orthogonal to it, so the failure probability of each line
+	is ``Pf_i = Phi(-c_i)``, where c_i is the distance along the line until
+	the limit state, found by a short 1-D root search. The probability of
+	failure is the mean of Pf_i, and for moderately nonlinear limit states it
+	needs much less simulations than Monte Carlo.
+
+	Variables, correlations, limit state and ANSYS are defined in the same way
+	of MonteCarlo class, but sampling distributions (SetRandomVarSampl) are not
+	used. On each stage of the root search all lines are evaluated at once, in
+	one ANSYS run.
+
+	|
+	|
+
+	**Class methods:**
+
+	"""
+
+	#---------------------------------------------------------------------------
+
+
+
+	def __init__(self):
+		"""
+
+		"""
+		_LineSimulation.__init__(self)
+		self._method = 'Line Sampling'
+
+
+	def Run(self, direction, Nlines=100, beta=None, tol=1E-3, maxIter=10, cmax=8.0, seed=None):
+		"""
+		Run the Line Sampling.
+
+		Parameters
+		----------
+		direction : dict, obligatory
+			The dictionary returned by FORM.Run(), or a dictionary with the
+			alpha of each random variable, as the 'alpha' of FORM results. The
+			lines have the direction -alpha, that goes to the failure domain.
+			Random variables must be the same of FORM, with the same
+			correlations.
+
+		Nlines : integer, optional
+			Number of lines. Defaults to 100.
+
+		beta : float, optional
+			Initial guess of the distance of the limit state along the lines.
+			Defaults to the Beta of FORM results, when direction has it, or 3.
+
+		tol : float, optional
+			Tolerance of the distance along the lines. Defaults to 1E-3.
+
+		maxIter : integer, optional
+			Maximum number of stages of the root search. Defaults to 10.
+
+		cmax : float, optional
+			Maximum distance along the lines, in both senses, lines without
+			root receive it. Defaults to 8.
+
+		seed : integer, optional
+			Seed of random values, for numpy.random.default_rng().
+			Defaults to None.
+
+		**Returns a dictionary with:**
+
+			* status : integer
+			  Status of solution, values can be found after this list.
+
+			* Pf : float
+			  Probability of failure.
+
+			* Beta : float
+			  Reliability index.
+
+			* CVPf : float
+			  Coefficient of Variation of Probability of failure.
+
+			* lines : int
+			  Number of lines.
+
+			* stages : int
+			  Number of stages of the root search, after the first one.
+
+			* Nsim : int
+			  Number of limit state evaluations (ANSYS simulations).
+
+
+		**Status values:**
+
+		* 0: no problem;
+		* 1: warning, some lines didn't converge in maxIter stages;
+		* 99: undefined error!
+
+		"""
+		#-----------------------------------------------------------------------
+		# Verify the controls
+		#
+		self._CheckRun()
+
+		if type(direction) != dict:
+			exception = Exception('The direction must be a dictionary, as the one returned by FORM.Run().')
+			raise exception
+
+		if 'alpha' in direction:
+			alpha = direction['alpha']
+			if beta == None and np.isfinite(direction.get('Beta', np.nan)) and direction['Beta'] > 0:
+				beta = direction['Beta']
+		else:
+			alpha = direction
+
+		if beta == None:
+			beta = 3.0
+
+		vecD = np.zeros(len(self.variableDistrib))
+		alpha = {eachVar.lower(): alpha[eachVar] for eachVar in alpha}
+		for eachVar in alpha:
+			if eachVar not in self.variableDistrib:
+				exception = Exception('The variable %s of direction is not a random variable.' % eachVar)
+				raise exception
+		for eachVar in self.variableDistrib:
+			if eachVar not in alpha:
+				exception = Exception('The direction doesn\'t have the random variable %s.' % eachVar)
+				raise exception
+			vecD[self.varId[eachVar]] = -alpha[eachVar]
+
+		absD = math.sqrt(vecD.dot(vecD))
+		if absD == 0 or not np.isfinite(absD):
+			exception = Exception('The direction must be a non null vector.')
+			raise exception
+		vecD = vecD/absD
+
+		if beta <= 0 or beta >= cmax:
+			exception = Exception('The initial distance beta must be betwen 0 and cmax.')
+			raise exception
+
+		self.controls = {}
+		self.controls['Nlines'] = Nlines
+		self.controls['beta'] = beta
+		self.controls['tol'] = tol
+		self.controls['maxIter'] = maxIter
+		self.controls['cmax'] = cmax
+
+		self._PrintR('Line Sampling controls set as:')
+		self._PrintR('   Number of lines: %d' % Nlines)
+		self._PrintR('   Initial distance: %f' % beta)
+		self._PrintR('   Tolerance of distance: %f' % tol)
+		self._PrintR('   Maximum number of stages: %d' % maxIter)
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Lines on the hyperplane orthogonal to the direction
+		#
+		timei = time.time()
+		self._PrintR('\nStarting Line Sampling.')
+
+		rng = np.random.default_rng(seed)
+		matU = rng.standard_normal((Nlines, len(self.variableDistrib)))
+		matP = matU-np.outer(matU.dot(vecD), vecD)
+		matD = np.tile(vecD, (Nlines, 1))
+
+		# First stage: the hyperplane and the initial distance, in one run
+		self._PrintR('Stage 0: %d lines evaluated at 0 and %f.' % (Nlines, beta))
+		valG = self._EvalNormals(np.concatenate([matP, matP+beta*matD]))
+		g0 = valG[:Nlines]
+		g1 = valG[Nlines:]
+
+		[roots, stages, notconv] = self._LineRoots(matP, matD, np.zeros(Nlines), g0,
+			np.full(Nlines, beta), g1, -cmax, cmax, tol, maxIter)
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Results
+		#
+		linesPf = scipy.stats.norm.cdf(-roots)
+		return self._LineFinish(linesPf, roots, stages, notconv, timei)
+		#-----------------------------------------------------------------------
+
+
+
+class DirectionalSimulation(_LineSimulation):
+	"""
+	This class performns Directional Simulation inside Python using ParAnsys
+	as a connection with ANSYS for evaluate FEM models.
+
+	Directional Simulation samples random directions of the uncorrelated
+	standard normal space, from the origin, and finds the distance r_i until
+	the limit state on each one. The failure probability of each direction is
+	``Pf_i = 1-Chi2(r_i**2, n)``, where n is the number of random variables,
+	and the probability of failure is the mean of Pf_i. The origin must be in
+	the safe domain, and the failure domain is considered after the first
+	root of each direction.
+
+	The root search starts marching on each direction with steps of dr until
+	rmax, and after it the bracketed roots are refined. On each stage all
+	directions are evaluated at once, in one ANSYS run.
+
+	Variables, correlations, limit state and ANSYS are defined in the same way
+	of MonteCarlo class, but sampling distributions (SetRandomVarSampl) are not
+	used.
+
+	|
+	|
+
+	**Class methods:**
+
+	"""
+
+	#---------------------------------------------------------------------------
+
+
+
+	def __init__(self):
+		"""
+
+		"""
+		_LineSimulation.__init__(self)
+		self._method = 'Directional Simulation'
+
+
+	def Run(self, Ndirections=100, dr=1.0, rmax=8.0, tol=1E-3, maxIter=10, seed=None):
+		"""
+		Run the Directional Simulation.
+
+		Parameters
+		----------
+		Ndirections : integer, optional
+			Number of directions. Defaults to 100.
+
+		dr : float, optional
+			Step of the marching on each direction. Defaults to 1.
+
+		rmax : float, optional
+			Maximum distance from origin, directions without root until it
+			don't fail. Defaults to 8.
+
+		tol : float, optional
+			Tolerance of the distance along the directions. Defaults to 1E-3.
+
+		maxIter : integer, optional
+			Maximum number of stages of the refinement of roots.
+			Defaults to 10.
+
+		seed : integer, optional
+			Seed of random values, for numpy.random.default_rng().
+			Defaults to None.
+
+		**Returns a dictionary with:**
+
+			* status : integer
+			  Status of solution, values can be found after this list.
+
+			* Pf : float
+			  Probability of failure.
+
+			* Beta : float
+			  Reliability index.
+
+			* CVPf : float
+			  Coefficient of Variation of Probability of failure.
+
+			* lines : int
+			  Number of directions.
+
+			* stages : int
+			  Number of stages of the refinement of roots.
+
+			* Nsim : int
+			  Number of limit state evaluations (ANSYS simulations).
+
+
+		**Status values:**
+
+		* 0: no problem;
+		* 1: warning, some directions didn't converge in maxIter stages;
+		* 99: undefined error!
+
+		"""
+		#-----------------------------------------------------------------------
+		# Verify the controls
+		#
+		self._CheckRun()
+
+		if dr <= 0 or rmax < dr:
+			exception = Exception('The step dr must be positive and smaller than rmax.')
+			raise exception
+
+		self.controls = {}
+		self.controls['Ndirections'] = Ndirections
+		self.controls['dr'] = dr
+		self.controls['rmax'] = rmax
+		self.controls['tol'] = tol
+		self.controls['maxIter'] = maxIter
+
+		self._PrintR('Directional Simulation controls set as:')
+		self._PrintR('   Number of directions: %d' % Ndirections)
+		self._PrintR('   Marching step: %f' % dr)
+		self._PrintR('   Maximum distance: %f' % rmax)
+		self._PrintR('   Tolerance of distance: %f' % tol)
+		self._PrintR('   Maximum number of stages: %d' % maxIter)
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Origin and directions
+		#
+		timei = time.time()
+		self._PrintR('\nStarting Directional Simulation.')
+
+		NInRandVars = len(self.variableDistrib)
+		gOrig = self._EvalNormals(np.zeros([1, NInRandVars]))[0]
+		if gOrig <= 0:
+			exception = Exception('The origin of standard normal space is in the failure domain, '+
+				'Directional Simulation needs it in the safe domain.')
+			raise exception
+
+		rng = np.random.default_rng(seed)
+		matD = rng.standard_normal((Ndirections, NInRandVars))
+		matD = matD/np.sqrt((matD**2).sum(axis=1))[:, np.newaxis]
+		matP = np.zeros_like(matD)
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Marching until the first negative value
+		#
+		r0 = np.zeros(Ndirections)
+		g0 = np.full(Ndirections, gOrig)
+		r1 = np.full(Ndirections, rmax)
+		g1 = np.full(Ndirections, gOrig)
+		failed = np.zeros(Ndirections, dtype=bool)
+
+		rcur = 0.0
+		while rcur < rmax and not failed.all():
+			rcur = min(rcur+dr, rmax)
+			act = np.where(~failed)[0]
+			self._PrintR('Marching to r = %f: %d directions evaluated.' % (rcur, len(act)))
+			gcur = self._EvalNormals(rcur*matD[act])
+			fail = (gcur <= 0)
+			# Bracket of the failed ones
+			r1[act[fail]] = rcur
+			g1[act[fail]] = gcur[fail]
+			failed[act[fail]] = True
+			# Last safe point of the others
+			r0[act[~fail]] = rcur
+			g0[act[~fail]] = gcur[~fail]
+
+		self._PrintR('%d directions reached the failure domain.' % failed.sum())
+
+		# Refine the roots
+		roots = np.full(Ndirections, np.inf)
+		stages = 0
+		notconv = 0
+		if failed.any():
+			[roots[failed], stages, notconv] = self._LineRoots(matP[failed], matD[failed],
+				r0[failed], g0[failed], r1[failed], g1[failed], 0.0, rmax, tol, maxIter)
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Results
+		#
+		linesPf = np.zeros(Ndirections)
+		linesPf[failed] = scipy.stats.chi2.sf(roots[failed]**2, NInRandVars)
+		return self._LineFinish(linesPf, roots, stages, notconv, timei)
+		#-----------------------------------------------------------------------
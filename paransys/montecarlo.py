@@ -8,9 +8,14 @@ Docs are available at https://dutitello.github.io/parAnsys/
 
 import os
 import time
+import concurrent.futures
 from paransys.ansys import ANSYS
+from paransys.limstate import LimState
 import numpy as np
 import scipy.stats
+import scipy.stats.qmc
+import scipy.special
+import warnings
 import math
 from math import *
 
@@ -37,15 +42,16 @@ class MonteCarlo(object):
 	
 	|
 
-	**To do**
+	When structure has more than one limit state all of them are evaluated with
+	all simulations, and the PDF of sampling distribution is the sum of all
+	limit states sampling distributions vs their sampling weights
+	(h(x) = w1.h1(x) + w2.h2(x) + hi.wi(x)...).
+
+	|
 
-	1) When structure has more than one limit state the PDF of sampling
-	   distribution is the sum of all limit states sampling distributions vs their
-	   sampling weights (h(x) = w1.h1(x) + w2.h2(x) + hi.wi(x)...)
-	   It's already done the division of simulations for each cycle with the
-	   limit state weights.
+	**To do**
 
-	2) When sampling distribution is different of real distribution Pf is going
+	1) When sampling distribution is different of real distribution Pf is going
 	   wrong, so it's not able to be used, for now.
 		
 	|
@@ -79,11 +85,19 @@ class MonteCarlo(object):
 
 		# Control if ANSYS is being used
 		self._ANSYS = False
+
+		# Sampler of standard normal values, set by Run()
+		self._sampler = 'random'
+
+		# Cross-entropy sampling density [weights, means, Cholesky factors]
+		#	in the standard normal space, used by Run() with adaptive='CE'
+		self._CEModel = None
+		self._CEFloor = 0.6
 		pass
 
 
-	def ANSYS(self, exec_loc=None, run_location=os.getcwd()+'\\ansys_anl\\', jobname='file',
-			     nproc=2, override=False, cleardir=False, add_flags=''):
+	def ANSYS(self, exec_loc=None, run_location=os.path.join(os.getcwd(), 'ansys_anl'), jobname='file',
+			     nproc=2, override=False, cleardir=False, add_flags='', instances=1):
 		"""
 		If ANSYS will be used it defines ANSYS properties, for initialize the
 		paransys.ANSYS class.
@@ -101,7 +115,7 @@ class MonteCarlo(object):
 			ANSYS jobname. Defaults to 'file'.
 
 		nproc : int, optional
-			Number of processors. Defaults to 2.
+			Number of processors used by each ANSYS instance. Defaults to 2.
 
 		override : bool, optional
 			Attempts to delete the .lock file at working directory.
@@ -118,10 +132,14 @@ class MonteCarlo(object):
 			Do not use '-b -i -o'
 			Flags can be found at https://www.sharcnet.ca/Software/Ansys/16.2.3/en-us/help/ans_ope/Hlp_G_OPE3_1.html
 
+		instances : int, optional
+			Number of ANSYS instances running at the same time, the samples of
+			each ANSYS run are split betwen them. Defaults to 1.
+
 		"""
 		self.ansys = ANSYS(exec_loc=exec_loc, run_location=run_location,
 								jobname=jobname, nproc=nproc, override=override,
-								cleardir=cleardir, add_flags=add_flags)
+								cleardir=cleardir, add_flags=add_flags, instances=instances)
 
 		self._ANSYS = True
 
@@ -202,6 +220,60 @@ class MonteCarlo(object):
 			raise exception
 
 
+	def SetANSYSCache(self, cachefile=None, digits=10):
+		"""
+		Turn on the cache of ANSYS results, so samples that were already solved
+		(in this analysis or in other ones saved in cachefile) are not sent to
+		ANSYS again.
+
+		Parameters
+		----------
+		cachefile : str, optional
+			SQLite database file where the results are saved. If it's None the
+			results are kept only in memory. Defaults to None.
+
+		digits : int, optional
+			Number of significant digits of the input values that are compared
+			to find a result in the cache. Defaults to 10.
+		"""
+		if self._ANSYS:
+			self.ansys.SetCache(cachefile, digits)
+		else:
+			exception = Exception('ANSYS not declared yet. Before set ANSYS '+
+				'cache you must define ANSYS properties with ANSYS(...).')
+			raise exception
+
+
+	def SetANSYSErrorPolicy(self, policy='resubmit', attempts=2, flags=[]):
+		"""
+		Define what is done with ANSYS simulations that finish with errors
+		(ERR column of PDS results file).
+
+		Parameters
+		----------
+		policy : str, optional
+			'resubmit' solves again just the simulations with errors, 'drop'
+			returns them with NaN results and 'raise' raises an exception.
+			Defaults to 'resubmit'.
+
+			With 'drop' the simulations with errors are not used and the Pf is
+			the mean of the other simulations.
+
+		attempts : int, optional
+			Maximum number of attempts with 'resubmit' policy. Defaults to 2.
+
+		flags : list of str, optional
+			Additional ANSYS flags used in each attempt with 'resubmit' policy.
+			Defaults to [].
+		"""
+		if self._ANSYS:
+			self.ansys.SetErrorPolicy(policy, attempts, flags)
+		else:
+			exception = Exception('ANSYS not declared yet. Before set ANSYS '+
+				'error policy you must define ANSYS properties with ANSYS(...).')
+			raise exception
+
+
 	# Internal for variable distrib definition
 	def _VarDistrib(self, type, name, distrib, mean, std, cv, par1, par2, limst=0):
 		"""
@@ -555,14 +627,17 @@ class MonteCarlo(object):
 			raise exception
 
 
-	def CreateLimState(self, equat, weight=1.00, userf=None):
+	def CreateLimState(self, equat, weight=1.00, userf=None, vectorized=False):
 		"""
-		Create and Set a new limit state.*
+		Create and Set a new limit state.
 
 		The number ID of LimitStates are generated automatically starting at 0
 		for the first.
 
-		*** Current version supports only one limit state!**
+		All limit states are evaluated with all simulations of each cycle, that
+		are solved by ANSYS just once, so Run() returns the probability of
+		failure of each limit state, and of the series and parallel systems,
+		from the same simulations.
 
 		ATTENTION: When using ANSYS the weight of results from ANSYS variables
 		are determined using the weights of all ANSYS input variables.
@@ -575,7 +650,9 @@ class MonteCarlo(object):
 
 		weight : float, obligatory only with more than 1 limit state
 			The weight of current limit state, it determines how the simulations
-			are distributed betwen all the limit states.
+			are distributed betwen all the limit states, each part is generated
+			with the sampling distributions (SetRandomVarSampl) of its limit
+			state, and the weights of simulations are from the mixture of them.
 			The sum of all limit states must be 1.00, so, if there is just one
 			limit state it's weight should be 1.00
 
@@ -629,6 +706,19 @@ class MonteCarlo(object):
 
 			mc.CreateLimState(equat=stress)
 
+		vectorized : bool, optional
+			String equations are evaluated at once over the arrays with all the
+			simulations of a cycle, being math functions (``sin()``, ``sqrt()``,
+			``exp()``...) replaced by NumPy ones. When it isn't possible they are
+			evaluated one simulation each time.
+
+			User functions (userf or a function as equat) are called one time
+			for each simulation, unless vectorized is True, when they receive
+			NumPy arrays with the values of all simulations and must return an
+			array with the limit state values.
+
+			Defaults to False.
+
 		"""
 		if weight <= 0 or weight > 1.00:
 			exception = Exception('The weigth of limit state must be greater than zero and less equal to 1.00.')
@@ -637,36 +727,6 @@ class MonteCarlo(object):
 		# Add current limit state to the list
 		act = len(self.limstates)
 
-		#---------------
-		#
-		#	TAKE A LOOK HERE !
-		#
-		#
-		#
-		#
-		#
-		#
-		#
-		# For now just 1 limit state with weight=1
-		# 	this part prevents more than 1 limit states.
-		#
-		#
-		#
-		#
-		weight = 1
-		if act >= 1:
-			exception = Exception('Current version of ParAnsys does not support more than one limit states.')
-			raise exception
-		#else:
-		#	self._PrintR('\n\nCurrent version of ParAnsys supports only one limit state, do not try to set another.\n\n')
-		#
-		#
-		#
-		#
-		#
-		#
-		#---------------
-		
 		if(type(equat) == str):
 			# String equation
 			# Change equation to lowcase
@@ -675,7 +735,8 @@ class MonteCarlo(object):
 			self._userf = None
 	
 		# Fourth value limstates[act][3] will be the Ns for LS
-		self.limstates[act] = [equat, weight, userf, 0]
+		# Fifth value limstates[act][4] is the compiled limit state
+		self.limstates[act] = [equat, weight, userf, 0, LimState(equat, userf, vectorized)]
 
 		#
 		try:
@@ -689,7 +750,7 @@ class MonteCarlo(object):
 		for each in self.limstates:
 			tempsum += self.limstates[each][1]
 
-		if tempsum > 1.00:
+		if tempsum > 1.00+1E-9:
 			exception = Exception('The sum of limit states weights exceeded 1.00, please verify the inserted values.')
 			raise exception
 
@@ -740,6 +801,209 @@ class MonteCarlo(object):
 		#else:
 		#	return self._PrintR('Variable %s is already set as an ANSYS variable.' % name)
 
+
+	def _SetCorrelMat(self):
+		"""
+		Internal function that creates the variables ids (self.varId) and the
+		equivalent correlation matrix of Nataf (self.correlMat) of random variables.
+		"""
+		NInRandVars = len(self.variableDistrib)
+
+		# Create var id list
+		varId = {}
+		idx = 0
+		# For random variables
+		for eachVar in self.variableDistrib:
+			varId[eachVar] = idx
+			idx += 1
+
+		for eachVar in self.variableConst:
+			varId[eachVar] = idx
+			idx += 1
+
+		self.varId = varId
+
+		# Initial correlation Matrix
+		self.correlMat = np.eye(NInRandVars)
+
+		for each in self.corlist:
+			i = varId[each[0]]
+			j = varId[each[1]]
+			cor = self.corlist[each]
+
+			# Apply Nataf to transform the correlation
+			var1props = self.variableDistrib[each[0]]
+			var2props = self.variableDistrib[each[1]]
+
+			# Both are gauss
+			if (var1props[0] == 'gauss' and var2props[0] == 'gauss'):
+				cor = cor
+
+			# Both are LN
+			elif var1props[0] == 'logn' and var2props[0] == 'logn':
+				cv1 = var1props[3]
+				cv2 = var2props[3]
+				cor = cor*(math.log(1+cor*cv1*cv2) /
+				           (cor*math.sqrt(math.log(1+cv1**2)*math.log(1+cv2**2))))
+
+			# Both are Gumbel
+			elif var1props[0] == 'gumbel' and var2props[0] == 'gumbel':
+				cor = cor*(1.064 - 0.069*cor + 0.005*cor**2)
+
+			# One is gauss and other is logn
+			elif (var1props[0] == 'gauss' and var2props[0] == 'logn') \
+				or (var2props[0] == 'gauss' and var1props[0] == 'logn'):
+
+				# who is logn?
+				if var1props[0] == 'logn':
+					cv = var1props[3]
+				else:
+					cv = var2props[3]
+
+				# cor is
+				cor = cor*cv/math.sqrt(math.log(1+cv**2))
+
+			# One is gauss and other is gumbel
+			elif (var1props[0] == 'gauss' and var2props[0] == 'gumbel') \
+				or (var2props[0] == 'gauss' and var1props[0] == 'gumbel'):
+				cor = 1.031*cor
+
+			# One is logn and other is gumbel
+			elif (var1props[0] == 'logn' and var2props[0] == 'gumbel') \
+				or (var2props[0] == 'logn' and var1props[0] == 'gumbel'):
+				# who is logn?
+				if var1props[0] == 'logn':
+					cv = var1props[3]
+				else:
+					cv = var2props[3]
+
+				# cor is
+				cor = cor*(1.029 + 0.001*cor + 0.014*cv + 0.004*cor**2 + 0.233*cv**2 - 0.197*cor*cv)
+
+			# Forbiden zone
+			else:
+				exception = Exception('When applying NATAF on variables \"%s\" and \"%s\" the variables ' +
+                                    'conditions wasn\'t possible.')
+				raise exception
+
+			# Save it!
+			self.correlMat[i, j] = cor
+			self.correlMat[j, i] = cor
+
+
+	def _EvalNormals(self, matU):
+		"""
+		Internal function that evaluates the limit state for each line of matU,
+		that has uncorrelated standard normal values of random variables, using
+		just one ANSYS run for all lines. It's used by the methods that search
+		points in the standard normal space (as SubsetSimulation), after
+		_SetCorrelMat() and self._matL are set. Evaluations are counted on
+		self._Nsim.
+
+		Parameters
+		----------
+		matU : 2D np.array, obligatory
+			One line for each simulation and one column for each random variable.
+
+		Returns
+		-------
+		1D np.array with limit state values, simulations with errors on ANSYS
+		receive +inf (they are never in the failure domain).
+		"""
+		Nsim = matU.shape[0]
+		valG = np.zeros(Nsim)
+		if Nsim == 0:
+			return valG
+
+		# Correlated standard normal values
+		matY = self._matL.dot(matU.T)
+
+		# Values of all variables
+		varsValues = {}
+		for eachVar in self.variableDistrib:
+			eachVar = eachVar.lower()
+			varsValues[eachVar] = self._GenRandomVW(self.variableDistrib[eachVar], False, matY[self.varId[eachVar]])[0]
+
+		for eachVar in self.variableConst:
+			eachVar = eachVar.lower()
+			varsValues[eachVar] = np.full(Nsim, self.variableConst[eachVar], dtype=float)
+
+		# ANSYS
+		valid = np.ones(Nsim, dtype=bool)
+		if self._ANSYS:
+			self.ansys.ClearValues()
+			self.ansys.SetLength(Nsim)
+			for eachVar in self.ansys.varInNames:
+				self.ansys.SetVarInValues(eachVar.lower(), varsValues[eachVar.lower()])
+
+			results = self.ansys.Submit().Wait()
+
+			if results['ERR'].sum() > 0:
+				valid = (results['ERR'] == 0)
+				self._PrintR('%d simulations finished with errors on ANSYS, they are rejected.' % (Nsim-valid.sum()))
+
+			for eachVar in self.ansys.varOutNames:
+				varsValues[eachVar.lower()] = results[eachVar.upper()]
+
+		# Limit state
+		names = list(varsValues.keys())
+		values = [varsValues[each] for each in names]
+		valG = self.limstates[0][4].EvalArray(names, values)
+		valG = np.where(valid, valG, np.inf)
+
+		self._Nsim += Nsim
+
+		return valG
+
+
+	def _ExportModelCSV(self, f):
+		"""
+		Internal function that writes ANSYS properties, variables and the
+		correlation matrix to the CSV file f, used by ExportDataCSV() of
+		SubsetSimulation, LineSampling and DirectionalSimulation.
+		"""
+		# ANSYS Properties
+		if self._ANSYS:
+			f.write('ANSYS Properties:\n')
+			f.write(',ANSYS Model:\n')
+			f.write(',,Model:,%s\n' % self.ansys.Model['inputname'])
+			f.write(',,Extra files:,%s\n' % self.ansys.Model['extrafiles'])
+			f.write(',,Input dir.:,%s\n' % self.ansys.Model['directory'])
+			f.write(',ANSYS Input variables:\n')
+			for eachVar in self.ansys.varInNames:
+				f.write(',,%s\n' % eachVar)
+			f.write(',ANSYS Output variables:\n')
+			for eachVar in self.ansys.varOutNames:
+				f.write(',,%s\n' % eachVar)
+			f.write('\n')
+
+		# Random variables
+		f.write('Random variables:\n')
+		f.write(',Name, Distribution, Mean, Standard Deviation, CV, Par1, Par2\n')
+		for eachVar in self.variableDistrib:
+			values = self.variableDistrib[eachVar]
+			cmd = ',%s,%s' % (eachVar, values[0])
+			for eachVal in values[1:]:
+				cmd = '%s,%f' % (cmd, eachVal)
+			f.write('%s\n' % cmd)
+		f.write('\n')
+
+		# Constant variables
+		f.write('Constant variables:\n')
+		f.write(',Name,Value\n')
+		for eachVar in self.variableConst:
+			f.write(',%s,%8.5E\n' % (eachVar, self.variableConst[eachVar]))
+		f.write('\n')
+
+		# Correlation Matrix
+		f.write('Correlation matrix:\n')
+		names = list(self.variableDistrib.keys())
+		f.write(',,%s\n' % ','.join(names))
+		for idx, eachLine in enumerate(self.correlMat):
+			f.write(',%s,%s\n' % (names[idx], ','.join(['%f' % each for each in eachLine])))
+		f.write('\n')
+
+
 	def _GenRandomVW(self, varDistrib, sampDist, NCValues_h):
 		"""
 		Internal function for Generate Random Values and it's Weights
@@ -902,101 +1166,854 @@ class MonteCarlo(object):
 		return [randval, weights, NCValues_f]
 
 
-	def Run(self, Ns, Nmaxcycles, CVPf=0.00, tolAdPt=False):
+	def _NatafJointW(self, matCorInv, Z_f, Z_h, sampling=True):
 		"""
-		Run the Monte Carlo simulation.
+		Internal function that returns the ratio of joint normal distributions
+		(fX/hX) used by Nataf process, for all simulations at once.
 
 		Parameters
 		----------
-		Ns : integer, obligatory
-			Number of simulations performed on each cycle.
-			After each cycle the convergence of simualtion is verified.
-			When using Importance Sampling with Adaptive Sampling, after each
-			cycle the new sampling point will be determined.
+		matCorInv : 2D np.array, obligatory
+			Inverse of the equivalent correlation matrix.
 
-		Nmaxcycles : integer, obligatory
-			Maximum number of cycles to be performed, if CVPf is not reached on
-			Nmaxcycles the simulation will be interrupted.
+		Z_f : 2D np.array, obligatory
+			Normalized correlated values from real distributions, with one
+			line for each random variable and one column for each simulation.
 
-		CVPf : float, optional
-			Target value of Probability Failure Coefficient of Variation, when
-			reached the simulation stops.
+		Z_h : 2D np.array, obligatory
+			Normalized correlated values from sampling distributions, like Z_f.
 
-		tolAdPt : float or False, optional
-			Maximum relative tolerance for adaptive sampling point search.
-			If the value is "False" it disable adaptive sampling, simulations
-			will use always the user set point.
+		sampling : bool, optional
+			If there is no sampling distribution Z_f and Z_h are equal and the
+			ratio is always 1, so it isn't evaluated.
 
+		Returns
+		-------
+		1D np.array with the weight of each simulation.
+		"""
+		if sampling == False:
+			return np.ones(Z_h.shape[1])
 
-		**Returns a dictionary with:**
+		# Quadratic forms Z.T*inv(C)*Z of all columns
+		quad_f = np.einsum('ij,ij->j', Z_f, matCorInv.dot(Z_f))
+		quad_h = np.einsum('ij,ij->j', Z_h, matCorInv.dot(Z_h))
 
-			* stnumb : integer
-			  Status of solution, values can be found after this list.
+		return np.exp(-1/2*quad_f + 1/2*quad_h)
 
-			* Pf : float
-			  Probability of failure.
 
-			* Beta : float
-			  Reliability index.
+	def _DistribZ(self, distrib, values):
+		"""
+		Internal function that returns the normalized values Z = Phi^-1(F(x))
+		of values x for a distribution, as made by _GenRandomVW(), and the log
+		of the ratio between the PDF of x and the standard normal PDF of Z.
 
-			* CVPf : float
-			  Coefficient of Variation of Probability of failure
+		Parameters
+		----------
+		distrib : list, obligatory
+			Distribution parameters, [distrib, mean, std, cv].
 
-			* {SamplingPoints} : dictionary of dictionaries
-			  Dictionary with sampling points used, or founded in case of
-			  adaptive sampling, for each Variable on each Limit State.
-			  (SamplingPoints[eachLS][eachVar])
+		values : 1D np.array, obligatory
+			Values of the variable.
 
-			* cycles : int
-			  Number of cycles performed to obtain the solution.
+		Returns
+		-------
+		[Z, logratio] as 1D np.arrays.
+		"""
+		if distrib[0] == 'gauss':
+			Z = (values - distrib[1])/distrib[2]
+			logratio = np.full(len(values), -math.log(distrib[2]))
 
-			* distparms : dictionary of dictionaries
-			  Return mean (gMean) and standart deviation (gStd) of each limit state function.  
+		elif distrib[0] == 'logn':
+			qsi = math.sqrt(math.log(1 + (distrib[3])**2))
+			lmbd = math.log(distrib[1]) - 0.5*qsi**2
+			Z = (np.log(values) - lmbd)/qsi
+			logratio = -np.log(qsi*values)
 
+		elif distrib[0] == 'gumbel':
+			scl = math.sqrt(6)*distrib[2]/math.pi
+			loc = distrib[1] - 0.57721*scl
+			# Upper tail from survival function, it's where failures usually are
+			Z = scipy.stats.norm.isf(scipy.stats.gumbel_r.sf(values, loc=loc, scale=scl))
+			logratio = scipy.stats.gumbel_r.logpdf(values, loc=loc, scale=scl) - scipy.stats.norm.logpdf(Z)
 
-		**Status values:**
+		return [Z, logratio]
 
-		* 0: no problem;
-		* 1: warning, maximum of cycles reached with no convergence of CVPf;
-		* 99: undefined error!
 
+	def _MixtureW(self, varsValues):
 		"""
-		#---------------
-		#
-		#
-		#
-		#	TAKE A LOOK HERE !
-		#
-		#
-		#
-		#
-		# 	For now just 1 limit state with weight=1
-		#
-		#
-		#
-		#
-		#
-		#
-		#
-		#---------------
+		Internal function that returns the weights fX/hX of all simulations of
+		a cycle when more than one limit state has sampling distributions. Each
+		limit state generates its part of the simulations with its sampling
+		distributions, but all limit states are evaluated with all
+		simulations, so hX is the mixture of the sampling densities of all
+		limit states, ``hX = w1.h1(x) + w2.h2(x) + ...``, where wi is the part
+		of simulations of each limit state.
 
+		Parameters
+		----------
+		varsValues : dictionary of dictionaries, obligatory
+			Values of variables, from _CycleValues().
+		"""
+		Ns = sum([self.limstates[eachLS][3] for eachLS in self.limstates])
 
-		#-----------------------------------------------------------------------
-		# Set the controls
+		# Real distributions
+		Z_f = np.zeros([len(self.variableDistrib), len(varsValues['__joint_all_w__'])])
+		logratio_f = {}
+		for eachVar in self.variableDistrib:
+			[Z_f[self.varId[eachVar]], logratio_f[eachVar]] = \
+				self._DistribZ(self.variableDistrib[eachVar], varsValues[eachVar]['values'])
+		quad_f = np.einsum('ij,ij->j', Z_f, self._matCorInv.dot(Z_f))
+
+		# log(wi*hi/fX) of each limit state
+		logh = np.zeros([len(self.limstates), Z_f.shape[1]])
+		for idx, eachLS in enumerate(self.limstates):
+			Z_h = Z_f.copy()
+			logh[idx] = math.log(self.limstates[eachLS][3]/Ns)
+			for eachVar in self.SPForLS[eachLS]['pt']:
+				[Z_h[self.varId[eachVar]], logratio_h] = \
+					self._DistribZ(self.SPForLS[eachLS]['pt'][eachVar], varsValues[eachVar]['values'])
+				logh[idx] += logratio_h - logratio_f[eachVar]
+			quad_h = np.einsum('ij,ij->j', Z_h, self._matCorInv.dot(Z_h))
+			logh[idx] += -1/2*quad_h + 1/2*quad_f
 
-		self._SetControls(Ns=Ns, Nmaxcycles=Nmaxcycles, CVPf=CVPf, tolAdPt=tolAdPt)
+		return np.exp(-scipy.special.logsumexp(logh, axis=0))
 
-		#if self.controls == {}:
-		#	exception = Exception('Before Run the Monte Carlo simulation you '+
-		#						  'must define the controls of simulation '+
-		#						  'process with SetControls().')
-		#	raise exception
 
-		# Adaptive condition
-		if tolAdPt != False:
-			adapt = True
-		else:
-			adapt = False
+	def _CycleNormals(self, cycle, chunk, Nsc):
+		"""
+		Internal function that generates the standard normal values of a cycle.
+
+		Without seed and workers the global np.random is used, otherwise each
+		part (chunk) of each cycle has its own numpy.random.Generator, created
+		from a SeedSequence with spawn_key=(cycle, chunk), so the results are
+		the same for the same seed and number of workers.
+
+		With Latin Hypercube, Sobol or Halton samplers each part of each cycle
+		is an independent randomization of the design, that is transformed to
+		standard normal values by the inverse CDF.
+
+		Parameters
+		----------
+		cycle : int, obligatory
+			Current cycle.
+
+		chunk : int, obligatory
+			Part of the cycle (worker number).
+
+		Nsc : int, obligatory
+			Number of simulations.
+
+		Returns
+		-------
+		2D np.array with one line for each random variable, and one more used
+		to choose the component of the cross-entropy density (with adaptive='CE').
+		"""
+		if self._entropy == None:
+			if self._sampler == 'random':
+				return np.random.normal(0.0, 1.0, (self._NNormals, Nsc))
+			# Generator for randomizations from the global np.random
+			rng = np.random.default_rng(np.random.randint(2**31-1))
+		else:
+			rng = np.random.default_rng(np.random.SeedSequence(self._entropy, spawn_key=(cycle, chunk)))
+			if self._sampler == 'random':
+				return rng.standard_normal((self._NNormals, Nsc))
+
+		# Randomized Latin Hypercube or scrambled quasi-Monte Carlo
+		if self._sampler == 'lhs':
+			engine = scipy.stats.qmc.LatinHypercube(self._NNormals, seed=rng)
+		elif self._sampler == 'sobol':
+			engine = scipy.stats.qmc.Sobol(self._NNormals, scramble=True, seed=rng)
+		else:
+			engine = scipy.stats.qmc.Halton(self._NNormals, scramble=True, seed=rng)
+
+		with warnings.catch_warnings():
+			# Sobol warns when Nsc isn't a power of 2, it's said by Run()
+			warnings.simplefilter('ignore')
+			uniform = engine.random(Nsc)
+
+		uniform = np.clip(uniform, 1E-300, 1-1E-16)
+		return scipy.stats.norm.ppf(uniform).T
+
+
+	def _CycleValues(self, normalValuesMatrix, c0, c1):
+		"""
+		Internal function that generates the values and weights of all
+		variables for simulations c0 to c1 of a cycle.
+
+		Parameters
+		----------
+		normalValuesMatrix : 2D np.array, obligatory
+			Uncorrelated standard normal values, from _CycleNormals().
+
+		c0, c1 : int, obligatory
+			First and last+1 simulations of the cycle.
+
+		Returns
+		-------
+		varsValues : dictionary of dictionaries
+			Values and weights of each variable (varsValues[eachVar]['values']),
+			and the joint weights in varsValues['__joint_all_w__'].
+		"""
+		# Number of simulations
+		Nsc = c1 - c0
+
+		# Store variables Values and Weights
+		#	(dictionary of dictionaries)
+		varsValues = {}
+
+		# Cross-entropy density in the standard normal space
+		if self._CEModel is not None:
+			[normalValuesMatrix, ceWeights] = self._CESample(normalValuesMatrix)
+			varsValues['__u__'] = normalValuesMatrix
+
+		# Apply correlation with x_c=L.x
+		normalCorrelatedMatrix_h = self._matL.dot(normalValuesMatrix)
+		normalCorrelatedMatrix_f = normalCorrelatedMatrix_h.copy()
+
+		# Run for each variable each limit state, of limit state get limit
+		# 	state size (Ns), if there is SamplDistrb generate Ns from
+		#	sampling, else generate from RandomDistrib.
+		for eachVar in self.variableDistrib:
+			eachVar = eachVar.lower()
+			# For each variable has values and weights
+			varsValues[eachVar] = {}
+			# All values as 0 in the beggining
+			varsValues[eachVar]['values'] = np.zeros(Nsc)
+			# All weights are 1 in the beggining
+			varsValues[eachVar]['weights'] = 1+np.zeros(Nsc)
+
+			for eachLS in self.limstates:
+				# Positions of limit state inside c0:c1
+				posi = max(self._LSRange[eachLS][0], c0) - c0
+				posf = min(self._LSRange[eachLS][1], c1) - c0
+				if posf <= posi:
+					continue
+
+				# Get True Random Distribution
+				varDistrib = self.variableDistrib[eachVar]
+
+				# Verify the existence of SamplingDistrib/SPForLS, if exists get it
+				if eachVar in self.SPForLS[eachLS]['pt']:
+					# Have sampling distribution
+					sampDist = self.SPForLS[eachLS]['pt'][eachVar]
+				else:
+					# Have no sampling distribution
+					sampDist = False
+
+
+				# Call _GenRandomVW to get values and weights
+				[varsValues[eachVar]['values'][posi:posf], varsValues[eachVar]['weights'][posi:posf], \
+					normalCorrelatedMatrix_f[self.varId[eachVar], posi:posf]] = \
+					self._GenRandomVW(varDistrib, sampDist, normalCorrelatedMatrix_h[self.varId[eachVar], posi:posf])
+
+		# Joint distributions weights
+		# Ratio of joint normal distributions (fX/hX) for Nataf process - if not using importance sampling it will be 1 !
+		varsValues['__joint_all_w__'] = self._NatafJointW(self._matCorInv, normalCorrelatedMatrix_f, normalCorrelatedMatrix_h, self._sampling)
+
+		# All limit states are evaluated with all simulations, so the weight
+		#	of each simulation has all variables, or with sampling on more
+		#	than one limit state the weight is from the mixture of them.
+		if self._sampling and len(self.limstates) > 1:
+			varsValues['__joint_all_w__'] = self._MixtureW(varsValues)
+		elif self._sampling:
+			for eachVar in self.variableDistrib:
+				varsValues['__joint_all_w__'] = varsValues['__joint_all_w__'] * varsValues[eachVar.lower()]['weights']
+
+		if self._CEModel is not None:
+			varsValues['__joint_all_w__'] = varsValues['__joint_all_w__']*ceWeights
+
+		# Now for constats variables
+		for eachVar in self.variableConst:
+			eachVar = eachVar.lower()
+			# For each variable has values and weights
+			varsValues[eachVar] = {}
+			varsValues[eachVar]['values'] = np.full(Nsc, self.variableConst[eachVar], dtype=float)
+			varsValues[eachVar]['weights'] = np.ones(Nsc)
+
+		return varsValues
+
+
+	def _CycleEval(self, varsValues, c0, c1):
+		"""
+		Internal function that evaluates the limit states for simulations c0 to
+		c1 of a cycle and returns the partial sums used by Run(). All limit
+		states are evaluated with all simulations.
+
+		Parameters
+		----------
+		varsValues : dictionary of dictionaries, obligatory
+			Values from _CycleValues(), with ANSYS results when it's used.
+
+		c0, c1 : int, obligatory
+			First and last+1 simulations of the cycle.
+
+		Returns
+		-------
+		Dictionary with dictionaries for each limit state:
+			* Nfi and Nfi2 : Sum of failures weights and it's squares;
+			* gS1 and gS2 : Sum of squared limit state values and sum of values;
+			* PW : Sum of the failures weights times values of each variable
+			  with sampling distribution (for adaptive sampling).
+		And for the systems:
+			* sys : Nfi and Nfi2 of 'series' (any limit state fails) and
+			  'parallel' (all limit states fail) systems;
+			* CE : Standard normal values, series system limit state values
+			  (the minimum of limit states) and weights (for cross-entropy).
+		"""
+		part = {}
+		part['Nfi'] = {}
+		part['Nfi2'] = {}
+		part['gS1'] = {}
+		part['gS2'] = {}
+		part['PW'] = {}
+		part['CE'] = []
+		part['sys'] = {}
+
+		# Names and values of all variables used on LS, ANSYS output
+		#	variables are the last ones.
+		lsNames = []
+		lsValues = []
+		for eachVar in self.variableDistrib:
+			eachVar = eachVar.lower()
+			lsNames.append(eachVar)
+			lsValues.append(varsValues[eachVar]['values'])
+
+		for eachVar in self.variableConst:
+			eachVar = eachVar.lower()
+			lsNames.append(eachVar)
+			lsValues.append(varsValues[eachVar]['values'])
+
+		#----------------------------------------------------------
+		# if running ansys:
+		# Attention here: the ANSYS output variables has the weight
+		# of all input variables, so it mustn't be used, if used
+		# some weights will be applyed 2 times!
+		#
+		if self._ANSYS:
+			for eachVar in self.ansys.varOutNames:
+				eachVar = eachVar.lower()
+				lsNames.append(eachVar)
+				lsValues.append(varsValues[eachVar]['values'])
+				# DO NOT REMOVE NEXT COMMENT!
+				##simWei = simWei * varsValues[eachVar]['weights']
+
+		# Weigth of simulations (the joint weight has all variables)
+		simWei = varsValues['__joint_all_w__'].copy()
+
+		# Values of sampling variables (for adaptive sampling)
+		ptValues = {}
+		for eachLS in self.limstates:
+			for eachVar in self.SPForLS[eachLS]['pt']:
+				ptValues[eachVar] = varsValues[eachVar]['values']
+
+		# Standard normal values (for cross-entropy)
+		if '__u__' in varsValues:
+			ceValues = varsValues['__u__']
+
+		# Simulations dropped by ANSYS (with errors) are removed and the
+		#	weights of the others are increased, so the estimator is the
+		#	mean of the valid simulations.
+		if '__valid__' in varsValues:
+			valid = varsValues['__valid__']
+			nvalid = valid.sum()
+			if nvalid == 0:
+				exception = Exception('All the simulations finished with errors on ANSYS.')
+				raise exception
+			lsValues = [each[valid] for each in lsValues]
+			simWei = simWei[valid] * valid.size/nvalid
+			for eachVar in ptValues:
+				ptValues[eachVar] = ptValues[eachVar][valid]
+			if '__u__' in varsValues:
+				ceValues = ceValues[:, valid]
+			gScale = valid.size/nvalid
+		else:
+			gScale = 1
+
+		# Failures of each limit state, for the systems
+		failed = np.zeros([len(self.limstates), len(simWei)], dtype=bool)
+		minG = np.full(len(simWei), np.inf)
+
+		for idx, eachLS in enumerate(self.limstates):
+			# Evaluate all simulations with eachLS equation at once
+			#	(vectorized when it's possible)
+			curSLSvalues = self.limstates[eachLS][4].EvalArray(lsNames, lsValues)
+			failed[idx] = (curSLSvalues <= 0)
+			minG = np.minimum(minG, curSLSvalues)
+
+			# Vectors for store failures weights
+			#	Igw: = 0,	   if not failed
+			#		 = weight, if failed
+			Igw = np.where(failed[idx], simWei, 0)
+
+			# Nf and Nf**2 (weighted)
+			part['Nfi'][eachLS] = Igw.sum()
+			part['Nfi2'][eachLS] = (Igw**2).sum()
+
+			# add curSLSvalues to gS1 and gS2 for mean and std
+			part['gS1'][eachLS] = (curSLSvalues**2).sum() * gScale
+			part['gS2'][eachLS] = curSLSvalues.sum() * gScale
+
+			# For adaptive sampling
+			part['PW'][eachLS] = {}
+			for eachVar in self.SPForLS[eachLS]['pt']:
+				part['PW'][eachLS][eachVar] = (ptValues[eachVar] * Igw).sum()
+
+		# Series and parallel systems with the same simulations
+		for eachSys in ['series', 'parallel']:
+			if eachSys == 'series':
+				Igw = np.where(failed.any(axis=0), simWei, 0)
+			else:
+				Igw = np.where(failed.all(axis=0), simWei, 0)
+			part['sys'][eachSys] = [Igw.sum(), (Igw**2).sum()]
+
+		# For cross-entropy: standard normal values, limit state values
+		#	of series system and weights of all simulations
+		if '__u__' in varsValues:
+			part['CE'] = [ceValues, minG, simWei]
+
+		return part
+
+
+	def _CESample(self, normalValuesMatrix):
+		"""
+		Internal function that transforms uncorrelated standard normal values to
+		the cross-entropy sampling density (a Gaussian mixture in the standard
+		normal space) and returns them with the weights f(u)/h(u).
+
+		Parameters
+		----------
+		normalValuesMatrix : 2D np.array, obligatory
+			Values from _CycleNormals(), the last line is used to choose the
+			component of each simulation.
+		"""
+		[ceW, ceMeans, ceChols] = self._CEModel
+		NInRandVars = ceMeans.shape[1]
+		Z = normalValuesMatrix[:NInRandVars]
+
+		# Component of each simulation
+		choice = scipy.stats.norm.cdf(normalValuesMatrix[NInRandVars])
+		comp = np.minimum(np.searchsorted(np.cumsum(ceW), choice), len(ceW)-1)
+
+		U = np.zeros(Z.shape)
+		for k in range(len(ceW)):
+			cols = (comp == k)
+			U[:, cols] = ceMeans[k][:, None] + ceChols[k].dot(Z[:, cols])
+
+		# log of f(u)/h(u), the constant (2*pi)^(-d/2) is the same for both
+		logh = np.zeros([len(ceW), U.shape[1]])
+		for k in range(len(ceW)):
+			Zk = np.linalg.solve(ceChols[k], U-ceMeans[k][:, None])
+			logh[k] = math.log(ceW[k]) - 0.5*(Zk**2).sum(axis=0) - np.log(np.diag(ceChols[k])).sum()
+		logf = -0.5*(U**2).sum(axis=0)
+
+		return [U, np.exp(logf - scipy.special.logsumexp(logh, axis=0))]
+
+
+	def _CEUpdate(self, U, G, W, elite, components):
+		"""
+		Internal function that fits the cross-entropy sampling density with the
+		elite simulations of a cycle, the ones with limit state values smaller
+		than max(0, elite quantile). Returns the threshold and the maximum change
+		of the means.
+
+		Parameters
+		----------
+		U : 2D np.array, obligatory
+			Uncorrelated standard normal values, one column for each simulation.
+
+		G : 1D np.array, obligatory
+			Limit state values.
+
+		W : 1D np.array, obligatory
+			Weights f(u)/h(u) of simulations.
+
+		elite : float, obligatory
+			Quantile of elite simulations.
+
+		components : int, obligatory
+			Number of components of the Gaussian mixture.
+		"""
+		NInRandVars = U.shape[0]
+		threshold = max(0.0, np.quantile(G, elite))
+		We = np.where(G <= threshold, W, 0.0)
+		if We.sum() <= 0:
+			return [threshold, np.inf]
+		U = U[:, We > 0]
+		We = We[We > 0]/We.sum()
+		[oldW, oldMeans, oldChols] = self._CEModel
+
+		# Start of components: last ones, or for the first fit the elite
+		#	simulations far from each other
+		if len(oldW) == components:
+			ceW = oldW.copy()
+			ceMeans = oldMeans.copy()
+			ceCovs = np.array([each.dot(each.T) for each in oldChols])
+		else:
+			idx = [np.argmax(We)]
+			while len(idx) < min(components, U.shape[1]):
+				dist = np.min([((U-U[:, [each]])**2).sum(axis=0) for each in idx], axis=0)
+				idx.append(np.argmax(dist))
+			ceW = np.full(len(idx), 1/len(idx))
+			ceMeans = U[:, idx].T.copy()
+			ceCovs = np.array([np.eye(NInRandVars)]*len(idx))
+
+		# Weighted EM, for one component it's just the weighted mean and
+		#	covariance
+		for it in range(1 if len(ceW) == 1 else 50):
+			if len(ceW) == 1:
+				resp = np.ones([1, U.shape[1]])
+			else:
+				logp = np.zeros([len(ceW), U.shape[1]])
+				for k in range(len(ceW)):
+					chol = np.linalg.cholesky(ceCovs[k])
+					Zk = np.linalg.solve(chol, U-ceMeans[k][:, None])
+					logp[k] = math.log(ceW[k]) - 0.5*(Zk**2).sum(axis=0) - np.log(np.diag(chol)).sum()
+				resp = np.exp(logp - scipy.special.logsumexp(logp, axis=0))
+
+			Nk = (resp*We).sum(axis=1)
+			keep = Nk > 1E-6
+			resp = resp[keep]
+			Nk = Nk[keep]
+			ceW = Nk/Nk.sum()
+			ceMeans = np.zeros([len(Nk), NInRandVars])
+			ceCovs = np.zeros([len(Nk), NInRandVars, NInRandVars])
+			for k in range(len(Nk)):
+				rw = resp[k]*We/Nk[k]
+				ceMeans[k] = U.dot(rw)
+				D = U - ceMeans[k][:, None]
+				ceCovs[k] = (D*rw).dot(D.T)
+
+		# Variances smaller than 0.5 (on the principal axes) give weights
+		#	f(u)/h(u) with infinite variance, so they are limited to ceFloor
+		for k in range(len(ceW)):
+			[eigval, eigvec] = np.linalg.eigh(ceCovs[k])
+			ceCovs[k] = (eigvec*np.maximum(eigval, self._CEFloor)).dot(eigvec.T)
+
+		ceChols = np.array([np.linalg.cholesky(each) for each in ceCovs])
+
+		# Change of the means
+		if len(ceW) == len(oldW):
+			change = max([np.linalg.norm(ceMeans[k]-oldMeans[k])/max(1.0, np.linalg.norm(ceMeans[k])) for k in range(len(ceW))])
+		else:
+			change = np.inf
+
+		self._CEModel = [ceW, ceMeans, ceChols]
+
+		return [threshold, change]
+
+
+	def _CycleCVPf(self, Nfi, Nsc):
+		"""
+		Internal function that returns the CVPf estimated from the Pf of each
+		cycle, used with samplers where the simulations of a cycle aren't
+		independent, but the cycles are.
+
+		Parameters
+		----------
+		Nfi : list of floats, obligatory
+			Sum of failures weights of each cycle.
+
+		Nsc : int, obligatory
+			Number of simulations of each cycle.
+		"""
+		PfCycles = np.array(Nfi)/Nsc
+		with np.errstate(all='ignore'):
+			return PfCycles.std(ddof=1)/math.sqrt(len(Nfi))/PfCycles.mean()
+
+
+	def _CumPf(self, Nfi, Nfi2, Nsc):
+		"""
+		Internal function that returns [Pf, CVPf] of the cycles used on Pf,
+		for a limit state or a system.
+
+		Parameters
+		----------
+		Nfi, Nfi2 : list of floats, obligatory
+			Sum of failures weights, and of it's squares, of each cycle.
+
+		Nsc : int, obligatory
+			Number of simulations of each cycle.
+		"""
+		ncyc = len(Nfi)
+		sumNfi  = sum(Nfi)
+		sumNfi2 = sum(Nfi2)
+		Pf = sumNfi/(ncyc*Nsc)
+
+		with np.errstate(all='ignore'):
+			if self._sampler != 'random' and ncyc > 1:
+				# Cycles are independent randomizations
+				CVPf = self._CycleCVPf(Nfi, Nsc)
+			else:
+				CVPf = 1/Pf * 1/math.sqrt((ncyc*Nsc)*(ncyc*Nsc-1)) \
+							*(sumNfi2 - 1/(ncyc*Nsc)*(sumNfi)**2)**0.50
+
+		return [Pf, CVPf]
+
+
+	def _CycleChunk(self, cycle, chunk, c0, c1):
+		"""
+		Internal function executed by each worker: generates and evaluates the
+		simulations c0 to c1 of a cycle. Returns the same of _CycleEval().
+		"""
+		normalValuesMatrix = self._CycleNormals(cycle, chunk, c1-c0)
+		varsValues = self._CycleValues(normalValuesMatrix, c0, c1)
+		return self._CycleEval(varsValues, c0, c1)
+
+
+	def _CycleSubmit(self, varsValues, Ns):
+		"""
+		Internal function that sends the values of ANSYS variables to ANSYS
+		and starts it, without waiting.
+
+		Returns a list with the ANSYSSubmission and the joint weights of
+		ANSYS variables.
+		"""
+		# Set weigths as 1 for afeter do the product of all weights of
+		#	ANSYS variables
+		weights = np.ones(Ns)
+
+		# Runs ansys object looking for ANSYS variables
+		for eachVar in self.ansys.varInNames:
+			eachVar = eachVar.lower()
+			# Send value to ansys object
+			self.ansys.SetVarInValues(eachVar, varsValues[eachVar]['values'])
+
+			# Join the weight of variables to weights
+			weights = weights * varsValues[eachVar]['weights']
+
+		# Start ANSYS
+		return [self.ansys.Submit(), weights]
+
+
+	def _CycleResults(self, varsValues, submitted):
+		"""
+		Internal function that waits for ANSYS and puts the results, and
+		weights, of ANSYS output variables on varsValues.
+		"""
+		[submission, weights] = submitted
+
+		# Import results
+		results = submission.Wait()
+
+		# Simulations dropped by the ANSYS error policy are not used
+		if results['ERR'].sum() > 0:
+			varsValues['__valid__'] = (results['ERR'] == 0)
+
+		# Put results and weights on varsValues
+		for eachVar in self.ansys.varOutNames:
+			varsValues[eachVar.lower()] = {}
+			varsValues[eachVar.lower()]['values'] = results[eachVar.upper()]
+			varsValues[eachVar.lower()]['weights'] = weights
+
+
+	def Run(self, Ns, Nmaxcycles, CVPf=0.00, tolAdPt=False, workers=1, seed=None, pipeline=False,
+			sampler='random', adaptive='point', components=1, elite=0.1):
+		"""
+		Run the Monte Carlo simulation.
+
+		Parameters
+		----------
+		Ns : integer, obligatory
+			Number of simulations performed on each cycle.
+			After each cycle the convergence of simualtion is verified.
+			When using Importance Sampling with Adaptive Sampling, after each
+			cycle the new sampling point will be determined.
+
+		Nmaxcycles : integer, obligatory
+			Maximum number of cycles to be performed, if CVPf is not reached on
+			Nmaxcycles the simulation will be interrupted.
+
+		CVPf : float, optional
+			Target value of Probability Failure Coefficient of Variation, when
+			reached the simulation stops.
+
+		tolAdPt : float or False, optional
+			Maximum relative tolerance for adaptive sampling point search.
+			If the value is "False" it disable adaptive sampling, simulations
+			will use always the user set point.
+
+		workers : integer, optional
+			Number of processes used to generate and evaluate the simulations
+			of each cycle, each one receives a part of the cycle. It can't be
+			used with ANSYS.
+
+			On Windows the script that calls Run() with workers must be
+			protected by ``if __name__ == '__main__':``, and functions used
+			on limit states must be defined at module level.
+
+			Defaults to 1.
+
+		seed : integer, optional
+			Seed of random values. Each part of each cycle has its own
+			numpy.random.Generator spawned from a numpy.random.SeedSequence,
+			so results are the same for the same seed and number of workers.
+
+			If it's not defined and workers is 1 the global np.random is used.
+
+		pipeline : bool, optional
+			Overlaps the cycles when ANSYS is used: while ANSYS solves a cycle
+			the simulations of the next one are generated, and ANSYS starts
+			the next cycle before the results of the current one are evaluated.
+			If the convergence is reached the solution of the next cycle is
+			cancelled. Results are the same without pipeline.
+
+			With adaptive sampling the pipeline starts after the sampling
+			point search converges, since the next cycle depends on it.
+
+			Defaults to False.
+
+		sampler : str, optional
+			Sampler of the standard normal values, that are transformed by
+			the correlation and the distributions of variables (or the
+			sampling distributions) in the same way for all samplers:
+
+				* random: pseudo-random values.
+
+				* lhs: Latin Hypercube sampling, randomized.
+
+				* sobol: scrambled Sobol sequence, Ns should be a power of 2.
+
+				* halton: scrambled Halton sequence.
+
+			Each cycle is an independent randomization of Ns simulations, with
+			lhs, sobol and halton the simulations of a cycle aren't independent,
+			so from the second cycle the CVPf is estimated from the Pf of each
+			cycle. On smooth problems these samplers need less simulations for
+			the same CVPf, so it's better to use less simulations per cycle.
+
+			Defaults to random.
+
+		adaptive : str, optional
+			Adaptive sampling method, used when tolAdPt isn't False:
+
+				* point: the mean of sampling distributions (SetRandomVarSampl)
+				  is moved to the weighted mean of failures of all cycles.
+
+				* CE: cross-entropy, the sampling density is a Gaussian (or a
+				  mixture of Gaussians) in the standard normal space, with mean
+				  and covariance fitted with the elite simulations of each
+				  cycle, that are the ones with limit state values smaller than
+				  max(0, elite quantile). It doesn't need sampling distributions
+				  and with more than one component it can find many failure
+				  modes. The search stops when the threshold is 0 and the means
+				  change less than tolAdPt.
+
+			Defaults to point.
+
+		components : int, optional
+			Number of components of the Gaussian mixture of adaptive='CE'.
+			Defaults to 1.
+
+		elite : float, optional
+			Quantile of elite simulations of adaptive='CE'. Defaults to 0.1.
+
+		**Returns a dictionary with:**
+
+			* stnumb : integer
+			  Status of solution, values can be found after this list.
+
+			* Pf : float
+			  Probability of failure. With more than one limit state it's
+			  the series system, when any limit state fails.
+
+			* Beta : float
+			  Reliability index.
+
+			* CVPf : float
+			  Coefficient of Variation of Probability of failure
+
+			* {LimStates} : dictionary of dictionaries
+			  Pf, Beta and CVPf of each limit state, from the same
+			  simulations. (LimStates[eachLS]['Pf'])
+
+			* {Parallel} : dictionary
+			  Pf, Beta and CVPf of the parallel system, when all limit states
+			  fail.
+
+			* {SamplingPoints} : dictionary of dictionaries
+			  Dictionary with sampling points used, or founded in case of
+			  adaptive sampling, for each Variable on each Limit State.
+			  (SamplingPoints[eachLS][eachVar])
+
+			* cycles : int
+			  Number of cycles performed to obtain the solution.
+
+			* distparms : dictionary of dictionaries
+			  Return mean (gMean) and standart deviation (gStd) of each limit state function.  
+
+			* {CEModel} : dictionary
+			  Just with adaptive='CE', weights, means and covariances of the
+			  components of the sampling density, in the standard normal space.
+
+
+		**Status values:**
+
+		* 0: no problem;
+		* 1: warning, maximum of cycles reached with no convergence of CVPf;
+		* 99: undefined error!
+
+		"""
+		#-----------------------------------------------------------------------
+		# Set the controls
+
+		self._SetControls(Ns=Ns, Nmaxcycles=Nmaxcycles, CVPf=CVPf, tolAdPt=tolAdPt)
+
+		#if self.controls == {}:
+		#	exception = Exception('Before Run the Monte Carlo simulation you '+
+		#						  'must define the controls of simulation '+
+		#						  'process with SetControls().')
+		#	raise exception
+
+		# Workers
+		if type(workers) != int or workers < 1:
+			exception = Exception('The number of workers must be an integer greater than 0.')
+			raise exception
+
+		if workers > 1 and self._ANSYS:
+			exception = Exception('Workers can not be used with ANSYS, use the nproc option of ANSYS(...).')
+			raise exception
+
+		if workers > Ns:
+			workers = Ns
+
+		if pipeline and not self._ANSYS:
+			self._PrintR('Pipeline is used just with ANSYS, it will be ignored.')
+			pipeline = False
+
+		# Sampler
+		if sampler not in ['random', 'lhs', 'sobol', 'halton']:
+			exception = Exception('Invalid sampler \"%s\", it must be \'random\', \'lhs\', \'sobol\' or \'halton\'.' % sampler)
+			raise exception
+		self._sampler = sampler
+		self.controls['sampler'] = sampler
+		if sampler == 'sobol' and (Ns & (Ns-1)) != 0:
+			self._PrintR('Sobol sequence works better when Ns is a power of 2.')
+
+		# Adaptive condition
+		if tolAdPt != False:
+			adapt = True
+		else:
+			adapt = False
+
+		if adaptive not in ['point', 'CE']:
+			exception = Exception('Invalid adaptive method \"%s\", it must be \'point\' or \'CE\'.' % adaptive)
+			raise exception
+
+		if adaptive == 'CE':
+			if tolAdPt == False:
+				exception = Exception('Cross-entropy adaptive sampling needs the tolerance tolAdPt.')
+				raise exception
+			if type(components) != int or components < 1:
+				exception = Exception('The number of components must be an integer greater than 0.')
+				raise exception
+			if elite <= 0 or elite >= 1:
+				exception = Exception('The elite quantile must be betwen 0 and 1.')
+				raise exception
+			for eachLS in self.samplingDistrib:
+				if self.samplingDistrib[eachLS] != {}:
+					exception = Exception('Cross-entropy adaptive sampling doesn\'t use sampling distributions from SetRandomVarSampl().')
+					raise exception
+		self.controls['adaptive'] = adaptive
 
 		# Time in the beggining
 		timei = time.time()
@@ -1092,6 +2109,15 @@ class MonteCarlo(object):
 		self.MCControl['Beta'] = []
 		# CV of cumulative Pf for each cycle (Pf)
 		self.MCControl['CVPf'] = []
+
+		# The same for the parallel system, the general one is the series
+		#	system
+		self.MCControl_Par = {}
+		self.MCControl_Par['Nfi'] = []
+		self.MCControl_Par['Nfi2'] = []
+		self.MCControl_Par['Pf'] = []
+		self.MCControl_Par['Beta'] = []
+		self.MCControl_Par['CVPf'] = []
 		#-----------------------------------------------------------------------
 
 
@@ -1159,92 +2185,69 @@ class MonteCarlo(object):
 
 		#-----------------------------------------------------------------------
 		# Equivalent Correlation matrix 
-		
-		# Create var id list
-		varId = {}
-		idx = 0
-		# For random variables
-		for eachVar in self.variableDistrib:
-			varId[eachVar] = idx
-			idx += 1
-
-		for eachVar in self.variableConst:
-			varId[eachVar] = idx
-			idx += 1
-
-		self.varId = varId
-
-		# Initial correlation Matrix
-		self.correlMat = np.eye(NInRandVars)
-
-		for each in self.corlist:
-			i = varId[each[0]]
-			j = varId[each[1]]
-			cor = self.corlist[each]
-
-			# Apply Nataf to transform the correlation
-			var1props = self.variableDistrib[each[0]]
-			var2props = self.variableDistrib[each[1]]
+		self._SetCorrelMat()
 
-			# Both are gauss
-			if (var1props[0] == 'gauss' and var2props[0] == 'gauss'):
-				cor = cor
-
-			# Both are LN
-			elif var1props[0] == 'logn' and var2props[0] == 'logn':
-				cv1 = var1props[3]
-				cv2 = var2props[3]
-				cor = cor*(math.log(1+cor*cv1*cv2) /
-				           (cor*math.sqrt(math.log(1+cv1**2)*math.log(1+cv2**2))))
+		# Lower Cholesky matrix
+		matL = np.linalg.cholesky(self.correlMat)
+		matCorInv = np.linalg.inv(self.correlMat)
 
-			# Both are Gumbel
-			elif var1props[0] == 'gumbel' and var2props[0] == 'gumbel':
-				cor = cor*(1.064 - 0.069*cor + 0.005*cor**2)
+		# Sampling distributions are being used?
+		sampling = False
+		for eachLS in self.limstates:
+			if self.SPForLS[eachLS]['pt'] != {}:
+				sampling = True
 
-			# One is gauss and other is logn
-			elif (var1props[0] == 'gauss' and var2props[0] == 'logn') \
-				or (var2props[0] == 'gauss' and var1props[0] == 'logn'):
+		#-----------------------------------------------------------------------
 
-				# who is logn?
-				if var1props[0] == 'logn':
-					cv = var1props[3]
-				else:
-					cv = var2props[3]
 
-				# cor is
-				cor = cor*cv/math.sqrt(math.log(1+cv**2))
 
-			# One is gauss and other is gumbel
-			elif (var1props[0] == 'gauss' and var2props[0] == 'gumbel') \
-				or (var2props[0] == 'gauss' and var1props[0] == 'gumbel'):
-				cor = 1.031*cor
+		#-----------------------------------------------------------------------
+		# Save what is needed to generate and evaluate the simulations in
+		#	internal functions (they are also used by the workers)
+		self._matL = matL
+		self._matCorInv = matCorInv
+		self._sampling = sampling
+		self._NInRandVars = NInRandVars
+
+		# Cross-entropy starts with the standard normal density, and it needs
+		#	one more line of normal values to choose the components
+		if adaptive == 'CE':
+			self._CEModel = [np.ones(1), np.zeros([1, NInRandVars]), np.array([np.eye(NInRandVars)])]
+			self._NNormals = NInRandVars + 1
+		else:
+			self._CEModel = None
+			self._NNormals = NInRandVars
 
-			# One is logn and other is gumbel
-			elif (var1props[0] == 'logn' and var2props[0] == 'gumbel') \
-				or (var2props[0] == 'logn' and var1props[0] == 'gumbel'):
-				# who is logn?
-				if var1props[0] == 'logn':
-					cv = var1props[3]
-				else:
-					cv = var2props[3]
+		# Range of simulations of each limit state on each cycle
+		self._LSRange = {}
+		posi = 0
+		for eachLS in self.limstates:
+			posf = posi + self.limstates[eachLS][3]
+			self._LSRange[eachLS] = [posi, posf]
+			posi = posf
 
-				# cor is
-				cor = cor*(1.029 + 0.001*cor + 0.014*cv + 0.004*cor**2 + 0.233*cv**2 - 0.197*cor*cv)
+		# Random streams, without seed and workers the global np.random is used
+		if seed == None and workers == 1:
+			self._entropy = None
+		else:
+			self._entropy = np.random.SeedSequence(seed).entropy
 
-			# Forbiden zone
-			else:
-				exception = Exception('When applying NATAF on variables \"%s\" and \"%s\" the variables ' +
-                                    'conditions wasn\'t possible.')
-				raise exception
+		# Simulations of each worker
+		chunks = np.linspace(0, Ns, workers+1).round().astype(int)
 
-			# Save it!
-			self.correlMat[i, j] = cor
-			self.correlMat[j, i] = cor
+		# Next cycle, generated and submitted to ANSYS in the pipeline
+		nextCycle = None
 
-		# Lower Cholesky matrix
-		matL = np.linalg.cholesky(self.correlMat)
-		matCorInv = np.linalg.inv(self.correlMat)
+		# First cycle used on Pf, with cross-entropy the cycles before the
+		#	sampling density reaches the failure domain aren't used
+		cycFirst = 0
 
+		# Process pool
+		if workers > 1:
+			self._PrintR('Starting %d workers.' % workers)
+			pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+		else:
+			pool = None
 		#-----------------------------------------------------------------------
 
 
@@ -1254,375 +2257,256 @@ class MonteCarlo(object):
 		# 	Cycle loop's
 		#
 		#
-		for cycle in range(1, 1+self.controls['Nmaxcycles']):
-			# 1+Ncycle because Python counts from 0
-
-			#-------------------------------------------------------------------
-			# Beggining of cycle
-			#
-			self._PrintR('\n---\nSimulation cycle %d of %d(cycle limit).'
-						 % (cycle, self.controls['Nmaxcycles']))
-			#-------------------------------------------------------------------
-
-			#-------------------------------------------------------------------
-			# Generate Random values
-			#
-
-			# Store variables Values and Weights
-			#	(dictionary of dictionaries)
-			varsValues = {}
-
-			# Generate random normal matrix with all values
-			normalValuesMatrix = np.random.normal(0.0, 1.0, (NInRandVars, Nsi))
-			# Apply correlation with x_c=L.x
-			normalCorrelatedMatrix_h = matL.dot(normalValuesMatrix)
-			normalCorrelatedMatrix_f = normalCorrelatedMatrix_h.copy()
-
-			# Run for each variable each limit state, of limit state get limit
-			# 	state size (Ns), if there is SamplDistrb generate Ns from
-			#	sampling, else generate from RandomDistrib.
-			for eachVar in self.variableDistrib:
-				eachVar = eachVar.lower()
-				# For each variable has values and weights
-				varsValues[eachVar] = {}
-				# All values as 0 in the beggining
-				varsValues[eachVar]['values'] = np.zeros(Ns)
-				# All weights are 1 in the beggining
-				varsValues[eachVar]['weights'] = 1+np.zeros(Ns)
-
-				# Initial position on values array (of limit state values)
-				posi = 0
-				# Final position on values array (of limit state values)
-				posf = 0
-
-				for eachLS in self.limstates:
-					# Get posf
-					Nsi = self.limstates[eachLS][3]
-					posf = posi + Nsi
-
-					# Get True Random Distribution
-					varDistrib = self.variableDistrib[eachVar]
+		try:
+			for cycle in range(1, 1+self.controls['Nmaxcycles']):
+				# 1+Ncycle because Python counts from 0
+
+				#-------------------------------------------------------------------
+				# Beggining of cycle
+				#
+				self._PrintR('\n---\nSimulation cycle %d of %d(cycle limit).'
+							 % (cycle, self.controls['Nmaxcycles']))
+				#-------------------------------------------------------------------
+
+				#-------------------------------------------------------------------
+				# Using workers each one generates and evaluates its part of
+				#	simulations
+				#
+				if workers > 1:
+					self._PrintR('Generating and evaluating simulations on workers.')
+					futures = []
+					for chunk in range(workers):
+						futures.append(pool.submit(self._CycleChunk, cycle, chunk, chunks[chunk], chunks[chunk+1]))
+
+					# Results are always merged in the same order
+					parts = [each.result() for each in futures]
 
-					# Verify the existence of SamplingDistrib/SPForLS, if exists get it
-					if eachVar in self.SPForLS[eachLS]['pt']:
-						# Have sampling distribution
-						sampDist = self.SPForLS[eachLS]['pt'][eachVar]
+				else:
+					#---------------------------------------------------------------
+					# Generate Random values, or get the ones generated (and
+					#	sent to ANSYS) in last cycle with pipeline
+					#
+					if nextCycle is not None:
+						[varsValues, submitted] = nextCycle
+						nextCycle = None
 					else:
-						# Have no sampling distribution
-						sampDist = False
-
-
-					# Call _GenRandomVW to get values and weights
-					[varsValues[eachVar]['values'][posi:posf], varsValues[eachVar]['weights'][posi:posf], \
-						normalCorrelatedMatrix_f[varId[eachVar], posi:posf]] = \
-						self._GenRandomVW(varDistrib, sampDist, normalCorrelatedMatrix_h[varId[eachVar], posi:posf])
-
-					# Set posf as next posi
-					posi = posf
-
-			# Joint distributions weights
-			varsValues['__joint_all_w__'] = 1+np.zeros(Ns)
-			# Ratio of joint normal distributions (fX/hX) for Nataf process - if not using importance sampling it will be 1 !
-			for each in range(Ns):
-				# matCorInv
-				Z_f = normalCorrelatedMatrix_f[:, each]
-				Z_h = normalCorrelatedMatrix_h[:, each]
-				varsValues['__joint_all_w__'][each] = math.exp(-1/2*(Z_f.T).dot(matCorInv.dot(Z_f))+1/2*(Z_h.T).dot(matCorInv.dot(Z_h)))
-
-			# Now for constats variables
-			for eachVar in self.variableConst:
-				eachVar = eachVar.lower()
-				# For each variable has values and weights
-				varsValues[eachVar] = {}
-				# All values as 0 in the beggining
-				varsValues[eachVar]['values'] = Ns*[self.variableConst[eachVar]]
-				varsValues[eachVar]['weights'] = Ns*[1]
-			#-------------------------------------------------------------------
-
-
-			#-------------------------------------------------------------------
-			# If ANSYS is being used:
-			#	Set variables values;
-			#	Run ANSYS;
-			#	Import results;
-			#	Put results on varsValues
-			#
-			if self._ANSYS:
-				# Initialize results dic.
-				ansysRes = {}
-
-				# Set weigths as 1 for afeter do the product of all weights of
-				#	ANSYS variables
-				ansysRes['weights'] = np.zeros(Ns)
-				ansysRes['weights'][:] = 1
-
-				# Runs ansys object looking for ANSYS variables
-				for eachVar in self.ansys.varInNames:
-					eachVar = eachVar.lower()
-					# Send value to ansys object
-					self.ansys.SetVarInValues(eachVar, varsValues[eachVar]['values'])
-
-					# Join the weight of variables to ansysRes['weights']
-					ansysRes['weights'] = ansysRes['weights'] * varsValues[eachVar]['weights']
-
-				# Run ANSYS
-				self.ansys.Run()
-
-				# Import results
-				ansysRes['values'] = self.ansys.GetVarOutValues()
-
-				# Put results and weights on varsValues
-				for eachVar in self.ansys.varOutNames:
-					#eachVar = eachVar.lower()
-					varsValues[eachVar.lower()] = {}
-					varsValues[eachVar.lower()]['values'] = ansysRes['values'][eachVar.upper()]
-					varsValues[eachVar.lower()]['weights'] = ansysRes['weights']
-
-			#-------------------------------------------------------------------
-			#print('ansysRes:')
-			#print(ansysRes)
-			#print('*varsValues:')
-			#print(varsValues)
-
-
+						normalValuesMatrix = self._CycleNormals(cycle, 0, Ns)
+						varsValues = self._CycleValues(normalValuesMatrix, 0, Ns)
+						submitted = None
+					#---------------------------------------------------------------
+
+
+					#---------------------------------------------------------------
+					# If ANSYS is being used:
+					#	Set variables values and start ANSYS;
+					#	Generate the next cycle while ANSYS runs (pipeline);
+					#	Import results and put them on varsValues;
+					#	Start ANSYS with the next cycle, it runs while this
+					#	cycle is evaluated.
+					#
+					if self._ANSYS:
+						if submitted is None:
+							submitted = self._CycleSubmit(varsValues, Ns)
 
-			#-------------------------------------------------------------------
-			# Eval each Limit State function
-			#
+						if pipeline and not adapt and cycle < self.controls['Nmaxcycles']:
+							self._PrintR('Generating simulations of cycle %d while ANSYS runs.' % (cycle+1))
+							normalValuesMatrix = self._CycleNormals(cycle+1, 0, Ns)
+							nextValues = self._CycleValues(normalValuesMatrix, 0, Ns)
+						else:
+							nextValues = None
 
-			self._PrintR('Evaluating limit state functions.')
+						self._CycleResults(varsValues, submitted)
 
-			# Run all the limit states list (self.limstates[act] = [equat, weight, [], 0])
-			#	Store positions of eachLS
-			posi = 0
-			posf = 0
+						if nextValues is not None:
+							self._PrintR('Starting ANSYS with the simulations of cycle %d.' % (cycle+1))
+							nextCycle = [nextValues, self._CycleSubmit(nextValues, Ns)]
 
-			# Vectors for store failures weights
-			#	Igw: = 0,	   if not failed
-			#		 = weight, if failed
-			Igw = np.zeros(Ns)
+					#---------------------------------------------------------------
 
 
-			for eachLS in self.limstates:
-				# Get range of LS
-				Nsi = self.limstates[eachLS][3]
-				posf = posi + Nsi
-
-				# For eachLS run eachSim(ulation) and evaluate equat from LS
-				for eachSim in range(posi, posf):
-					# Dictionary of values in this simulation and LS (used on eval)
-					varVal = {}
-
-					# Weigth of simulation (starts as 1)
-					#simWei = 1.00
-					simWei = varsValues['__joint_all_w__'][eachSim]
-
-					# Run all variables from variableDistrib, if it has SamplingDistirb
-					#	it will be erased in next step...
-					for eachVar in self.variableDistrib:
-						eachVar = eachVar.lower()
-						varVal[eachVar] = varsValues[eachVar]['values'][eachSim]
-
-					# Run all variables from ANSYSOut and SamplingDistirbs
-						# Run eachVar of eachLS in eachSim getting value and weight
-						#for eachVar in self.limstates[eachLS][2]:
-					for eachVar in self.samplingDistrib[eachLS]:
-						eachVar = eachVar.lower()
-						varVal[eachVar] = varsValues[eachVar]['values'][eachSim]
-						simWei = simWei * varsValues[eachVar]['weights'][eachSim]
-
-
-					for eachVar in self.variableConst:
-						eachVar = eachVar.lower()
-						varVal[eachVar] = varsValues[eachVar]['values'][eachSim]
-
-					#----------------------------------------------------------
-					# if running ansys:
-					# Attention here: the ANSYS output variables has the weight
-					# of all input variables, so it mustn't be used, if used
-					# some weights will be applyed 2 times!
+					#---------------------------------------------------------------
+					# Eval each Limit State function
 					#
-					if self._ANSYS:
-						for eachVar in self.ansys.varOutNames:
-							eachVar = eachVar.lower()
-							varVal[eachVar] = varsValues[eachVar]['values'][eachSim]
-							# DO NOT REMOVE NEXT COMMENT!
-							##simWei = simWei * varsValues[eachVar]['weights'][eachSim]
-
-					# Evaluate each simulation with its LS equation
-						#Igw[eachSim] = eval(self.limstates[eachLS][0], globals(), varVal)
-					# Old solution:
-					#curSLSvalue = eval(self.limstates[eachLS][0], globals(), varVal)
-
-					# Test if limstate is a string or a function
-					if(type(self.limstates[eachLS][0]) == str):
-						varVal['userf'] = self.limstates[eachLS][2]
-						curSLSvalue = eval(self.limstates[eachLS][0], globals(), varVal)
-					else:
-						curSLSvalue = self.limstates[eachLS][0](**varVal)
-
-					# Count failures
-					if curSLSvalue <= 0:
-						Igw[eachSim] = simWei
-					else:
-						Igw[eachSim] = 0
+					self._PrintR('Evaluating limit state functions.')
+					parts = [self._CycleEval(varsValues, 0, Ns)]
+				#-------------------------------------------------------------------
 
-					# add curSLSvalue to gS1 and gS2 for mean and std
-					gS1[eachLS] += curSLSvalue**2
-					gS2[eachLS] += curSLSvalue
 
-				# Determine current mean and std.dev for LS
-				self.MCControl_LS['gMean'][eachLS].append(gS2[eachLS]/(Nsi*cycle))
-				self.MCControl_LS['gStd'][eachLS].append(math.sqrt((Nsi*cycle*gS1[eachLS]-gS2[eachLS]**2)/(Nsi*cycle*(Nsi*cycle-1))))
+				#-------------------------------------------------------------------
+				# Merge the results from each part for each limit state
+				#
+				# Cycles used on Pf
+				ncyc = cycle - cycFirst
 
-				# Convergence for each Limit State
+				cycPW = {}
+				for eachLS in self.limstates:
+					csIgw = 0
+					csIgw2 = 0
+					cycPW[eachLS] = {}
+					for eachVar in self.SPForLS[eachLS]['pt']:
+						cycPW[eachLS][eachVar] = 0
+
+					for part in parts:
+						csIgw += part['Nfi'][eachLS]
+						csIgw2 += part['Nfi2'][eachLS]
+						gS1[eachLS] += part['gS1'][eachLS]
+						gS2[eachLS] += part['gS2'][eachLS]
+						for eachVar in cycPW[eachLS]:
+							cycPW[eachLS][eachVar] += part['PW'][eachLS][eachVar]
+
+					# Determine current mean and std.dev for LS
+					self.MCControl_LS['gMean'][eachLS].append(gS2[eachLS]/(Ns*cycle))
+					self.MCControl_LS['gStd'][eachLS].append(math.sqrt((Ns*cycle*gS1[eachLS]-gS2[eachLS]**2)/(Ns*cycle*(Ns*cycle-1))))
+
+					# Convergence for each Limit State, all limit states are
+					#	evaluated with all simulations
+					# Nf and Nf**2 (weighted)
+					self.MCControl_LS['Nfi'][eachLS].append(csIgw)
+					self.MCControl_LS['Nfi2'][eachLS].append(csIgw2)
+
+					# Current Pf and CVPf of limit state
+					[cPfi, cCVPf] = self._CumPf(self.MCControl_LS['Nfi'][eachLS][cycFirst:],
+												self.MCControl_LS['Nfi2'][eachLS][cycFirst:], Ns)
+					self.MCControl_LS['Pf'][eachLS].append(cPfi)
+					self.MCControl_LS['CVPf'][eachLS].append(cCVPf)
+
+					#self._PrintR('**Pf=%3.8E; CVPf=%f\n' % (cPfi, cCVPf))
+
+				# Parallel system (all limit states fail)
+				self.MCControl_Par['Nfi'].append(sum([part['sys']['parallel'][0] for part in parts]))
+				self.MCControl_Par['Nfi2'].append(sum([part['sys']['parallel'][1] for part in parts]))
+				[cPfi, cCVPf] = self._CumPf(self.MCControl_Par['Nfi'][cycFirst:], self.MCControl_Par['Nfi2'][cycFirst:], Ns)
+				self.MCControl_Par['Pf'].append(cPfi)
+				self.MCControl_Par['Beta'].append(-scipy.stats.norm.ppf(cPfi))
+				self.MCControl_Par['CVPf'].append(cCVPf)
+
+				# Convergence for entire simulation, it's the series system
+				#	(any limit state fails)
 				# Nf and Nf**2 (weighted)
-				csIgw = sum(Igw[posi:posf])
-				self.MCControl_LS['Nfi'][eachLS].append(csIgw)
-
-				csIgw2 = sum(Igw[posi:posf]**2)
-				self.MCControl_LS['Nfi2'][eachLS].append(csIgw2)
-
-				# Current Pf of limit state
-				cPfi = sum(self.MCControl_LS['Nfi'][eachLS])/(cycle*Nsi)
-				self.MCControl_LS['Pf'][eachLS].append(cPfi)
-
-				# Current CVPf of Limit state
-				sumNfi  = sum(self.MCControl_LS['Nfi'][eachLS])
-				sumNfi2 = sum(self.MCControl_LS['Nfi2'][eachLS])
-				cCVPf = 1/cPfi * 1/math.sqrt((cycle*Nsi)*(cycle*Nsi-1)) \
-							 *(sumNfi2 - 1/(cycle*Nsi)*(sumNfi)**2)**0.50
-				self.MCControl_LS['CVPf'][eachLS].append(cCVPf)
+				self.MCControl['Nfi'].append(sum([part['sys']['series'][0] for part in parts]))
+				self.MCControl['Nfi2'].append(sum([part['sys']['series'][1] for part in parts]))
+
+				# Current Pf and CVPf
+				[cPfi, cCVPf] = self._CumPf(self.MCControl['Nfi'][cycFirst:], self.MCControl['Nfi2'][cycFirst:], Ns)
+				self.MCControl['Pf'].append(cPfi)
+
+				# Current Beta
+				self.MCControl['Beta'].append(-scipy.stats.norm.ppf(cPfi))
+				self.MCControl['CVPf'].append(cCVPf)
+
+				# Print main results
+				self._PrintR('\nSolution on Cycle %d with %3.3E simulations:' % (cycle, cycle*Ns))
+				self._PrintR('Pf=%2.4E \nBeta=%2.3f \nCVPf=%2.3f \n' % (cPfi, -scipy.stats.norm.ppf(cPfi), cCVPf))
+				
+				# Print limit states mean and std dev
+				self._PrintR('Limit states means and standard deviations:')
+				for eachLS in self.limstates:
+					self._PrintR('  Limit state %d: mean=%.4E, std.dev.=%.4E.' % (eachLS, self.MCControl_LS['gMean'][eachLS][-1], self.MCControl_LS['gStd'][eachLS][-1]))
+
+				# Print each limit state and the parallel system
+				if len(self.limstates) > 1:
+					self._PrintR('Limit states and systems:')
+					for eachLS in self.limstates:
+						self._PrintR('  Limit state %d: Pf=%2.4E, CVPf=%2.3f.' % (eachLS, self.MCControl_LS['Pf'][eachLS][-1], self.MCControl_LS['CVPf'][eachLS][-1]))
+					self._PrintR('  Series system: Pf=%2.4E, CVPf=%2.3f.' % (self.MCControl['Pf'][-1], self.MCControl['CVPf'][-1]))
+					self._PrintR('  Parallel system: Pf=%2.4E, CVPf=%2.3f.' % (self.MCControl_Par['Pf'][-1], self.MCControl_Par['CVPf'][-1]))
+
+				# Verify the convergence criteria for CVPf after 3rd cycle
+				# Avoid CVPf < 1E-5!
+				if cCVPf <= self.controls['CVPf'] and cycle > 3 and cCVPf > 1E-5:
+					self._PrintR('CVPf convergence criteria reached on cycle %d with %3.3E simulations.' % (cycle, cycle*Ns))
+					self._PrintR('Finalizing process.')
+					# Set status as 0 (no problem)
+					stnumb = 0
+					break
 
-				#self._PrintR('**Pf=%3.8E; CVPf=%f\n' % (cPfi, cCVPf))
 
-				# Set next LS range
-				posi = posf
+				#-------------------------------------------------------------------
 
-			# Convergence for entire simulation
-			# Nf and Nf**2 (weighted)
-			csIgw = sum(Igw)
-			self.MCControl['Nfi'].append(csIgw)
-
-			csIgw2 = sum(Igw**2)
-			self.MCControl['Nfi2'].append(csIgw2)
-
-			# Current Pf of limit state
-			cPfi = sum(self.MCControl['Nfi'])/(cycle*Ns)
-			self.MCControl['Pf'].append(cPfi)
-
-			# Current Beta
-			self.MCControl['Beta'].append(-scipy.stats.norm.ppf(cPfi))
-
-			# Current CVPf of Limit state
-			sumNfi  = sum(self.MCControl['Nfi'])
-			sumNfi2 = sum(self.MCControl['Nfi2'])
-			cCVPf = 1/cPfi * 1/math.sqrt((cycle*Ns)*(cycle*Ns-1)) \
-							*(sumNfi2 - 1/(cycle*Ns)*(sumNfi)**2)**0.50
-			self.MCControl['CVPf'].append(cCVPf)
-
-			########################################
-			# It was used for debug/control
-			#print('varsValues:')
-			#print(varsValues)
-			#print('Igw:')
-			#print(Igw)
-			#print('csIgw:')
-			#print(csIgw)
-			#print('csIgw2:')
-			#print(csIgw2)
-			#print('cPfi:')
-			#print(cPfi)
-			#print('cCVPf:')
-			#print(cCVPf)
-			#print('---------------')
-
-			# Print main results
-			self._PrintR('\nSolution on Cycle %d with %3.3E simulations:' % (cycle, cycle*Ns))
-			self._PrintR('Pf=%2.4E \nBeta=%2.3f \nCVPf=%2.3f \n' % (cPfi, -scipy.stats.norm.ppf(cPfi), cCVPf))
-			
-			# Print limit states mean and std dev
-			self._PrintR('Limit states means and standard deviations:')
-			for eachLS in self.limstates:
-				self._PrintR('  Limit state %d: mean=%.4E, std.dev.=%.4E.' % (eachLS, self.MCControl_LS['gMean'][eachLS][-1], self.MCControl_LS['gStd'][eachLS][-1]))
 
-			# Verify the convergence criteria for CVPf after 3rd cycle
-			# Avoid CVPf < 1E-5!
-			if cCVPf <= self.controls['CVPf'] and cycle > 3 and cCVPf > 1E-5:
-				self._PrintR('CVPf convergence criteria reached on cycle %d with %3.3E simulations.' % (cycle, cycle*Ns))
-				self._PrintR('Finalizing process.')
-				# Set status as 0 (no problem)
-				stnumb = 0
-				break
 
+				#-------------------------------------------------------------------
+				#	Find new design point
+				#
 
-			#-------------------------------------------------------------------
+				if adapt == True and adaptive == 'CE':
+					self._PrintR('Fitting cross-entropy sampling density.')
+					ceU = np.concatenate([part['CE'][0] for part in parts], axis=1)
+					ceG = np.concatenate([part['CE'][1] for part in parts])
+					ceWei = np.concatenate([part['CE'][2] for part in parts])
 
+					[threshold, maxrelerror] = self._CEUpdate(ceU, ceG, ceWei, elite, components)
 
+					self._PrintR('Elite threshold of limit states (series system) = %f.' % threshold)
+					if threshold <= 0 and cycFirst == 0 and cycle < self.controls['Nmaxcycles']:
+						cycFirst = cycle
+						self._PrintR('Sampling density reached the failure domain, Pf will be evaluated from cycle %d.' % (cycle+1))
+					for k in range(len(self._CEModel[0])):
+						# Mean of component in X
+						ceY = self._matL.dot(self._CEModel[1][k])
+						cePt = ['%s=%3.5E' % (eachVar, self._GenRandomVW(self.variableDistrib[eachVar], False, ceY[[self.varId[eachVar]]])[0][0])
+								for eachVar in self.variableDistrib]
+						self._PrintR(' Component %d (weight %f): %s' % (k, self._CEModel[0][k], ', '.join(cePt)))
 
-			#-------------------------------------------------------------------
-			#	Find new design point
-			#
+					self._PrintR('Max. relative change of means is %f.' % maxrelerror)
+					if threshold <= 0 and maxrelerror <= self.controls['tolAdPt'] and cycle > 3:
+						self._PrintR('Cross-entropy sampling density converged on cycle %d.' % cycle)
+						adapt = False
 
-			if adapt == True:
-				self._PrintR('Evaluating new design point.')
-				# Initial Igw position
-				posi = 0
+				elif adapt == True:
+					self._PrintR('Evaluating new design point.')
 
-				# Initial max relative error is 0, in the end will have the max
-				#	value from adaption
-				maxrelerror = 0
+					# Initial max relative error is 0, in the end will have the max
+					#	value from adaption
+					maxrelerror = 0
 
-				# eachLS has its sampling distrib
-				for eachLS in self.limstates:
-					# Get range of LS
-					Nsi = self.limstates[eachLS][3]
-					# Final Igw position of LS
-					posf = posi + Nsi
+					# eachLS has its sampling distrib
+					for eachLS in self.limstates:
+						# Old and Current simualtions weights
+						oldW = self.SPForLS[eachLS]['W']
+						curW = self.MCControl_LS['Nfi'][eachLS][-1]
 
-					# Copy of current sample variables (that will be the old sampling)
-					#oldSamp = {}
-					#oldSamp = self.SPForLS[eachLS]['pt']
+						# Calibrate one-by-one each variable of each LS
+						self._PrintR('New design point for Limit State %d:' % eachLS)
+						for eachVar in self.SPForLS[eachLS]['pt']:
+							# Old and Current simulations point coord * simulations weights
+							oldPW = (self.SPForLS[eachLS]['pt'][eachVar][1] * self.SPForLS[eachLS]['W'])
+							curPW = cycPW[eachLS][eachVar]
 
-					# Old and Current simualtions weights
-					oldW = self.SPForLS[eachLS]['W']
-					curW = sum(Igw[posi:posf])
+							# New point
+							NP = (oldPW+curPW)/(oldW+curW)
 
-					# Calibrate one-by-one each variable of each LS
-					self._PrintR('New design point for Limit State %d:' % eachLS)
-					for eachVar in self.SPForLS[eachLS]['pt']:
-						# Old and Current simulations point coord * simulations weights
-						oldPW = (self.SPForLS[eachLS]['pt'][eachVar][1] * self.SPForLS[eachLS]['W'])
-						curPW = sum(varsValues[eachVar]['values'][posi:posf] * Igw[posi:posf])
+							# Print
+							self._PrintR(' %s = %3.5E' % (eachVar, NP))
 
-						# New point
-						NP = (oldPW+curPW)/(oldW+curW)
+							# Relative error of current point abs(new-old)/new
+							relerror = abs(NP-self.SPForLS[eachLS]['pt'][eachVar][1])/NP
+							# The biggest will be maxrelerror
+							maxrelerror = max(maxrelerror, relerror)
 
-						# Print
-						self._PrintR(' %s = %3.5E' % (eachVar, NP))
+							# Save New Point
+							self.SPForLS[eachLS]['pt'][eachVar][1] = NP
 
-						# Relative error of current point abs(new-old)/new
-						relerror = abs(NP-self.SPForLS[eachLS]['pt'][eachVar][1])/NP
-						# The biggest will be maxrelerror
-						maxrelerror = max(maxrelerror, relerror)
+						# Future old weight
+						self.SPForLS[eachLS]['W'] = oldW + curW
 
-						# Save New Point
-						self.SPForLS[eachLS]['pt'][eachVar][1] = NP
+					# Print max point error of LS
+					self._PrintR('Max. relative error on sampling point search is %f.' % maxrelerror)
+					if maxrelerror <= self.controls['tolAdPt'] and cycle > 3:
+						self._PrintR('Sampling point search converged on cycle %d.' % cycle)
+						adapt = False
 
-					# Future old weight
-					self.SPForLS[eachLS]['W'] = oldW + curW
+						# loop on eachvar of eachlimstate
+						# X_i+1,j=sum(X_i,j*W_i)/sum(W_i,j)
 
-				# Print max point error of LS
-				self._PrintR('Max. relative error on sampling point search is %f.' % maxrelerror)
-				if maxrelerror <= self.controls['tolAdPt'] and cycle > 3:
-					self._PrintR('Sampling point search converged on cycle %d.' % cycle)
-					adapt = False
-
-					# Current LS Igw is Igw[posi:posf]
-					#Igw[posi:posf]
-					# loop on eachvar of eachlimstate
-					# X_i+1,j=sum(X_i,j*W_i)/sum(W_i,j)
+		finally:
+			if pool != None:
+				pool.shutdown()
 
+			# Next cycle isn't needed anymore
+			if nextCycle is not None:
+				self._PrintR('Cancelling ANSYS solution of cycle %d.' % (cycle+1))
+				nextCycle[1][0].Cancel()
 
 		#-------------------------------------------------------------------
 
@@ -1657,6 +2541,17 @@ class MonteCarlo(object):
 		self._PrintR(' Final Limit States means and standard deviations:')
 		for eachLS in self.limstates:
 			self._PrintR('   Limit state %d: mean=%.4E, std.dev.=%.4E.' % (eachLS, self.MCControl_LS['gMean'][eachLS][-1], self.MCControl_LS['gStd'][eachLS][-1]))
+
+		# Print each limit state and the parallel system
+		if len(self.limstates) > 1:
+			self._PrintR(' Probabilities of failure of limit states and systems:')
+			for eachLS in self.limstates:
+				self._PrintR('   Limit state %d: Pf=%2.4E, Beta=%2.3f, CVPf=%2.3f.' % (eachLS, self.MCControl_LS['Pf'][eachLS][-1],
+							 -scipy.stats.norm.ppf(self.MCControl_LS['Pf'][eachLS][-1]), self.MCControl_LS['CVPf'][eachLS][-1]))
+			self._PrintR('   Series system: Pf=%2.4E, Beta=%2.3f, CVPf=%2.3f.' % (self.MCControl['Pf'][-1],
+						 self.MCControl['Beta'][-1], self.MCControl['CVPf'][-1]))
+			self._PrintR('   Parallel system: Pf=%2.4E, Beta=%2.3f, CVPf=%2.3f.' % (self.MCControl_Par['Pf'][-1],
+						 self.MCControl_Par['Beta'][-1], self.MCControl_Par['CVPf'][-1]))
 		self._PrintR('\n=======================================================================\n\n')
 		#-------------------------------------------------------------------
 
@@ -1669,7 +2564,13 @@ class MonteCarlo(object):
 		rsampdict = {}
 		# distparms is the dictionary with g(X) mean and std dev for each ls
 		distparms = {}
+		# LimStates is the dictionary with Pf, Beta and CVPf of each ls
+		limstres = {}
 		for eachLS in self.limstates:
+			limstres[eachLS] = {}
+			limstres[eachLS]['Pf'] = self.MCControl_LS['Pf'][eachLS][-1]
+			limstres[eachLS]['Beta'] = -scipy.stats.norm.ppf(self.MCControl_LS['Pf'][eachLS][-1])
+			limstres[eachLS]['CVPf'] = self.MCControl_LS['CVPf'][eachLS][-1]
 			rsampdict[eachLS] = {}
 			for eachVar in self.SPForLS[eachLS]['pt']:
 				rsampdict[eachLS][eachVar] = self.SPForLS[eachLS]['pt'][eachVar][1]
@@ -1688,13 +2589,19 @@ class MonteCarlo(object):
 		finret['SamplingPoints'] = rsampdict
 		finret['cycles'] = cycle
 		finret['distparms'] = distparms
+		finret['LimStates'] = limstres
+		finret['Parallel'] = {'Pf': self.MCControl_Par['Pf'][-1], 'Beta': self.MCControl_Par['Beta'][-1],
+							  'CVPf': self.MCControl_Par['CVPf'][-1]}
+		if adaptive == 'CE':
+			finret['CEModel'] = {'weights': self._CEModel[0], 'means': self._CEModel[1],
+								 'covs': np.array([each.dot(each.T) for each in self._CEModel[2]])}
 
 		return finret
 
 		#-----------------------------------------------------------------------
 
 
-	def GetSolutionControl(self, thing):
+	def GetSolutionControl(self, thing, limst=None):
 		"""
 		Return values of Monte Carlo solution controllers.
 
@@ -1703,6 +2610,11 @@ class MonteCarlo(object):
 		thing: str, obligatory
 			Control that will be returned. Available things are listed below.
 
+		limst: integer or str, optional
+			Limit state ID to get its own values, or 'parallel' for the
+			parallel system. Defaults to None, the general values, that are
+			from the series system.
+
 		Available things
 		----------------
 		In function of N:
@@ -1721,24 +2633,39 @@ class MonteCarlo(object):
 		Ns = self.controls['Ns']
 		cycles = self.cycles
 
+		# Series system, parallel system or a limit state
+		if limst == None:
+			control = self.MCControl
+		elif limst == 'parallel':
+			control = self.MCControl_Par
+		elif limst in self.limstates:
+			control = {}
+			control['Pf'] = self.MCControl_LS['Pf'][limst]
+			control['Beta'] = -scipy.stats.norm.ppf(self.MCControl_LS['Pf'][limst])
+			control['CVPf'] = self.MCControl_LS['CVPf'][limst]
+		else:
+			exception = Exception('Error while getting values of Monte Carlo solution control. '+
+				'"%s" is not a limit state or \'parallel\'.' % (limst))
+			raise exception
+
 
 		if thing == 'N_Pf':
 			# N vs Pf
 			result = np.zeros([cycles, 2])
 			result[:, 0] = range(Ns, Ns*(cycles+1), Ns)
-			result[:, 1] = self.MCControl['Pf']
+			result[:, 1] = control['Pf']
 
 		elif thing == 'N_Beta':
 			# N vs Beta
 			result = np.zeros([cycles, 2])
 			result[:, 0] = range(Ns, Ns*(cycles+1), Ns)
-			result[:, 1] = self.MCControl['Beta']
+			result[:, 1] = control['Beta']
 
 		elif thing == 'N_CVPf':
 			# N vs CVPf
 			result = np.zeros([cycles, 2])
 			result[:, 0] = range(Ns, Ns*(cycles+1), Ns)
-			result[:, 1] = self.MCControl['CVPf']
+			result[:, 1] = control['CVPf']
 
 		else:
 			exception = Exception('Error while getting values of Monte Carlo solution control. '+
@@ -1786,6 +2713,8 @@ class MonteCarlo(object):
 			f.write(',MaxCycles:,%d\n' % self.controls['Nmaxcycles'])
 			f.write(',CVPf target:,%2.4f\n' % self.controls['CVPf'])
 			f.write(',tol. Adapt.:,%s\n' % str(self.controls['tolAdPt']))
+			f.write(',Sampler:,%s\n' % self.controls.get('sampler', 'random'))
+			f.write(',Adaptive method:,%s\n' % self.controls.get('adaptive', 'point'))
 			f.write('\n')
 
 			# ANSYS Properties
@@ -1881,6 +2810,19 @@ class MonteCarlo(object):
 			f.write(',Elapsed time (minutes):,%4.3f\n' % self.MCControl['ElapsedTime'])
 			f.write('\n')
 
+			# Limit states and systems
+			if len(self.limstates) > 1:
+				f.write('Limit states and systems:\n')
+				f.write(',,Pf,Beta,CVPf\n')
+				for eachLS in self.limstates:
+					f.write(',Limit State %d:,%2.4E,%2.3f,%2.3f\n' % (eachLS, self.MCControl_LS['Pf'][eachLS][-1],
+						-scipy.stats.norm.ppf(self.MCControl_LS['Pf'][eachLS][-1]), self.MCControl_LS['CVPf'][eachLS][-1]))
+				f.write(',Series system:,%2.4E,%2.3f,%2.3f\n' % (self.MCControl['Pf'][-1], self.MCControl['Beta'][-1],
+					self.MCControl['CVPf'][-1]))
+				f.write(',Parallel system:,%2.4E,%2.3f,%2.3f\n' % (self.MCControl_Par['Pf'][-1], self.MCControl_Par['Beta'][-1],
+					self.MCControl_Par['CVPf'][-1]))
+				f.write('\n')
+
 			# Final Sampling Point
 			if self.controls['tolAdPt'] != False:
 				f.write('Final sampling point:\n')
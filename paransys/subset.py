@@ -0,0 +1,474 @@
+# -*- coding: UTF-8 -*-
+"""
+This module performns Reliability Analysis with Subset Simulation using Python.
+Please read the class docstring for more.
+
+Docs are available at https://dutitello.github.io/parAnsys/
+"""
+
+import time
+import numpy as np
+import scipy.stats
+import math
+from paransys.montecarlo import MonteCarlo
+
+
+class SubsetSimulation(MonteCarlo):
+	"""
+	This class performns Subset Simulation inside Python using ParAnsys as a
+	connection with ANSYS for evaluate FEM models.
+
+	Subset Simulation writes a small probability of failure as a product of
+	larger conditional probabilities, ``Pf = P(F1)*P(F2|F1)*...*P(Fm|Fm-1)``,
+	where each intermediate failure event ``Fi = {g(X) <= bi}`` has the
+	threshold bi chosen to have ``P(Fi|Fi-1) = p0``. The first level is a
+	Monte Carlo simulation, and the simulations of each next level are
+	generated by Markov chains (modified Metropolis algorithm) started on the
+	simulations that reached the last threshold. It's useful for very small
+	probabilities of failure, as 1E-6, that need a few thousands of limit state
+	evaluations, without choosing a sampling point.
+
+	Variables, correlations, limit state and ANSYS are defined in the same way
+	of MonteCarlo class, but sampling distributions (SetRandomVarSampl) are not
+	used. On each Markov chain step all chains are evaluated at once, in one
+	ANSYS run.
+
+	|
+	|
+
+	**Class methods:**
+
+	"""
+
+	#---------------------------------------------------------------------------
+
+
+
+	def __init__(self):
+		"""
+
+		"""
+		MonteCarlo.__init__(self)
+
+		# Subset Simulation controls of each level
+		self.SSControl = {}
+
+
+	def SetRandomVarSampl(self, name, limst, distrib, mean, std=0, cv=None, par1=None, par2=None):
+		"""
+		Sampling distributions aren't used by Subset Simulation.
+		"""
+		exception = Exception('Subset Simulation does not use sampling distributions.')
+		raise exception
+
+
+	def _SSGamma(self, matI, pi):
+		"""
+		Internal function that returns the correlation factor gamma of the
+		simulations of a level, due to the Markov chains (Au and Beck, 2001).
+
+		Parameters
+		----------
+		matI : 2D np.array, obligatory
+			Indicator of the threshold of next level, one line for each step
+			and one column for each chain.
+
+		pi : float, obligatory
+			Conditional probability of the level.
+		"""
+		[Nsteps, Nchains] = matI.shape
+		Nsim = Nsteps*Nchains
+		R0 = pi*(1-pi)
+		if Nsteps == 1 or R0 <= 0:
+			return 0.0
+
+		gamma = 0.0
+		for k in range(1, Nsteps):
+			Rk = (matI[:(Nsteps-k)]*matI[k:]).sum()/(Nsim-k*Nchains) - pi**2
+			gamma += 2*(1-k*Nchains/Nsim)*Rk/R0
+
+		return gamma
+
+
+	def Run(self, N=1000, p0=0.1, maxLevels=20, spread=1.0, seed=None):
+		"""
+		Run the Subset Simulation.
+
+		Parameters
+		----------
+		N : integer, optional
+			Number of simulations of each level. N*p0 must be an integer and
+			N must be a multiple of it. Defaults to 1000.
+
+		p0 : float, optional
+			Conditional probability of each level, the N*p0 simulations with
+			the smallest limit state values are the seeds of Markov chains of
+			next level. Defaults to 0.1.
+
+		maxLevels : integer, optional
+			Maximum number of levels, after it the process stops with the
+			probability of the failure domain reached by the last level.
+			Defaults to 20.
+
+		spread : float, optional
+			Standard deviation of the proposal distribution of modified
+			Metropolis, in the standard normal space. Defaults to 1.0.
+
+		seed : integer, optional
+			Seed of random values, for numpy.random.default_rng().
+			Defaults to None.
+
+		**Returns a dictionary with:**
+
+			* status : integer
+			  Status of solution, values can be found after this list.
+
+			* Pf : float
+			  Probability of failure.
+
+			* Beta : float
+			  Reliability index.
+
+			* CVPf : float
+			  Coefficient of Variation of Probability of failure.
+
+			* levels : int
+			  Number of levels performed.
+
+			* thresholds : list of floats
+			  Threshold of limit state of each level, the last is 0.
+
+			* Nsim : int
+			  Number of limit state evaluations (ANSYS simulations).
+
+
+		**Status values:**
+
+		* 0: no problem;
+		* 1: warning, maximum of levels reached without reach the failure domain;
+		* 99: undefined error!
+
+		"""
+		#-----------------------------------------------------------------------
+		# Verify the controls
+		#
+		if len(self.limstates) != 1:
+			exception = Exception('Subset Simulation needs just one limit state, create it with CreateLimState().')
+			raise exception
+
+		if len(self.variableDistrib) == 0:
+			exception = Exception('Subset Simulation needs at least one random variable.')
+			raise exception
+
+		if p0 <= 0 or p0 >= 1:
+			exception = Exception('The conditional probability p0 must be betwen 0 and 1.')
+			raise exception
+
+		Nchains = int(round(N*p0))
+		if Nchains < 1 or abs(N*p0-Nchains) > 1E-9 or N % Nchains != 0:
+			exception = Exception('N*p0 must be an integer and N must be a multiple of N*p0.')
+			raise exception
+		Nsteps = N//Nchains
+
+		if self._ANSYS and self.ansys.Model == {}:
+			exception = Exception('Before running ANSYS you must define the model that will be analysed with SetANSYSModel().')
+			raise exception
+
+		self.controls['N'] = N
+		self.controls['p0'] = p0
+		self.controls['maxLevels'] = maxLevels
+		self.controls['spread'] = spread
+
+		self._PrintR('Subset Simulation controls set as:')
+		self._PrintR('   Simulations per level: %d' % N)
+		self._PrintR('   Conditional probability of levels: %f' % p0)
+		self._PrintR('   Markov chains per level: %d, with %d steps' % (Nchains, Nsteps))
+		self._PrintR('   Maximum number of levels: %d' % maxLevels)
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Correlations and controls
+		#
+		self._SetCorrelMat()
+		self._matL = np.linalg.cholesky(self.correlMat)
+		NInRandVars = len(self.variableDistrib)
+
+		rng = np.random.default_rng(seed)
+
+		self.SSControl = {}
+		# Threshold, conditional probability, CV, acceptance rate, number of
+		#	simulations, Pf and CVPf on each level
+		self.SSControl['threshold'] = []
+		self.SSControl['p'] = []
+		self.SSControl['CV'] = []
+		self.SSControl['acceptance'] = []
+		self.SSControl['N'] = []
+		self.SSControl['Pf'] = []
+		self.SSControl['CVPf'] = []
+		self._Nsim = 0
+
+		timei = time.time()
+		stnumb = 99
+
+		self._PrintR('\nStarting Subset Simulation.')
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Level 0: Monte Carlo
+		#
+		self._PrintR('\n---\nLevel 0: Monte Carlo with %d simulations.' % N)
+		matU = rng.standard_normal((N, NInRandVars))
+		valG = self._EvalNormals(matU)
+		# Level 0 simulations are independent (one step of N chains)
+		chainsG = valG.reshape([1, N])
+		acceptance = 1.0
+
+		Pf = 1.0
+		sumCV2 = 0.0
+		level = 0
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Levels
+		#
+		while True:
+			# Threshold of the level
+			order = np.argsort(valG, kind='stable')
+			threshold = (valG[order[Nchains-1]]+valG[order[Nchains]])/2
+
+			if threshold <= 0 or level+1 >= maxLevels:
+				# Failure domain is reached
+				if threshold > 0:
+					stnumb = 1
+				else:
+					stnumb = 0
+				threshold = 0.0
+				pi = (valG <= 0).sum()/N
+			else:
+				pi = Nchains/N
+
+			# CV of the level
+			gamma = self._SSGamma(chainsG <= threshold, pi)
+			if pi > 0:
+				cvi = math.sqrt((1-pi)/(pi*N)*(1+gamma))
+			else:
+				cvi = np.inf
+
+			Pf = Pf*pi
+			sumCV2 += cvi**2
+
+			self.SSControl['threshold'].append(threshold)
+			self.SSControl['p'].append(pi)
+			self.SSControl['CV'].append(cvi)
+			self.SSControl['acceptance'].append(acceptance)
+			self.SSControl['N'].append(self._Nsim)
+			self.SSControl['Pf'].append(Pf)
+			self.SSControl['CVPf'].append(math.sqrt(sumCV2))
+
+			self._PrintR('Threshold of level %d = %f.' % (level, threshold))
+			self._PrintR('Conditional probability = %2.4E (CV=%2.3f, acceptance rate=%2.3f).' % (pi, cvi, acceptance))
+			self._PrintR('Current probability = %2.4E with %d simulations.' % (Pf, self._Nsim))
+
+			if stnumb != 99:
+				break
+
+			#-------------------------------------------------------------------
+			# Markov chains of next level, started on the Nchains smallest
+			#	limit state values (seeds) and all evaluated together.
+			#
+			level += 1
+			self._PrintR('\n---\nLevel %d: %d Markov chains with %d steps.' % (level, Nchains, Nsteps))
+
+			chainsU = np.zeros([Nsteps, Nchains, NInRandVars])
+			chainsG = np.zeros([Nsteps, Nchains])
+			chainsU[0] = matU[order[:Nchains]]
+			chainsG[0] = valG[order[:Nchains]]
+			accepted = 0
+
+			for step in range(1, Nsteps):
+				curU = chainsU[step-1]
+				curG = chainsG[step-1]
+
+				# Modified Metropolis: each component is accepted by the ratio
+				#	of standard normal PDFs
+				candU = curU + spread*rng.standard_normal(curU.shape)
+				ratio = np.exp(-0.5*(candU**2-curU**2))
+				candU = np.where(rng.uniform(size=curU.shape) < ratio, candU, curU)
+
+				# Just changed candidates are evaluated, and they are
+				#	accepted if they are inside the current subset
+				changed = np.any(candU != curU, axis=1)
+				candG = curG.copy()
+				candG[changed] = self._EvalNormals(candU[changed])
+				inside = changed & (candG <= threshold)
+				accepted += inside.sum()
+
+				chainsU[step] = np.where(inside[:, None], candU, curU)
+				chainsG[step] = np.where(inside, candG, curG)
+
+			acceptance = accepted/max(1, (Nsteps-1)*Nchains)
+			matU = chainsU.reshape([N, NInRandVars])
+			valG = chainsG.reshape(N)
+			#-------------------------------------------------------------------
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# After levels
+		#
+		timef = time.time()
+		self.SSControl['ElapsedTime'] = ((timef-timei)/60)
+		self.levels = level+1
+		self._stnumb = stnumb
+
+		CVPf = math.sqrt(sumCV2)
+		Beta = -scipy.stats.norm.ppf(Pf)
+
+		self._PrintR('\n\n=======================================================================\n')
+		if stnumb == 1:
+			self._PrintR(' WARNING:')
+			self._PrintR('  The process was finished after reach the limit of levels without')
+			self._PrintR('  reach the failure domain.\n')
+
+		self._PrintR(' Levels: %d' % self.levels)
+		self._PrintR(' Total of simulations: %3.3E' % self._Nsim)
+		self._PrintR(' CV of Prob. of failure (CVPf): %2.3f' % CVPf)
+		self._PrintR(' Probability of failure (Pf): %2.4E' % Pf)
+		self._PrintR(' Reliability index (Beta): %2.3f' % Beta)
+		self._PrintR(' Elapsed time: %f minutes.' % self.SSControl['ElapsedTime'])
+		self._PrintR('\n=======================================================================\n\n')
+		#-----------------------------------------------------------------------
+
+
+		#-----------------------------------------------------------------------
+		# Send the return
+		#
+		finret = {}
+		finret['status'] = stnumb
+		finret['Pf'] = Pf
+		finret['Beta'] = Beta
+		finret['CVPf'] = CVPf
+		finret['levels'] = self.levels
+		finret['thresholds'] = list(self.SSControl['threshold'])
+		finret['Nsim'] = self._Nsim
+
+		return finret
+		#-----------------------------------------------------------------------
+
+
+	def GetSolutionControl(self, thing):
+		"""
+		Return values of Subset Simulation controllers, on the end of each level.
+
+		Parameters
+		----------
+		thing: str, obligatory
+			Control that will be returned. Available things are listed below.
+
+		Available things
+		----------------
+		In function of N (simulations until the level):
+			* 'N_Pf' = Probability of failure (probability of the subset)
+			* 'N_Beta' = Reliability index
+			* 'N_CVPf' = CV of Probability of failure
+			* 'N_Threshold' = Threshold of limit state
+
+		Returns
+		-------
+		2D numpy array of floats:
+			Each line has simulation number and requested value on this level.
+
+		"""
+		if thing == 'N_Pf':
+			values = self.SSControl['Pf']
+		elif thing == 'N_Beta':
+			values = -scipy.stats.norm.ppf(self.SSControl['Pf'])
+		elif thing == 'N_CVPf':
+			values = self.SSControl['CVPf']
+		elif thing == 'N_Threshold':
+			values = self.SSControl['threshold']
+		else:
+			exception = Exception('Error while getting values of Subset Simulation control. '+
+				'"%s" is not recognized as a valid "thing".' % (thing))
+			raise exception
+
+		result = np.zeros([len(self.SSControl['N']), 2])
+		result[:, 0] = self.SSControl['N']
+		result[:, 1] = values
+
+		self._PrintR('Returning values of "%s".' % thing)
+		return result
+
+
+	def ExportDataCSV(self, filename, description=None):
+		"""
+		Exports Subset Simulation data to a CSV file.
+
+		Parameters
+		----------
+		filename : str, obligatory
+			Name of file that will receive the values, doesn't need the
+			extension ".csv", it will be placed automatically.
+
+		description : str, optional
+			A string that will be write in the beggining of the file.
+		"""
+
+		# Open file
+		filename = filename+'.csv'
+		try:
+			f = open(filename, 'wt')
+		except:
+			exception = Exception('Unable to open the %s file for write data.' % filename)
+			raise exception
+		else:
+			# Starts with sep=, for Microsoft Excel
+			f.write('sep=,\n')
+
+			# Description
+			if description != None:
+				f.write('%s\n\n' % description)
+
+			f.write('Input data:\n')
+
+			# Simulation Controllers:
+			f.write('Simulation Controllers:\n')
+			f.write(',N/Level:,%d\n' % self.controls['N'])
+			f.write(',p0:,%f\n' % self.controls['p0'])
+			f.write(',MaxLevels:,%d\n' % self.controls['maxLevels'])
+			f.write(',Proposal spread:,%f\n' % self.controls['spread'])
+			f.write('\n')
+
+			# Variables and ANSYS
+			self._ExportModelCSV(f)
+
+			# Limit state
+			f.write('Limit State:,"%s"\n' % self.limstates[0][0])
+			f.write('\n')
+
+			# Results
+			f.write('\nResults:\n')
+			f.write(',Exit status:,%d,\n' % self._stnumb)
+			f.write(',Levels:,%d\n' % self.levels)
+			f.write(',Total of simulations:,%3.3E\n' % self.SSControl['N'][-1])
+			f.write(',Probability of failure (Pf):,%2.4E\n' % self.SSControl['Pf'][-1])
+			f.write(',Reliability Index (Beta):,%2.3f\n' % -scipy.stats.norm.ppf(self.SSControl['Pf'][-1]))
+			f.write(',CV of Prob. of failure (CVPf):,%2.3f\n' % self.SSControl['CVPf'][-1])
+			f.write(',Elapsed time (minutes):,%4.3f\n' % self.SSControl['ElapsedTime'])
+			f.write('\n')
+
+			# Convergence on each level
+			f.write('\nProcess Convergence:\n')
+			f.write(',Level,N,Threshold,p,CV,Acceptance,Pf,CVPf\n')
+			for idx in range(len(self.SSControl['N'])):
+				f.write(',%d,%d,%8.5E,%2.4E,%2.3f,%2.3f,%2.4E,%2.3f\n' % (idx, self.SSControl['N'][idx],
+					self.SSControl['threshold'][idx], self.SSControl['p'][idx], self.SSControl['CV'][idx],
+					self.SSControl['acceptance'][idx], self.SSControl['Pf'][idx], self.SSControl['CVPf'][idx]))
+
+			# End
+			f.close()
+
+			self._PrintR('Simulation data exported to "%s".' % filename)
@@ -33,6 +33,7 @@ setuptools.setup(
         'Topic :: Scientific/Engineering',
         'License :: OSI Approved :: MIT License',
         'Operating System :: Microsoft :: Windows',
+        'Operating System :: POSIX :: Linux',
     ],
     install_requires=['numpy>=1.18.0',
                       'scipy>=1.17']